@@ -1,28 +1,150 @@
 import os
 import sys
 import time
+import asyncio
+import hashlib
+import functools
 import logging
 import difflib
 import datetime
 import sqlite3
+import multiprocessing
 
 import redis
 import requests
-import coloredlogs
 import ujson as json
 
-from requests.adapters import HTTPAdapter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
-from nltk import tokenize
 
-from tools import timestamp_to_unix, time_delta_to_legible_eta
-from db import update_launch_db, update_stats_db
+from budget import load_api_budget, take_api_budget, budgeted_update_time
+from config import load_api_config
+from dbconn import DB_CONNECTIONS, connect_db
+from dbwriter import DB_WRITER, queued_write
+from migrations import apply_migrations
+from jsonstream import iter_json_array
+from ll2client import LL2Client, get_ll2_client
+from retry import LL2_RETRY
+from summary import SUMMARY_CACHE
+from tools import (timestamp_to_unix, unix_to_timestamp,
+	time_delta_to_legible_eta)
+from db import (update_launch_db, update_stats_db, carry_forward_launches,
+	load_api_state, store_api_state, load_last_api_update, record_parse_errors,
+	load_launch_hashes, touch_launches, delete_launch_vehicles, update_event_db)
 from notifications import (notification_send_scheduler, postpone_notification,
 	remove_previous_notification, store_notification_identifiers)
 
+UPDATE_PERIOD = 15
+LAUNCH_HASH_VERSION = 2
+
+
+STAGE_COLUMNS = ('stage_idx', 'stage_id', 'stage_type', 'is_reused',
+	'flight_number', 'turn_around', 'is_flight_proven', 'serial_number',
+	'maiden_flight', 'last_flight', 'landing_attempt', 'landing_location',
+	'landing_type', 'landing_location_nth_landing')
+
+CREW_COLUMNS = ('crew_idx', 'name', 'role')
+
+LAUNCHER_COLUMNS = (('launcher_stage_id', 'stage_id'),
+	('launcher_stage_type', 'stage_type'),
+	('launcher_stage_is_reused', 'is_reused'),
+	('launcher_stage_flight_number', 'flight_number'),
+	('launcher_stage_turn_around', 'turn_around'),
+	('launcher_is_flight_proven', 'is_flight_proven'),
+	('launcher_serial_number', 'serial_number'),
+	('launcher_maiden_flight', 'maiden_flight'),
+	('launcher_last_flight', 'last_flight'),
+	('launcher_landing_attempt', 'landing_attempt'),
+	('launcher_landing_location', 'landing_location'),
+	('landing_type', 'landing_type'),
+	('launcher_landing_location_nth_landing', 'landing_location_nth_landing'))
+
+LAUNCH_COLUMNS = ('name', 'unique_id', 'll_id', 'net_unix', 'status_id',
+	'status_state', 'in_hold', 'probability', 'success', 'tbd_time',
+	'tbd_date', 'launched', 'webcast_islive', 'webcast_url_list', 'lsp_id',
+	'lsp_name', 'lsp_short', 'lsp_country_code', 'mission_name',
+	'mission_type', 'mission_orbit', 'mission_orbit_abbrev',
+	'mission_description', 'pad_name', 'location_name',
+	'location_country_code', 'rocket_name', 'rocket_full_name',
+	'rocket_variant', 'rocket_family') + tuple(
+	launch_column for launch_column, _ in LAUNCHER_COLUMNS) + (
+	'spacecraft_id', 'spacecraft_sn', 'spacecraft_name',
+	'spacecraft_crew_count', 'spacecraft_maiden_flight', 'pad_nth_launch',
+	'location_nth_launch', 'agency_nth_launch', 'agency_nth_launch_year',
+	'orbital_nth_launch_year', 'source_hash', 'list_hash')
+
+
+EVENT_COLUMNS = ('event_id', 'name', 'event_type', 'description', 'location',
+	'news_url', 'video_url', 'feature_image', 'date_unix', 'launch_ids')
+
+
+class LaunchStage:
+	__slots__ = STAGE_COLUMNS
+
+	def __init__(self, stage_idx: int, stage_json: dict):
+		self.stage_idx = stage_idx
+		self.stage_id = stage_json['id']
+		self.stage_type = stage_json['type']
+		self.is_reused = stage_json['reused']
+		self.flight_number = stage_json['launcher_flight_number']
+		self.turn_around = stage_json['turn_around_time_days']
+		self.is_flight_proven = stage_json['launcher']['flight_proven']
+		self.serial_number = stage_json['launcher']['serial_number']
+
+		try:
+			self.maiden_flight = timestamp_to_unix(
+				stage_json['launcher']['first_launch_date'])
+			self.last_flight = timestamp_to_unix(
+				stage_json['launcher']['last_launch_date'])
+		except:
+			self.maiden_flight = None
+			self.last_flight = None
+
+		self.landing_attempt = None
+		self.landing_location = None
+		self.landing_type = None
+		self.landing_location_nth_landing = None
+
+		if stage_json['landing'] is not None:
+			landing_json = stage_json['landing']
+
+			try:
+				self.landing_attempt = landing_json['attempt']
+				self.landing_location = landing_json['location']['abbrev']
+				self.landing_type = landing_json['type']['abbrev']
+				self.landing_location_nth_landing = landing_json['location'][
+					'successful_landings']
+			except:
+				self.landing_attempt = None
+				self.landing_location = None
+				self.landing_type = None
+				self.landing_location_nth_landing = None
+
+	def values(self, unique_id: str) -> tuple:
+		return (unique_id, ) + tuple(
+			getattr(self, column) for column in STAGE_COLUMNS)
+
+
+class CrewMember:
+	__slots__ = CREW_COLUMNS
+
+	def __init__(self, crew_idx: int, crew_json: dict):
+		self.crew_idx = crew_idx
+		self.name = crew_json['astronaut']['name']
+		self.role = crew_json['role']
+
+	def values(self, unique_id: str) -> tuple:
+		return (unique_id, ) + tuple(
+			getattr(self, column) for column in CREW_COLUMNS)
+
 
 class LaunchLibrary2Launch:
+	__slots__ = LAUNCH_COLUMNS + ('stages', 'crew')
+	COLUMNS = LAUNCH_COLUMNS
+
 	def __init__(self, launch_json: dict):
+		self.source_hash = None
+		self.list_hash = None
 		self.name = launch_json['name']
 		self.unique_id = launch_json['id']
 		self.ll_id = launch_json['launch_library_id']
@@ -110,123 +232,26 @@ class LaunchLibrary2Launch:
 		self.rocket_family = launch_json['rocket']['configuration']['family']
 
 		if launch_json['rocket']['launcher_stage'] not in (None, []):
-			stage_count = len(launch_json['rocket']['launcher_stage'])
+			self.stages = tuple(
+				LaunchStage(stage_idx, stage_json) for stage_idx, stage_json in
+				enumerate(launch_json['rocket']['launcher_stage']))
 		else:
-			stage_count = 0
-
-		if stage_count > 1:
-			stages = launch_json['rocket']['launcher_stage']
-
-			self.launcher_stage_id = ';;'.join(
-				[str(stage['id']) for stage in stages])
-			self.launcher_stage_type = ';;'.join(
-				[str(stage['type']) for stage in stages])
-			self.launcher_stage_is_reused = ';;'.join(
-				[str(stage['reused']) for stage in stages])
-			self.launcher_stage_flight_number = ';;'.join(
-				[str(stage['launcher_flight_number']) for stage in stages])
-			self.launcher_stage_turn_around = ';;'.join(
-				[str(stage['turn_around_time_days']) for stage in stages])
-			self.launcher_is_flight_proven = ';;'.join(
-				[str(stage['launcher']['flight_proven']) for stage in stages])
-			self.launcher_serial_number = ';;'.join(
-				[str(stage['launcher']['serial_number']) for stage in stages])
-
-			maiden_flights, last_flights = [], []
-			landing_attempts, landing_locs, landing_types, landing_loc_nths = [], [], [], []
-			for stage in stages:
-				try:
-					maiden_flight = timestamp_to_unix(
-						stage['launcher']['first_launch_date'])
-					last_flight = timestamp_to_unix(
-						stage['launcher']['last_launch_date'])
-				except:
-					maiden_flight = None
-					last_flight = None
-
-				maiden_flights.append(str(maiden_flight))
-				last_flights.append(str(last_flight))
-
-				if stage['landing'] is not None:
-					landing_json = stage['landing']
-					landing_attempts.append(str(landing_json['attempt']))
-					landing_locs.append(landing_json['location']['abbrev'])
-					landing_types.append(landing_json['type']['abbrev'])
-					landing_loc_nths.append(
-						str(landing_json['location']['successful_landings']))
-				else:
-					landing_attempts.append(None)
-					landing_locs.append(None)
-					landing_types.append(None)
-					landing_loc_nths.append(None)
-
-			self.launcher_maiden_flight = ';;'.join(maiden_flights)
-			self.launcher_last_flight = ';;'.join(last_flights)
-			self.launcher_landing_attempt = ';;'.join(landing_attempts)
-			self.launcher_landing_location = ';;'.join(landing_locs)
-			self.landing_type = ';;'.join(landing_types)
-			self.launcher_landing_location_nth_landing = ';;'.join(
-				landing_loc_nths)
-		elif stage_count == 1:
-			launcher_json = launch_json['rocket']['launcher_stage'][0]
-
-			self.launcher_stage_id = launcher_json['id']
-			self.launcher_stage_type = launcher_json['type']
-			self.launcher_stage_is_reused = launcher_json['reused']
-			self.launcher_stage_flight_number = launcher_json[
-				'launcher_flight_number']
-			self.launcher_stage_turn_around = launcher_json[
-				'turn_around_time_days']
-
-			self.launcher_is_flight_proven = launcher_json['launcher'][
-				'flight_proven']
-			self.launcher_serial_number = launcher_json['launcher'][
-				'serial_number']
+			self.stages = ()
 
-			try:
-				self.launcher_maiden_flight = timestamp_to_unix(
-					launcher_json['launcher']['first_launch_date'])
-				self.launcher_last_flight = timestamp_to_unix(
-					launcher_json['launcher']['last_launch_date'])
-			except:
-				self.launcher_maiden_flight = None
-				self.launcher_last_flight = None
-
-			if launcher_json['landing'] is not None:
-				landing_json = launcher_json['landing']
-
-				try:
-					self.launcher_landing_attempt = landing_json['attempt']
-					self.launcher_landing_location = landing_json['location'][
-						'abbrev']
-					self.landing_type = landing_json['type']['abbrev']
-					self.launcher_landing_location_nth_landing = landing_json[
-						'location']['successful_landings']
-				except:
-					self.launcher_landing_attempt = None
-					self.launcher_landing_location = None
-					self.landing_type = None
-					self.launcher_landing_location_nth_landing = None
-			else:
-				self.launcher_landing_attempt = None
-				self.launcher_landing_location = None
-				self.landing_type = None
-				self.launcher_landing_location_nth_landing = None
+		core_stages = [
+			stage for stage in self.stages
+			if str(stage.stage_type).lower() == 'core'
+		]
+		if len(core_stages) > 0:
+			core_stage = core_stages[0]
 		else:
-			self.launcher_stage_id = None
-			self.launcher_stage_type = None
-			self.launcher_stage_is_reused = None
-			self.launcher_stage_flight_number = None
-			self.launcher_stage_turn_around = None
-			self.launcher_is_flight_proven = None
-			self.launcher_serial_number = None
-			self.launcher_maiden_flight = None
-			self.launcher_last_flight = None
-			self.launcher_landing_attempt = None
-			self.launcher_landing_location = None
-			self.landing_type = None
-			self.launcher_landing_location_nth_landing = None
+			core_stage = self.stages[0] if len(self.stages) > 0 else None
+
+		for launch_column, stage_column in LAUNCHER_COLUMNS:
+			setattr(self, launch_column,
+				getattr(core_stage, stage_column) if core_stage is not None else None)
 
+		self.crew = ()
 		if launch_json['rocket']['spacecraft_stage'] not in (None, []):
 			spacecraft = launch_json['rocket']['spacecraft_stage']
 			self.spacecraft_id = spacecraft['id']
@@ -235,14 +260,11 @@ class LaunchLibrary2Launch:
 				'spacecraft_config']['name']
 
 			if spacecraft['launch_crew'] not in (None, []):
-				astronauts = set()
-				for crew_member in spacecraft['launch_crew']:
-					astronauts.add(
-						f"{crew_member['astronaut']['name']}:{crew_member['role']}"
-					)
+				self.crew = tuple(
+					CrewMember(crew_idx, crew_json) for crew_idx, crew_json in
+					enumerate(spacecraft['launch_crew']))
 
-				self.spacecraft_crew = ','.join(astronauts)
-				self.spacecraft_crew_count = len(astronauts)
+			self.spacecraft_crew_count = len(self.crew)
 
 			try:
 				self.spacecraft_maiden_flight = timestamp_to_unix(
@@ -254,7 +276,6 @@ class LaunchLibrary2Launch:
 			self.spacecraft_id = None
 			self.spacecraft_sn = None
 			self.spacecraft_name = None
-			self.spacecraft_crew = None
 			self.spacecraft_crew_count = None
 			self.spacecraft_maiden_flight = None
 
@@ -262,49 +283,8 @@ class LaunchLibrary2Launch:
 			self.mission_name = launch_json['mission']['name']
 			self.mission_type = launch_json['mission']['type']
 
-			self.mission_description = launch_json['mission']['description']
-
-			if self.mission_description not in (None, ''):
-				try:
-					sentences = tokenize.sent_tokenize(
-						self.mission_description)
-				except LookupError:
-					logging.warning(
-						'нет nltk. загружем'
-					)
-
-					import nltk
-					nltk.download("punkt")
-
-					try:
-						sentences = tokenize.sent_tokenize(
-							self.mission_description)
-					except:
-						logging.exception(
-							"nltk умер"
-						)
-						return
-			else:
-				sentences = []
-
-				parsed_description = ''
-				max_idx = len(sentences) - 1
-
-				for enum, sentence in enumerate(sentences):
-					if len(parsed_description) + len(sentence) > 350:
-						if enum == 0:
-							parsed_description = sentence
-
-						break
-
-					parsed_description += sentence
-
-					if enum != max_idx:
-						if not len(parsed_description) + len(
-							sentences[enum + 1]) > 350:
-							parsed_description += ' '
-
-				self.mission_description = parsed_description
+			self.mission_description = SUMMARY_CACHE.summarize(
+				launch_json['mission']['description'])
 
 			if launch_json['mission']['orbit'] is not None:
 				self.mission_orbit = launch_json['mission']['orbit']['name']
@@ -348,6 +328,38 @@ class LaunchLibrary2Launch:
 		else:
 			self.orbital_nth_launch_year = None
 
+	def values(self) -> tuple:
+		return tuple(getattr(self, column) for column in LAUNCH_COLUMNS)
+
+	def stage_rows(self) -> list:
+		return [stage.values(self.unique_id) for stage in self.stages]
+
+	def crew_rows(self) -> list:
+		return [crew_member.values(self.unique_id) for crew_member in self.crew]
+
+
+class LaunchLibrary2Event:
+	__slots__ = EVENT_COLUMNS
+
+	def __init__(self, event_json: dict):
+		self.event_id = event_json['id']
+		self.name = event_json['name']
+		self.event_type = event_json['type']['name'] if event_json[
+			'type'] is not None else None
+		self.description = event_json['description']
+		self.location = event_json['location']
+		self.news_url = event_json.get('news_url')
+		self.video_url = event_json.get('video_url')
+		self.feature_image = event_json.get('feature_image')
+		self.date_unix = timestamp_to_unix(
+			event_json['date']) if event_json['date'] is not None else None
+
+		self.launch_ids = ','.join(
+			launch['id'] for launch in event_json.get('launches', []))
+
+	def values(self) -> tuple:
+		return tuple(getattr(self, column) for column in EVENT_COLUMNS)
+
 
 def construct_params(PARAMS: dict) -> str:
 	param_url = ''
@@ -359,8 +371,9 @@ def construct_params(PARAMS: dict) -> str:
 	return param_url
 
 
+@queued_write()
 def clean_launch_db(last_update, db_path):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	conn.row_factory = sqlite3.Row
 	cursor = conn.cursor()
 
@@ -389,6 +402,7 @@ def clean_launch_db(last_update, db_path):
 		cursor.execute(
 			'DELETE FROM launches WHERE launched = 0 AND last_updated < ? AND net_unix > ?',
 			(last_update, int(time.time())))
+		delete_launch_vehicles(cursor=cursor, unique_ids=deleted_launches)
 
 		logging.info(f'удалено {deleted_launches}')
 	except Exception:
@@ -398,109 +412,833 @@ def clean_launch_db(last_update, db_path):
 	conn.close()
 
 
-def ll2_api_call(data_dir: str, scheduler: BackgroundScheduler,
-	bot_username: str, bot: 'telegram.bot.Bot'):
-	DEBUG_API = False
+def fetch_api_page(client: LL2Client, api_call: str, data_dir: str,
+	page: dict, record_dir: str = None) -> dict:
+	API_RESPONSE, page['timing'] = client.get(api_call,
+		record_dir=record_dir)
 
-	API_URL = 'https://ll.thespacedevs.com'
-	API_VERSION = '2.1.0'
-	API_REQUEST = 'launch/upcoming'
-	PARAMS = {'mode': 'detailed', 'limit': 30}
+	try:
+		api_json = json.loads(API_RESPONSE.text)
+	except ValueError:
+		with open(os.path.join(data_dir, f'error-json-{int(time.time())}.txt'),
+			'w') as ejson:
+			ejson.write(API_RESPONSE.text)
 
-	API_CALL = f'{API_URL}/{API_VERSION}/{API_REQUEST}/{construct_params(PARAMS)}'
+		raise
 
-	headers = {'user-agent': f'telegram-{bot_username}'}
+	if 'results' not in api_json:
+		raise ValueError(f'no results in LL2 response: {api_json}')
 
-	if DEBUG_API and os.path.isfile(os.path.join(data_dir, 'debug-json.json')):
-		with open(os.path.join(data_dir, 'debug-json.json'), 'r') as json_file:
-			api_json = json.load(json_file)
+	page['next'] = api_json['next']
+	return api_json
 
-		rec_data = 0
-		time.sleep(1.5)
-	else:
-		try:
-			session = requests.Session()
-			session.headers = headers
-			session.mount("https://",
-				HTTPAdapter(pool_connections=1, pool_maxsize=2))
 
-			t0 = time.time()
-			API_RESPONSE = session.get(API_CALL, timeout=5)
-			rec_data = len(API_RESPONSE.content)
+def stream_api_page(client: LL2Client, api_call: str, page: dict,
+	record_dir: str = None):
+	API_RESPONSE, page['timing'] = client.get(api_call,
+		stream=True,
+		record_dir=record_dir)
+
+	yield from iter_json_array(client.iter_content(API_RESPONSE,
+		page['timing']),
+		key='results',
+		header=page)
+
+	if 'count' not in page:
+		raise ValueError(f'no results in LL2 response: {page}')
 
-			tdelta = time.time() - t0
+
+class TracedJSON:
+	def __init__(self, value, path: str, trail: list):
+		self.value = value
+		self.path = path
+		self.trail = trail
+
+	def child(self, key, value):
+		if isinstance(key, int):
+			path = f'{self.path}[{key}]'
+		else:
+			path = f'{self.path}.{key}' if self.path else str(key)
+
+		self.trail[0] = path
+		if isinstance(value, (dict, list)):
+			return TracedJSON(value, path, self.trail)
+
+		return value
+
+	def __getitem__(self, key):
+		if isinstance(self.value, dict) and key not in self.value:
+			self.child(key, None)
+
+		return self.child(key, self.value[key])
+
+	def __contains__(self, key):
+		return key in self.value
+
+	def __len__(self):
+		return len(self.value)
+
+	def __iter__(self):
+		if isinstance(self.value, list):
+			for enum, item in enumerate(self.value):
+				yield self.child(enum, item)
+		else:
+			yield from self.value
+
+	def __eq__(self, other):
+		return self.value == other
+
+	def get(self, key, default=None):
+		return self[key] if key in self.value else default
+
+	def keys(self):
+		return self.value.keys()
+
+
+def parse_error_record(launch_json: dict, error: Exception,
+	parser=None) -> tuple:
+	trail = ['']
+	try:
+		(parser or LaunchLibrary2Launch)(TracedJSON(launch_json, '', trail))
+	except Exception:
+		pass
+
+	try:
+		launch_id = launch_json['id']
+	except (KeyError, TypeError):
+		launch_id = None
+
+	return (launch_id, trail[0], f'{type(error).__name__}: {error}')
+
+
+def launch_source_hash(launch_json: dict) -> str:
+	source = f'{LAUNCH_HASH_VERSION}:{json.dumps(launch_json, sort_keys=True)}'
+	return hashlib.sha1(source.encode()).hexdigest()
+
+
+def launch_is_unchanged(launch_json: dict, sweep: dict) -> (bool, str):
+	try:
+		source_hash = launch_source_hash(launch_json)
+		unique_id = launch_json['id']
+	except Exception:
+		return False, None
+
+	if sweep['known_hashes'].get(unique_id) == source_hash:
+		sweep['unchanged'].append(unique_id)
+		return True, source_hash
+
+	sweep['changed'] += 1
+	return False, source_hash
+
+
+def init_parse_worker(db_path: str):
+	SUMMARY_CACHE.load(db_path=db_path)
+
+
+def parse_launch_batch(launch_jsons: list) -> tuple:
+	launches, parse_errors = [], []
+	for launch_json in launch_jsons:
+		try:
+			launches.append(LaunchLibrary2Launch(launch_json))
 		except Exception as error:
-			logging.warning(f'ошибка {error}')
-			return ll2_api_call(data_dir=data_dir,
-				scheduler=scheduler,
-				bot_username=bot_username,
-				bot=bot)
+			parse_errors.append(parse_error_record(launch_json, error))
+
+	return launches, parse_errors, SUMMARY_CACHE.drain()
+
+
+PARSE_POOL = {'pool': None, 'db_path': None, 'workers': 0}
+
+
+def get_parse_pool(db_path: str, workers: int) -> ProcessPoolExecutor:
+	if PARSE_POOL['pool'] is not None and PARSE_POOL['db_path'] == db_path:
+		return PARSE_POOL['pool']
+
+	if PARSE_POOL['pool'] is not None:
+		PARSE_POOL['pool'].shutdown(wait=False)
+
+	PARSE_POOL['workers'] = workers if workers > 0 else os.cpu_count()
+	PARSE_POOL['pool'] = ProcessPoolExecutor(
+		max_workers=PARSE_POOL['workers'],
+		mp_context=multiprocessing.get_context('spawn'),
+		initializer=init_parse_worker,
+		initargs=(db_path, ))
+	PARSE_POOL['db_path'] = db_path
+
+	return PARSE_POOL['pool']
+
+
+def parse_launch_page(results, sweep: dict, page: dict,
+	pool: ProcessPoolExecutor = None):
+	if pool is None:
+		for launch in results:
+			page['launches'] += 1
+
+			if 'last_updated' in launch:
+				if sweep['high_water_mark'] is None or launch[
+					'last_updated'] > sweep['high_water_mark']:
+					sweep['high_water_mark'] = launch['last_updated']
+
+			if sweep['known_only'] and launch.get(
+				'id') not in sweep['known_hashes']:
+				continue
+
+			unchanged, source_hash = launch_is_unchanged(launch, sweep)
+			if unchanged:
+				continue
+
+			try:
+				launch_object = LaunchLibrary2Launch(launch)
+			except Exception as error:
+				sweep['parse_errors'].append(parse_error_record(launch, error))
+				continue
+
+			launch_object.source_hash = source_hash
+			yield launch_object
+
+		return
+
+	launch_jsons, source_hashes = [], {}
+	for launch in results:
+		page['launches'] += 1
+
+		if 'last_updated' in launch:
+			if sweep['high_water_mark'] is None or launch[
+				'last_updated'] > sweep['high_water_mark']:
+				sweep['high_water_mark'] = launch['last_updated']
+
+		if sweep['known_only'] and launch.get('id') not in sweep['known_hashes']:
+			continue
+
+		unchanged, source_hash = launch_is_unchanged(launch, sweep)
+		if not unchanged:
+			launch_jsons.append(launch)
+			source_hashes[launch.get('id')] = source_hash
+
+	if len(launch_jsons) == 0:
+		return
+
+	chunk_size = max(1, len(launch_jsons) // (PARSE_POOL['workers'] * 4))
+	batches = [
+		launch_jsons[i:i + chunk_size]
+		for i in range(0, len(launch_jsons), chunk_size)
+	]
+
+	try:
+		parsed_batches = list(pool.map(parse_launch_batch, batches))
+	except Exception:
+		logging.exception('parse pool failed, parsing page serially')
+		parsed_batches = [parse_launch_batch(batch) for batch in batches]
+
+	del launch_jsons, batches
+
+	for launches, parse_errors, summaries in parsed_batches:
+		sweep['parse_errors'].extend(parse_errors)
+		SUMMARY_CACHE.merge(*summaries)
+
+		for launch_object in launches:
+			launch_object.source_hash = source_hashes.get(
+				launch_object.unique_id)
+			yield launch_object
+
+
+def parse_list_page(results, sweep: dict, page: dict,
+	pool: ProcessPoolExecutor = None):
+	for launch in results:
+		page['launches'] += 1
+
+		if 'last_updated' in launch:
+			if sweep['high_water_mark'] is None or launch[
+				'last_updated'] > sweep['high_water_mark']:
+				sweep['high_water_mark'] = launch['last_updated']
+
+		unchanged, list_hash = launch_is_unchanged(launch, sweep)
+		if unchanged:
+			continue
+
+		if list_hash is None:
+			sweep['parse_errors'].append(
+				parse_error_record(launch, KeyError('id')))
+			continue
+
+		yield (launch['id'], launch.get('last_updated'), list_hash)
+
+
+def parse_event_page(results, sweep: dict, page: dict,
+	pool: ProcessPoolExecutor = None):
+	for event in results:
+		page['launches'] += 1
 
 		try:
-			api_json = json.loads(API_RESPONSE.text)
-			if DEBUG_API:
-				with open(os.path.join(data_dir, 'debug-json.json'),
-					'w') as jsonf:
-					json.dump(api_json, jsonf, indent=4)
-		except Exception as json_parse_error:
-			logging.exception(f'ошибка json{json_parse_error}')
-			with open(
-				os.path.join(data_dir, f'error-json-{int(time.time())}.txt'),
-				'w') as ejson:
-				ejson.write(API_RESPONSE.text)
-			time.sleep(60)
-
-			return ll2_api_call(data_dir=data_dir,
-				scheduler=scheduler,
-				bot_username=bot_username,
-				bot=bot)
+			yield LaunchLibrary2Event(event)
+		except Exception as error:
+			sweep['parse_errors'].append(
+				parse_error_record(event, error, parser=LaunchLibrary2Event))
+
+
+def new_sweep(known_hashes: dict, high_water_mark: str = None,
+	known_only: bool = False) -> dict:
+	return {
+		'high_water_mark': high_water_mark,
+		'parse_errors': [],
+		'known_hashes': known_hashes,
+		'known_only': known_only,
+		'changed': 0,
+		'unchanged': []
+	}
 
-	api_updated = int(time.time())
 
-	launch_obj_set = set()
+def ll2_endpoint(name: str, api_call: str, parser, max_results: int,
+	sweep: dict, kind: str = 'launches', single: bool = False,
+	store=None) -> dict:
+	return {
+		'name': name,
+		'kind': kind,
+		'single': single,
+		'api_call': api_call,
+		'parser': parser,
+		'store': store,
+		'max_results': max_results,
+		'sweep': sweep,
+		'results': [],
+		'launches': 0,
+		'pages': 0,
+		'complete': True,
+		'truncated': False,
+		'error': None,
+		'seconds': 0.0,
+		'timing': {
+			'connections': 0,
+			'connect': 0.0,
+			'ttfb': 0.0,
+			'download': 0.0,
+			'bytes': 0,
+			'wire_bytes': 0
+		}
+	}
+
+
+def fetch_parsed_page(client: LL2Client, endpoint: dict, api_call: str,
+	page: dict, data_dir: str, streaming: bool, record_dir: str,
+	pool: ProcessPoolExecutor) -> list:
+	if endpoint['single']:
+		launch_json, page['timing'] = fetch_launch_detail(client=client,
+			api_call=api_call,
+			data_dir=data_dir,
+			record_dir=record_dir)
+		results = [launch_json]
+	elif streaming:
+		results = stream_api_page(client=client,
+			api_call=api_call,
+			page=page,
+			record_dir=record_dir)
+	else:
+		results = fetch_api_page(client=client,
+			api_call=api_call,
+			data_dir=data_dir,
+			page=page,
+			record_dir=record_dir)['results']
+
+	parsed = list(endpoint['parser'](results=results,
+		sweep=endpoint['sweep'],
+		page=page,
+		pool=pool))
+
+	if endpoint['store'] is not None:
+		return endpoint['store'](parsed)
+
+	return parsed
+
 
+async def fetch_ll2_endpoint(loop: asyncio.AbstractEventLoop,
+	executor: ThreadPoolExecutor, client: LL2Client, endpoint: dict,
+	take_budget, **fetch_kwargs) -> dict:
 	t0 = time.time()
+	api_call = endpoint['api_call']
+
+	while api_call is not None:
+		granted, _ = await loop.run_in_executor(executor, take_budget)
+		if not granted:
+			logging.warning(
+				f'{endpoint["name"]}: LL2 request budget spent after {endpoint["pages"]} pages'
+			)
+			endpoint['complete'] = False
+			break
+
+		page = {'next': None, 'launches': 0, 'timing': None}
 
-	for launch in api_json['results']:
 		try:
-			launch_obj_set.add(LaunchLibrary2Launch(launch))
-		except:
-			pass
+			results = await loop.run_in_executor(executor,
+				functools.partial(fetch_parsed_page,
+				client=client,
+				endpoint=endpoint,
+				api_call=api_call,
+				page=page,
+				**fetch_kwargs))
+		except (ValueError, requests.exceptions.RequestException) as error:
+			endpoint['error'] = error
+			endpoint['complete'] = False
+			break
+
+		endpoint['results'].extend(results)
+		endpoint['pages'] += 1
+		endpoint['launches'] += page['launches']
+
+		if page['timing'] is not None:
+			for key in endpoint['timing'].keys():
+				endpoint['timing'][key] += page['timing'][key]
+
+		if endpoint['launches'] < endpoint['max_results']:
+			api_call = page['next']
+		else:
+			endpoint['truncated'] = page['next'] is not None
+			api_call = None
 
-	tdelta = time.time() - t0
+	endpoint['seconds'] = time.time() - t0
+	return endpoint
 
-	postponed_launches = update_launch_db(launch_set=launch_obj_set,
-		db_path=data_dir,
-		bot_username=bot_username,
-		api_update=api_updated)
 
-	clean_launch_db(last_update=api_updated, db_path=data_dir)
+async def fetch_ll2_endpoints(client: LL2Client, endpoints: list,
+	take_budget, workers: int, **fetch_kwargs) -> list:
+	loop = asyncio.get_running_loop()
+
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		return list(await asyncio.gather(*(fetch_ll2_endpoint(loop=loop,
+			executor=executor,
+			client=client,
+			endpoint=endpoint,
+			take_budget=take_budget,
+			**fetch_kwargs) for endpoint in endpoints)))
+
 
-	if len(postponed_launches) > 0:
-		logging.info(f'Found {len(postponed_launches)} postponed launches!')
-		for postpone_tuple in postponed_launches:
-			launch_object = postpone_tuple[0]
+def schedule_api_retry(data_dir: str, scheduler: BackgroundScheduler,
+	bot_username: str, bot: 'telegram.bot.Bot', delay: float):
+	retry_dt = datetime.datetime.fromtimestamp(time.time() + delay)
+
+	scheduler.add_job(ll2_api_call,
+		'date',
+		run_date=retry_dt,
+		args=[data_dir, scheduler, bot_username, bot],
+		id='api-retry',
+		replace_existing=True)
+
+	logging.warning(
+		f'LL2 API call rescheduled in {delay:.0f} s (breaker {LL2_RETRY.state})'
+	)
 
-			notify_list, sent_notification_ids = postpone_notification(
-				db_path=data_dir, postpone_tuple=postpone_tuple, bot=bot)
-			
-			remove_previous_notification(db_path=data_dir,
-				launch_id=launch_object.unique_id,
-				notify_set=notify_list,
-				bot=bot)
 
-			msg_id_str = ','.join(sent_notification_ids)
-			store_notification_identifiers(db_path=data_dir,
-				launch_id=launch_object.unique_id,
-				identifiers=msg_id_str)
+def handle_postponed_launches(data_dir: str, postponed_launches: set,
+	bot: 'telegram.bot.Bot'):
+	if len(postponed_launches) == 0:
+		return
+
+	logging.info(f'Found {len(postponed_launches)} postponed launches!')
+	for postpone_tuple in postponed_launches:
+		launch_object = postpone_tuple[0]
+
+		notify_list, sent_notification_ids = postpone_notification(
+			db_path=data_dir, postpone_tuple=postpone_tuple, bot=bot)
+
+		remove_previous_notification(db_path=data_dir,
+			launch_id=launch_object.unique_id,
+			notify_set=notify_list,
+			bot=bot)
+
+		msg_id_str = ','.join(sent_notification_ids)
+		store_notification_identifiers(db_path=data_dir,
+			launch_id=launch_object.unique_id,
+			identifiers=msg_id_str)
+
+		update_stats_db(stats_update={'notifications': len(notify_list)},
+			db_path=data_dir)
+
+
+def ll2_api_call(data_dir: str, scheduler: BackgroundScheduler,
+	bot_username: str, bot: 'telegram.bot.Bot'):
+	API_VERSION = '2.1.0'
 
-			update_stats_db(stats_update={'notifications': len(notify_list)},
-				db_path=data_dir)
+	api_config = load_api_config(data_dir)
+	API_URL = f"{api_config['api_url'].rstrip('/')}/{API_VERSION}"
+
+	if api_config['record_responses']:
+		record_dir = os.path.join(data_dir, api_config['record_dir'])
+	else:
+		record_dir = None
+	previous_api_update = load_last_api_update(data_dir)
+	high_water_mark = load_api_state(data_dir, 'high_water_mark')
+	last_full_sync = int(load_api_state(data_dir, 'last_full_sync', 0))
+
+	horizon = time.time() + api_config['horizon_days'] * 24 * 3600
+
+	PARAMS = {
+		'mode': 'detailed',
+		'limit': api_config['page_size'],
+		'net__lte': unix_to_timestamp(horizon)
+	}
+
+	incremental = bool(api_config['incremental']
+		and previous_api_update is not None and high_water_mark is not None
+		and time.time() - last_full_sync < api_config['full_sync_interval'])
+
+	if incremental:
+		PARAMS['last_updated__gte'] = high_water_mark
+
+	LL2_RETRY.configure(api_config)
+	request_allowed, breaker_wait = LL2_RETRY.allow_request()
+	if not request_allowed:
+		schedule_api_retry(data_dir=data_dir,
+			scheduler=scheduler,
+			bot_username=bot_username,
+			bot=bot,
+			delay=breaker_wait)
+		return
+
+	budget = load_api_budget(db_path=data_dir, api_config=api_config)
+	if budget.available() < 1:
+		logging.warning(
+			f'LL2 request budget spent ({budget.tokens:.2f}/{budget.capacity})')
+		schedule_api_retry(data_dir=data_dir,
+			scheduler=scheduler,
+			bot_username=bot_username,
+			bot=bot,
+			delay=budget.time_until(1))
+		return
+
+	client = get_ll2_client(bot_username=bot_username)
+
+	api_updated = int(time.time())
+	SUMMARY_CACHE.load(db_path=data_dir)
+
+	if api_config['page_size'] >= api_config['parallel_parse_threshold']:
+		parse_pool = get_parse_pool(db_path=data_dir,
+			workers=api_config['parse_workers'])
+	else:
+		parse_pool = None
+
+	known_hashes = load_launch_hashes(db_path=data_dir)
+	two_tier = api_config['two_tier']
+
+	list_hashes, postponed_launches = {}, set()
+
+	def store_launches(launch_objects: list) -> list:
+		# every page is upserted as its own write job as soon as it is parsed;
+		# only the ids outlive the page
+		for launch_object in launch_objects:
+			if launch_object.unique_id in list_hashes:
+				launch_object.list_hash = list_hashes[launch_object.unique_id]
+
+		if len(launch_objects) > 0:
+			postponed_launches.update(
+				DB_WRITER.write(data_dir, update_launch_db,
+				kwargs={
+				'launch_set': launch_objects,
+				'db_path': data_dir,
+				'bot_username': bot_username,
+				'api_update': api_updated
+				}))
+
+		return [launch_object.unique_id for launch_object in launch_objects]
+
+	if two_tier:
+		list_params = dict(PARAMS,
+			mode='list',
+			limit=min(api_config['list_page_size'], api_config['max_launches']))
+		upcoming_endpoint = ll2_endpoint(name='upcoming',
+			kind='list',
+			api_call=f'{API_URL}/launch/upcoming/{construct_params(list_params)}',
+			parser=parse_list_page,
+			max_results=api_config['max_launches'],
+			sweep=new_sweep(load_launch_hashes(db_path=data_dir, column='list_hash'),
+			high_water_mark=high_water_mark))
+	else:
+		upcoming_endpoint = ll2_endpoint(name='upcoming',
+			api_call=f'{API_URL}/launch/upcoming/{construct_params(PARAMS)}',
+			parser=parse_launch_page,
+			max_results=api_config['max_launches'],
+			sweep=new_sweep(known_hashes, high_water_mark=high_water_mark),
+			store=store_launches)
+
+	endpoints = [upcoming_endpoint]
+
+	last_fetches = {}
+	for name, api_request, params in (('previous', 'launch/previous', {
+		'mode': 'detailed',
+		'limit': api_config['page_size'],
+		'net__gte': unix_to_timestamp(api_updated -
+		api_config['previous_days'] * 24 * 3600)
+	}), ('events', 'event/upcoming', {
+		'limit': api_config['page_size']
+	})):
+		last_fetches[name] = int(load_api_state(data_dir, f'last_{name}_fetch', 0))
+		if api_updated - last_fetches[name] < api_config[f'{name}_interval']:
+			continue
+
+		endpoints.append(
+			ll2_endpoint(name=name,
+			kind='events' if name == 'events' else 'launches',
+			api_call=f'{API_URL}/{api_request}/{construct_params(params)}',
+			parser=parse_event_page if name == 'events' else parse_launch_page,
+			max_results=api_config['page_size'],
+			sweep=new_sweep(known_hashes, known_only=bool(name == 'previous')),
+			store=None if name == 'events' else store_launches))
+
+	fetch_kwargs = {
+		'client': client,
+		'take_budget': functools.partial(take_api_budget, data_dir, api_config),
+		'data_dir': data_dir,
+		'streaming': api_config['streaming_decode'],
+		'record_dir': record_dir,
+		'pool': parse_pool,
+		'workers': api_config['fetch_workers']
+	}
+
+	poll_start = time.time()
+	endpoints = asyncio.run(fetch_ll2_endpoints(endpoints=endpoints,
+		**fetch_kwargs))
+
+	upcoming = endpoints[0]
+	detail_endpoints = []
+	if two_tier and upcoming['pages'] > 0:
+		# second tier: full records only for what the list sweep saw change
+		changed_launches = upcoming['results']
+		list_hashes.update((unique_id, list_hash)
+			for unique_id, _, list_hash in changed_launches)
+
+		if len(changed_launches) == 0:
+			detail_endpoints = []
+		elif len(changed_launches) <= api_config['detail_fetch_max']:
+			detail_endpoints = [
+				ll2_endpoint(name='detail',
+				api_call=f'{API_URL}/launch/{unique_id}/',
+				parser=parse_launch_page,
+				max_results=1,
+				sweep=new_sweep({}),
+				single=True,
+				store=store_launches) for unique_id in list_hashes.keys()
+			]
+		else:
+			updated_since = min(last_updated
+				for _, last_updated, _ in changed_launches
+				if last_updated is not None)
+			detail_params = dict(PARAMS, last_updated__gte=updated_since)
+			detail_endpoints = [
+				ll2_endpoint(name='detailed',
+				api_call=f'{API_URL}/launch/upcoming/{construct_params(detail_params)}',
+				parser=parse_launch_page,
+				max_results=api_config['max_launches'],
+				sweep=new_sweep({}),
+				store=store_launches)
+			]
+
+		if len(detail_endpoints) > 0:
+			endpoints.extend(
+				asyncio.run(
+				fetch_ll2_endpoints(endpoints=detail_endpoints, **fetch_kwargs)))
+
+	poll_time = time.time() - poll_start
+
+	for endpoint in endpoints:
+		if endpoint['error'] is None:
+			continue
+
+		if isinstance(endpoint['error'], ValueError):
+			logging.error(f'{endpoint["name"]}: ошибка json {endpoint["error"]}')
+		else:
+			logging.warning(f'{endpoint["name"]}: ошибка {endpoint["error"]}')
+
+		retry_delay = LL2_RETRY.record_failure(endpoint['error'])
+		if endpoint is upcoming and upcoming['pages'] == 0:
+			schedule_api_retry(data_dir=data_dir,
+				scheduler=scheduler,
+				bot_username=bot_username,
+				bot=bot,
+				delay=retry_delay)
+			return
+
+	sweep_complete = upcoming['complete']
+	if sweep_complete:
+		LL2_RETRY.record_success()
+
+	# the pages themselves were paid for as they were fetched
+	if sweep_complete:
+		store_api_state(db_path=data_dir,
+			state={'poll_cost': sum(endpoint['pages'] for endpoint in endpoints)})
+
+	# launch endpoints kept only the ids of the launches they wrote
+	stored_ids, unchanged_ids, events = set(), [], []
+	for endpoint in endpoints:
+		unchanged_ids.extend(endpoint['sweep']['unchanged'])
+		if endpoint['kind'] == 'events':
+			events.extend(endpoint['results'])
+		elif endpoint['kind'] == 'launches':
+			stored_ids.update(endpoint['results'])
+
+	missed_details = []
+	if two_tier:
+		for unique_id in list_hashes.keys():
+			if unique_id not in stored_ids:
+				# the list sweep still saw it, so the row stays fresh; its old
+				# list hash and the held mark below bring it back next poll
+				unchanged_ids.append(unique_id)
+
+		missed_details = [
+			last_updated for unique_id, last_updated, _ in upcoming['results']
+			if unique_id not in stored_ids
+		]
+		if len(missed_details) > 0:
+			logging.warning(f'{len(missed_details)} changed launches missing details')
+
+	def write_poll():
+		conn = connect_db(data_dir)
+		conn.row_factory = sqlite3.Row
+
+		if len(unchanged_ids) > 0:
+			touch_launches(db_path=data_dir,
+				unique_ids=unchanged_ids,
+				api_update=api_updated,
+				conn=conn)
+
+		for endpoint in endpoints:
+			if endpoint['kind'] == 'events':
+				update_event_db(db_path=data_dir,
+					events=events,
+					api_update=api_updated,
+					complete=endpoint['complete'] and not endpoint['truncated'],
+					conn=conn)
+
+		conn.close()
+
+	DB_WRITER.write(data_dir, write_poll)
+
+	# a delta cut short at max_launches dropped changes past its last page; a
+	# full sweep's cap is just the tracked window
+	sweep_finished = sweep_complete and not (incremental and upcoming['truncated'])
+
+	# the mark only moves once every launch below it has been seen
+	api_state = {}
+	if sweep_finished:
+		api_state['high_water_mark'] = upcoming['sweep']['high_water_mark']
+
+		# a delta from past the mark would skip a launch whose details failed
+		if len(missed_details) > 0 and None not in missed_details and api_state[
+			'high_water_mark'] is not None:
+			api_state['high_water_mark'] = min(api_state['high_water_mark'],
+				*missed_details)
+
+	for endpoint in endpoints[1:]:
+		if endpoint['name'] in last_fetches and endpoint['complete']:
+			api_state[f'last_{endpoint["name"]}_fetch'] = api_updated
+
+	if incremental and sweep_finished:
+		carry_forward_launches(db_path=data_dir,
+			since=previous_api_update,
+			api_update=api_updated)
+
+		# last_updated__gte also returns launches whose hash still matches
+		logging.info(
+			f'delta: {upcoming["sweep"]["changed"]} launches changed or new, '
+			f'{upcoming["launches"]} returned since {PARAMS["last_updated__gte"]}'
+		)
+	elif incremental:
+		# rows the delta never reached can't be carried forward; the next
+		# poll re-reads everything instead
+		api_state['last_full_sync'] = 0
+		logging.warning(
+			f'delta since {PARAMS["last_updated__gte"]} incomplete, next poll is a full sync'
+		)
+	elif sweep_complete:
+		clean_launch_db(last_update=api_updated, db_path=data_dir)
+		api_state['last_full_sync'] = api_updated
+
+	if None in missed_details:
+		# no last_updated to hold the mark at, so re-read everything
+		api_state['last_full_sync'] = 0
+
+	store_api_state(db_path=data_dir, state=api_state)
+
+	parse_errors = [
+		parse_error for endpoint in endpoints
+		for parse_error in endpoint['sweep']['parse_errors']
+	]
+	if len(parse_errors) > 0:
+		logging.warning(
+			f'{len(parse_errors)} launches failed to parse: {parse_errors}')
+		record_parse_errors(db_path=data_dir,
+			parse_errors=parse_errors,
+			api_update=api_updated)
+
+	changed_count = sum(endpoint['sweep']['changed']
+		for endpoint in endpoints[:len(endpoints) - len(detail_endpoints)])
+	logging.info(
+		f'launches: {changed_count} changed, {len(unchanged_ids)} unchanged')
+
+	api_stats = {'api_poll_ms': int(poll_time * 1000)}
+	for endpoint in endpoints:
+		timing = endpoint['timing']
+		logging.info(
+			f'{endpoint["name"]}: {endpoint["pages"]} pages, {endpoint["launches"]} results, '
+			f'{timing["bytes"]} bytes in {endpoint["seconds"]:.3f} s '
+			f'(connect {timing["connect"]:.3f} s, ttfb {timing["ttfb"]:.3f} s, download {timing["download"]:.3f} s)'
+		)
+
+		for stat, val in (('api_requests', endpoint['pages']),
+			('api_pages', endpoint['pages']),
+			('api_page_ms', int((timing['connect'] + timing['ttfb'] +
+			timing['download']) * 1000)),
+			('api_connect_ms', int(timing['connect'] * 1000)),
+			('api_ttfb_ms', int(timing['ttfb'] * 1000)),
+			('api_download_ms', int(timing['download'] * 1000)),
+			('api_connections', timing['connections']),
+			('data', timing['bytes']), ('data_wire', timing['wire_bytes']),
+			(f'api_{endpoint["name"]}_ms', int(endpoint['seconds'] * 1000)),
+			(f'api_{endpoint["name"]}_pages', endpoint['pages'])):
+			api_stats[stat] = api_stats.get(stat, 0) + val
+
+	logging.info(
+		f'poll took {poll_time:.3f} s over {len(endpoints)} endpoints '
+		f'(slowest {max(endpoint["seconds"] for endpoint in endpoints):.3f} s)')
+
+	if two_tier:
+		# baseline: the same listing fetched with mode=detailed, priced from
+		# the detailed pages we do see
+		launch_bytes = float(load_api_state(data_dir, 'detailed_launch_bytes', 0))
+		for endpoint in endpoints:
+			if endpoint['name'] in ('detailed', 'previous') and endpoint['launches'] > 0:
+				page_launch_bytes = endpoint['timing']['bytes'] / endpoint['launches']
+				launch_bytes = page_launch_bytes if launch_bytes == 0 else (
+					0.8 * launch_bytes + 0.2 * page_launch_bytes)
+
+		if launch_bytes > 0:
+			store_api_state(db_path=data_dir,
+				state={'detailed_launch_bytes': int(launch_bytes)})
+
+			two_tier_bytes = upcoming['timing']['bytes'] + sum(
+				endpoint['timing']['bytes'] for endpoint in detail_endpoints)
+			api_stats['data_saved'] = int(launch_bytes * upcoming['launches'] -
+				two_tier_bytes)
+
+			logging.info(
+				f'two-tier: {len(list_hashes)} of {upcoming["launches"]} launches fetched in detail, '
+				f'{two_tier_bytes} bytes vs ~{int(launch_bytes * upcoming["launches"])} always-detailed'
+			)
+
+	update_stats_db(stats_update=api_stats, db_path=data_dir)
+
+	summary_hits, summary_misses = SUMMARY_CACHE.flush(db_path=data_dir)
+	logging.info(
+		f'description summaries: {summary_hits} cached, {summary_misses} tokenized'
+	)
+
+	handle_postponed_launches(data_dir=data_dir,
+		postponed_launches=postponed_launches,
+		bot=bot)
 
 	update_stats_db(stats_update={
-		'api_requests': 1,
 		'db_updates': 1,
-		'data': rec_data,
+		'summary_hits': summary_hits,
+		'summary_misses': summary_misses,
+		'parse_errors': len(parse_errors),
+		'launches_changed': changed_count,
+		'launches_unchanged': len(unchanged_ids),
 		'last_api_update': api_updated
 	},
 		db_path=data_dir)
@@ -518,54 +1256,246 @@ def ll2_api_call(data_dir: str, scheduler: BackgroundScheduler,
 		bot=bot)
 
 
-def api_call_scheduler(db_path: str, scheduler: BackgroundScheduler,
-	ignore_60: bool, bot_username: str, bot: 'telegram.bot.Bot'):
+def fetch_launch_detail(client: LL2Client, api_call: str, data_dir: str,
+	record_dir: str = None) -> tuple:
+	API_RESPONSE, timing = client.get(api_call, record_dir=record_dir)
 
-	def schedule_call(unix_timestamp: int) -> int:
-		if unix_timestamp <= int(time.time()):
-			unix_timestamp = int(time.time()) + 3
+	try:
+		launch_json = json.loads(API_RESPONSE.text)
+	except ValueError:
+		with open(os.path.join(data_dir, f'error-json-{int(time.time())}.txt'),
+			'w') as ejson:
+			ejson.write(API_RESPONSE.text)
 
-		until_update = unix_timestamp - int(time.time())
+		raise
 
-		next_update_dt = datetime.datetime.fromtimestamp(unix_timestamp)
+	if 'id' not in launch_json:
+		raise ValueError(f'no launch in LL2 response: {launch_json}')
 
-		scheduler.add_job(ll2_api_call,
-			'date',
-			run_date=next_update_dt,
-			args=[db_path, scheduler, bot_username, bot],
-			id=f'api-{unix_timestamp}')
+	return launch_json, timing
 
-		return unix_timestamp
 
-	def require_immediate_update(cursor: sqlite3.Cursor) -> tuple:
-		try:
-			cursor.execute('SELECT last_api_update FROM stats')
-		except sqlite3.OperationalError:
-			return (True, None)
+def load_focus_launches(cursor: sqlite3.Cursor, window_start: int,
+	window_end: int) -> list:
+	try:
+		cursor.execute(
+			'SELECT unique_id, net_unix FROM launches WHERE launched = 0 AND status_state != ? AND net_unix BETWEEN ? AND ?',
+			('TBD', window_start, window_end))
+		return cursor.fetchall()
+	except sqlite3.OperationalError:
+		return []
 
-		last_update = cursor.fetchall()[0][0]
-		if last_update in ('', None):
-			return (True, None)
 
-		return (True,
-			None) if time.time() > last_update + UPDATE_PERIOD * 60 * 2 else (
-			False, last_update)
+def schedule_focus_poll(data_dir: str, scheduler: BackgroundScheduler,
+	bot_username: str, bot: 'telegram.bot.Bot', unique_id: str,
+	run_time: int) -> int:
+	run_time = max(int(time.time()) + 3, int(run_time))
 
-	UPDATE_PERIOD = 15
+	scheduler.add_job(ll2_focus_call,
+		'date',
+		run_date=datetime.datetime.fromtimestamp(run_time),
+		args=[data_dir, scheduler, bot_username, bot, unique_id],
+		id=f'api-focus-{unique_id}',
+		replace_existing=True)
 
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
-	cursor = conn.cursor()
+	return run_time
 
-	db_status = require_immediate_update(cursor)
-	update_immediately, last_update = db_status[0], db_status[1]
 
-	if update_immediately:
-		return schedule_call(int(time.time()) + 5)
+def schedule_focus_polls(data_dir: str, scheduler: BackgroundScheduler,
+	bot_username: str, bot: 'telegram.bot.Bot', cursor: sqlite3.Cursor,
+	api_config: dict, next_api_update: int) -> int:
+	now = int(time.time())
+	focus_launches = load_focus_launches(cursor=cursor,
+		window_start=now - api_config['focus_after'],
+		window_end=next_api_update + api_config['focus_before'])
 
-	update_delta = int(time.time()) - last_update
-	last_updated_str = time_delta_to_legible_eta(update_delta,
-		full_accuracy=False)
+	scheduled = 0
+	for unique_id, net_unix in focus_launches:
+		focus_start = net_unix - api_config['focus_before']
+
+		# a running focus loop keeps its own cadence
+		focus_job = scheduler.get_job(f'api-focus-{unique_id}')
+		if focus_job is not None and focus_job.next_run_time.timestamp(
+		) <= focus_start + api_config['focus_interval']:
+			continue
+
+		run_time = schedule_focus_poll(data_dir=data_dir,
+			scheduler=scheduler,
+			bot_username=bot_username,
+			bot=bot,
+			unique_id=unique_id,
+			run_time=focus_start)
+
+		logging.info(
+			f'🎯 focus polling for {unique_id} starts in {run_time - now} s')
+		scheduled += 1
+
+	return scheduled
+
+
+def write_focus_launch(db_path: str, launch_object: 'LaunchLibrary2Launch',
+	bot_username: str, api_update: int) -> tuple:
+	conn = connect_db(db_path)
+	conn.row_factory = sqlite3.Row
+
+	try:
+		previous_row = conn.execute(
+			'''SELECT net_unix, status_state, in_hold, webcast_islive, last_updated
+			FROM launches WHERE unique_id = ?''', (launch_object.unique_id, )).fetchone()
+	except sqlite3.OperationalError:
+		previous_row = None
+
+	# a known launch keeps the poll generation it already has: notification_handler
+	# treats a last_updated other than stats.last_api_update as stale, and only
+	# the regular poll moves that
+	if previous_row is not None and previous_row['last_updated'] is not None:
+		api_update = previous_row['last_updated']
+
+	# the detail endpoint serializes more than mode=detailed, so its hash
+	# is never comparable; the next sweep re-hashes the launch
+	postponed_launches = update_launch_db(launch_set=[launch_object],
+		db_path=db_path,
+		bot_username=bot_username,
+		api_update=api_update,
+		conn=conn)
+
+	conn.close()
+	return previous_row, postponed_launches
+
+
+def ll2_focus_call(data_dir: str, scheduler: BackgroundScheduler,
+	bot_username: str, bot: 'telegram.bot.Bot', unique_id: str):
+	API_VERSION = '2.1.0'
+
+	api_config = load_api_config(data_dir)
+	API_URL = f"{api_config['api_url'].rstrip('/')}/{API_VERSION}"
+
+	if api_config['record_responses']:
+		record_dir = os.path.join(data_dir, api_config['record_dir'])
+	else:
+		record_dir = None
+
+	rd = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+	next_api_update = rd.get('next-api-update')
+	next_api_update = int(
+		float(next_api_update)) if next_api_update is not None else None
+
+	def reschedule(run_time: int) -> int:
+		return schedule_focus_poll(data_dir=data_dir,
+			scheduler=scheduler,
+			bot_username=bot_username,
+			bot=bot,
+			unique_id=unique_id,
+			run_time=run_time)
+
+	LL2_RETRY.configure(api_config)
+	request_allowed, breaker_wait = LL2_RETRY.allow_request()
+	if not request_allowed:
+		reschedule(time.time() + max(breaker_wait, api_config['focus_interval']))
+		return
+
+	# focus polls must not eat the tokens the next regular poll needs
+	poll_cost = int(load_api_state(data_dir, 'poll_cost', 1))
+	granted, budget = take_api_budget(db_path=data_dir,
+		api_config=api_config,
+		count=1,
+		reserve=poll_cost)
+	if not granted:
+		reschedule(time.time() +
+			max(budget.time_until(1 + poll_cost), api_config['focus_interval']))
+		return
+
+	client = get_ll2_client(bot_username=bot_username)
+
+	api_updated = int(time.time())
+	try:
+		launch_json, timing = fetch_launch_detail(client=client,
+			api_call=f'{API_URL}/launch/{unique_id}/',
+			data_dir=data_dir,
+			record_dir=record_dir)
+	except (ValueError, requests.exceptions.RequestException) as error:
+		if isinstance(error, requests.exceptions.HTTPError) and getattr(
+			error.response, 'status_code', None) == 404:
+			logging.warning(f'🎯 {unique_id}: launch gone from LL2, focus stopped')
+			return
+
+		logging.warning(f'🎯 {unique_id}: ошибка {error}')
+		retry_delay = LL2_RETRY.record_failure(error)
+		reschedule(time.time() + max(retry_delay, api_config['focus_interval']))
+		return
+
+	LL2_RETRY.record_success()
+
+	SUMMARY_CACHE.load(db_path=data_dir)
+	try:
+		launch_object = LaunchLibrary2Launch(launch_json)
+	except Exception as error:
+		parse_error = parse_error_record(launch_json, error)
+		logging.warning(f'🎯 {unique_id}: failed to parse: {parse_error}')
+		record_parse_errors(db_path=data_dir,
+			parse_errors=[parse_error],
+			api_update=api_updated)
+		reschedule(time.time() + api_config['focus_interval'])
+		return
+
+	previous_row, postponed_launches = DB_WRITER.write(data_dir, write_focus_launch,
+		kwargs={
+		'db_path': data_dir,
+		'launch_object': launch_object,
+		'bot_username': bot_username,
+		'api_update': api_updated
+		})
+
+	summary_hits, summary_misses = SUMMARY_CACHE.flush(db_path=data_dir)
+
+	changes = []
+	if previous_row is not None:
+		for field in ('net_unix', 'status_state', 'in_hold', 'webcast_islive'):
+			old_val, new_val = previous_row[field], getattr(launch_object, field)
+			if old_val != new_val:
+				changes.append(f'{field} {old_val} → {new_val}')
+
+	logging.info(
+		f'🎯 {launch_object.name}: {", ".join(changes) if len(changes) > 0 else "no changes"} '
+		f'({timing["bytes"]} bytes in {timing["connect"] + timing["ttfb"] + timing["download"]:.3f} s)'
+	)
+
+	update_stats_db(stats_update={
+		'api_requests': 1,
+		'api_focus_requests': 1,
+		'api_focus_changes': len(changes),
+		'data': timing['bytes'],
+		'data_wire': timing['wire_bytes'],
+		'summary_hits': summary_hits,
+		'summary_misses': summary_misses
+	},
+		db_path=data_dir)
+
+	handle_postponed_launches(data_dir=data_dir,
+		postponed_launches=postponed_launches,
+		bot=bot)
 
+	now = int(time.time())
+	focus_start = launch_object.net_unix - api_config['focus_before']
+	next_focus = max(now + api_config['focus_interval'], focus_start)
+
+	# the regular poll restarts the loop if the launch comes back into range
+	if (launch_object.launched or launch_object.status_state == 'TBD'
+		or now > launch_object.net_unix + api_config['focus_after'] or
+		(next_api_update is not None and focus_start > next_api_update)):
+		logging.info(f'🎯 {launch_object.name}: focus polling done')
+		next_focus = None
+	else:
+		reschedule(next_focus)
+
+	notification_send_scheduler(db_path=data_dir,
+		next_api_update_time=max(next_api_update or 0, next_focus or 0, now),
+		scheduler=scheduler,
+		bot_username=bot_username,
+		bot=bot)
+
+
+def load_schedule_rows(cursor: sqlite3.Cursor) -> list:
 	select_fields = 'net_unix, launched, status_state'
 	select_fields += ', notify_24h, notify_12h, notify_60min, notify_5min'
 	notify_window = int(time.time()) - 60 * 5
@@ -574,21 +1504,17 @@ def api_call_scheduler(db_path: str, scheduler: BackgroundScheduler,
 		cursor.execute(
 			f'SELECT {select_fields} FROM launches WHERE net_unix >= ?',
 			(notify_window, ))
-		query_return = cursor.fetchall()
+		return cursor.fetchall()
 	except sqlite3.OperationalError:
-		query_return = set()
+		return []
 
-	conn.close()
 
-	if len(query_return) == 0:
-		os.rename(
-			os.path.join(db_path, 'launchbot-data.db'),
-			os.path.join(db_path,
-			f'launchbot-data-sched-error-{int(time.time())}.db'))
-
-		return schedule_call(int(time.time()) + 5)
+def next_api_update_time(launch_rows: list, last_update: int,
+	ignore_60: bool, budget: 'TokenBucket' = None, poll_cost: int = 1,
+	focused: bool = False) -> int:
+	update_delta = int(time.time()) - last_update
 
-	query_return.sort(key=lambda tup: tup[0])
+	launch_rows = sorted(launch_rows, key=lambda tup: tup[0])
 	notif_times, time_map = set(), {
 		0: 24 * 3600,
 		1: 12 * 3600,
@@ -597,11 +1523,15 @@ def api_call_scheduler(db_path: str, scheduler: BackgroundScheduler,
 	}
 	notif_time_map = dict()
 
-	for launch_row in query_return:
+	for launch_row in launch_rows:
 		launch_status = launch_row[2]
 		if launch_status == 'TBD':
 			continue
-		if not launch_row[1] and time.time() - launch_row[0] < 60:
+
+		# with focus polling the 5m and launch checks ride on the focus loop
+		if focused:
+			pass
+		elif not launch_row[1] and time.time() - launch_row[0] < 60:
 			notif_times.add(launch_row[0] + 5 * 60)
 
 			check_time = launch_row[0] + 5 * 60
@@ -611,6 +1541,9 @@ def api_call_scheduler(db_path: str, scheduler: BackgroundScheduler,
 				notif_time_map[check_time].add(-1)
 
 		for enum, notif_bool in enumerate(launch_row[3::]):
+			if focused and enum == 3:
+				continue
+
 			if not notif_bool:
 				check_time = launch_row[0] - time_map[enum] - 60
 				if check_time - int(time.time()) < 60 and ignore_60:
@@ -625,6 +1558,16 @@ def api_call_scheduler(db_path: str, scheduler: BackgroundScheduler,
 					else:
 						notif_time_map[check_time].add(enum)
 
+	if len(notif_times) == 0:
+		next_auto_update = int(time.time()) + UPDATE_PERIOD * 4 * 60 - update_delta
+		if budget is None:
+			return next_auto_update
+
+		return budgeted_update_time(budget=budget,
+			notif_time_map=notif_time_map,
+			auto_update=next_auto_update,
+			poll_cost=poll_cost)
+
 	next_notif = min(notif_times)
 
 	next_notif_earliest_type = max(notif_time_map[next_notif])
@@ -663,14 +1606,112 @@ def api_call_scheduler(db_path: str, scheduler: BackgroundScheduler,
 
 	to_next_update = int(UPDATE_PERIOD * upd_period_mult) * 60 - update_delta
 	next_auto_update = int(time.time()) + to_next_update
+
+	if budget is not None:
+		return budgeted_update_time(budget=budget,
+			notif_time_map=notif_time_map,
+			auto_update=next_auto_update,
+			poll_cost=poll_cost)
+
 	notif_times.add(next_auto_update)
 
-	next_api_update = min(notif_times)
+	return min(notif_times)
+
+
+def api_call_scheduler(db_path: str, scheduler: BackgroundScheduler,
+	ignore_60: bool, bot_username: str, bot: 'telegram.bot.Bot'):
+
+	def schedule_call(unix_timestamp: int) -> int:
+		if unix_timestamp <= int(time.time()):
+			unix_timestamp = int(time.time()) + 3
+
+		until_update = unix_timestamp - int(time.time())
+
+		next_update_dt = datetime.datetime.fromtimestamp(unix_timestamp)
+
+		scheduler.add_job(ll2_api_call,
+			'date',
+			run_date=next_update_dt,
+			args=[db_path, scheduler, bot_username, bot],
+			id=f'api-{unix_timestamp}')
+
+		return unix_timestamp
+
+	def require_immediate_update(cursor: sqlite3.Cursor) -> tuple:
+		try:
+			cursor.execute('SELECT last_api_update FROM stats')
+		except sqlite3.OperationalError:
+			return (True, None)
+
+		last_update = cursor.fetchall()[0][0]
+		if last_update in ('', None):
+			return (True, None)
+
+		return (True,
+			None) if time.time() > last_update + UPDATE_PERIOD * 60 * 2 else (
+			False, last_update)
+
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	db_status = require_immediate_update(cursor)
+	update_immediately, last_update = db_status[0], db_status[1]
+
+	if update_immediately:
+		conn.close()
+		return schedule_call(int(time.time()) + 5)
+
+	query_return = load_schedule_rows(cursor)
+	conn.close()
+
+	if len(query_return) == 0:
+		DB_WRITER.flush(db_path)
+		DB_CONNECTIONS.detach(db_path)
+		os.rename(
+			os.path.join(db_path, 'launchbot-data.db'),
+			os.path.join(db_path,
+			f'launchbot-data-sched-error-{int(time.time())}.db'))
+
+		apply_migrations(db_path=db_path)
+
+		return schedule_call(int(time.time()) + 5)
+
+	api_config = load_api_config(db_path)
+	budget = load_api_budget(db_path=db_path, api_config=api_config)
+	poll_cost = int(load_api_state(db_path, 'poll_cost', 1))
+
+	next_api_update = next_api_update_time(launch_rows=query_return,
+		last_update=last_update,
+		ignore_60=ignore_60,
+		budget=budget,
+		poll_cost=poll_cost,
+		focused=api_config['focus_polling'])
+
+	budget_exhaustion = budget.exhaustion_time(
+		poll_interval=next_api_update - time.time(), poll_cost=poll_cost)
+
+	update_stats_db(stats_update={
+		'api_budget_remaining': int(budget.available()),
+		'api_budget_exhaustion':
+		budget_exhaustion if budget_exhaustion is not None else 0
+	},
+		db_path=db_path)
 
 	rd = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
 	rd.flushdb()
 	rd.set('next-api-update', next_api_update)
 
+	if api_config['focus_polling']:
+		conn = connect_db(db_path)
+		schedule_focus_polls(data_dir=db_path,
+			scheduler=scheduler,
+			bot_username=bot_username,
+			bot=bot,
+			cursor=conn.cursor(),
+			api_config=api_config,
+			next_api_update=next_api_update)
+		conn.close()
+
 	return schedule_call(next_api_update)
 
 
@@ -0,0 +1,231 @@
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+import subprocess
+
+import ujson as json
+
+from api import (LaunchLibrary2Launch, clean_launch_db, load_schedule_rows,
+	next_api_update_time)
+from db import update_launch_db
+from dbconn import DB_CONNECTIONS, connect_db
+from summary import SUMMARY_CACHE
+from synthetic import synthetic_launch, synthetic_results
+
+
+def peak_rss_kb() -> int:
+	# a high-water mark for the whole process: it only ever grows, so it can't
+	# tell one stage (or size) from the one before it
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def repo_version() -> str:
+	try:
+		return subprocess.check_output(
+			['git', 'describe', '--always', '--dirty'],
+			cwd=os.path.dirname(os.path.abspath(__file__)),
+			stderr=subprocess.DEVNULL).decode().strip()
+	except Exception:
+		return None
+
+
+def timed_stage(results: dict, stage: str, launch_count: int, func):
+	if tracemalloc.is_tracing():
+		tracemalloc.reset_peak()
+		traced_start = tracemalloc.get_traced_memory()[0]
+
+	t0 = time.perf_counter()
+	value = func()
+	elapsed = time.perf_counter() - t0
+
+	results[stage] = {
+		'seconds': round(elapsed, 6),
+		'launches': launch_count,
+		'launches_per_sec': round(launch_count / elapsed, 1) if elapsed > 0 else None,
+		'cumulative_peak_rss_kb': peak_rss_kb()
+	}
+
+	# the stage's own peak: how far the heap grew above where the stage found it
+	if tracemalloc.is_tracing():
+		results[stage]['peak_traced_kb'] = (tracemalloc.get_traced_memory()[1] -
+			traced_start) // 1024
+
+	logging.info(
+		f'{stage}: {launch_count} launches in {elapsed:.3f} s ({results[stage]["launches_per_sec"]}/s)'
+	)
+
+	return value
+
+
+def revise_results(launch_count: int, start_unix: int, spacing: int,
+	last_updated: int, stale_every: int) -> list:
+	revised = []
+	for idx in range(launch_count):
+		if stale_every > 0 and idx % stale_every == 0:
+			continue
+
+		net_slip = 3600 if idx % 5 == 0 else 0
+		revised.append(
+			synthetic_launch(idx=idx,
+			net_unix=start_unix + (idx + 1) * spacing + net_slip,
+			last_updated=last_updated,
+			revision=1))
+
+	return revised
+
+
+def run_size(launch_count: int, spacing: int, stale_every: int,
+	keep_db: bool) -> dict:
+	data_dir = tempfile.mkdtemp(prefix=f'launchbot-bench-{launch_count}-')
+	start_unix = int(time.time()) + 3600
+	first_update = int(time.time())
+	second_update = first_update + 60
+
+	stages = {}
+	try:
+		SUMMARY_CACHE.load(db_path=data_dir)
+
+		launch_jsons = synthetic_results(count=launch_count,
+			start_unix=start_unix,
+			spacing=spacing)
+
+		launches = timed_stage(stages, 'parse', launch_count,
+			lambda: [LaunchLibrary2Launch(launch_json) for launch_json in launch_jsons])
+		del launch_jsons
+
+		timed_stage(stages, 'update_launch_db_insert', launch_count,
+			lambda: update_launch_db(launch_set=launches,
+			db_path=data_dir,
+			bot_username='benchmark',
+			api_update=first_update))
+		del launches
+
+		revised_jsons = revise_results(launch_count=launch_count,
+			start_unix=start_unix,
+			spacing=spacing,
+			last_updated=second_update,
+			stale_every=stale_every)
+
+		revised = timed_stage(stages, 'parse_cached_summaries',
+			len(revised_jsons),
+			lambda: [LaunchLibrary2Launch(launch_json) for launch_json in revised_jsons])
+		del revised_jsons
+
+		slipped = timed_stage(stages, 'update_launch_db_update', len(revised),
+			lambda: update_launch_db(launch_set=revised,
+			db_path=data_dir,
+			bot_username='benchmark',
+			api_update=second_update))
+		stages['update_launch_db_update']['net_slips'] = len(slipped)
+		del revised
+
+		timed_stage(stages, 'clean_launch_db', launch_count,
+			lambda: clean_launch_db(last_update=second_update, db_path=data_dir))
+
+		def recompute_schedule() -> int:
+			conn = connect_db(data_dir)
+			launch_rows = load_schedule_rows(conn.cursor())
+			conn.close()
+
+			return next_api_update_time(launch_rows=launch_rows,
+				last_update=second_update,
+				ignore_60=True)
+
+		timed_stage(stages, 'scheduler', launch_count, recompute_schedule)
+
+		conn = connect_db(data_dir)
+		db_launches = conn.execute('SELECT COUNT(*) FROM launches').fetchone()[0]
+		conn.close()
+		DB_CONNECTIONS.detach(data_dir)
+
+		return {
+			'launches': launch_count,
+			'launches_in_db': db_launches,
+			'db_bytes': os.path.getsize(os.path.join(data_dir,
+			'launchbot-data.db')),
+			'stages': stages
+		}
+	finally:
+		SUMMARY_CACHE.drain()
+		SUMMARY_CACHE.db_path = None
+		DB_CONNECTIONS.detach(data_dir)
+
+		if keep_db:
+			logging.info(f'база оставлена в {data_dir}')
+		else:
+			shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser('benchmark.py')
+
+	parser.add_argument('--sizes',
+		dest='sizes',
+		default='30,1000,100000',
+		help='Comma-separated synthetic result sizes')
+	parser.add_argument('--spacing',
+		dest='spacing',
+		type=int,
+		default=6 * 3600,
+		help='Seconds between synthetic launch NETs')
+	parser.add_argument('--stale-every',
+		dest='stale_every',
+		type=int,
+		default=10,
+		help='Every Nth launch disappears in the second poll, for clean_launch_db'
+	)
+	parser.add_argument('--output',
+		dest='output',
+		help='Write JSON results here instead of stdout')
+	parser.add_argument('--no-tracemalloc',
+		dest='tracemalloc',
+		help='Skip the per-stage traced Python heap peaks (faster, timings only)',
+		action='store_false')
+	parser.add_argument('--keep-db',
+		dest='keep_db',
+		help='Keep the benchmark databases',
+		action='store_true')
+
+	args = parser.parse_args()
+
+	logging.basicConfig(level=logging.INFO,
+		format='%(asctime)s %(message)s',
+		datefmt='%d/%m/%Y %H:%M:%S',
+		stream=sys.stderr)
+
+	if args.tracemalloc:
+		tracemalloc.start()
+
+	report = {
+		'version': repo_version(),
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'time': int(time.time()),
+		'tracemalloc': args.tracemalloc,
+		'results': []
+	}
+
+	for size in sorted(int(size) for size in args.sizes.split(',')):
+		logging.info(f'⏱ {size} launches')
+		report['results'].append(
+			run_size(launch_count=size,
+			spacing=args.spacing,
+			stale_every=args.stale_every,
+			keep_db=args.keep_db))
+
+	report['db_connections'] = DB_CONNECTIONS.stats()
+	report_json = json.dumps(report, indent=2)
+
+	if args.output is not None:
+		with open(args.output, 'w') as report_file:
+			report_file.write(report_json + '\n')
+	else:
+		print(report_json)
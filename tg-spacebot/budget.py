@@ -0,0 +1,121 @@
+import time
+
+import ujson as json
+
+from db import load_api_state, store_api_state
+from dbwriter import DB_WRITER
+
+PRIORITY_NOTIFICATIONS = {2, 3, -1}
+
+
+class TokenBucket:
+	def __init__(self, capacity: float, refill_rate: float,
+		tokens: float = None, updated: float = None):
+		self.capacity = capacity
+		self.refill_rate = refill_rate
+		self.tokens = capacity if tokens is None else min(tokens, capacity)
+		self.updated = time.time() if updated is None else updated
+
+	def refill(self, now: float = None):
+		now = time.time() if now is None else now
+		if now > self.updated:
+			self.tokens = min(self.capacity,
+				self.tokens + (now - self.updated) * self.refill_rate)
+			self.updated = now
+
+	def available(self, now: float = None) -> float:
+		self.refill(now)
+		return self.tokens
+
+	def consume(self, count: float = 1, now: float = None):
+		self.refill(now)
+		self.tokens -= count
+
+	def time_until(self, count: float, now: float = None) -> float:
+		self.refill(now)
+		if self.tokens >= count:
+			return 0
+
+		return (count - self.tokens) / self.refill_rate
+
+	def exhaustion_time(self, poll_interval: float, poll_cost: float,
+		now: float = None) -> int:
+		now = time.time() if now is None else now
+		drain = poll_cost / max(1, poll_interval) - self.refill_rate
+		if drain <= 0:
+			return None
+
+		return int(now + max(0, self.available(now)) / drain)
+
+	def to_json(self) -> str:
+		return json.dumps({'tokens': self.tokens, 'updated': self.updated})
+
+
+def load_api_budget(db_path: str, api_config: dict) -> TokenBucket:
+	capacity = api_config['hourly_budget']
+	stored_budget = load_api_state(db_path, 'request_budget')
+
+	if stored_budget is None:
+		return TokenBucket(capacity=capacity, refill_rate=capacity / 3600)
+
+	stored_budget = json.loads(stored_budget)
+	return TokenBucket(capacity=capacity,
+		refill_rate=capacity / 3600,
+		tokens=stored_budget['tokens'],
+		updated=stored_budget['updated'])
+
+
+def store_api_budget(db_path: str, budget: TokenBucket, poll_cost: int = None):
+	state = {'request_budget': budget.to_json()}
+	if poll_cost is not None:
+		state['poll_cost'] = poll_cost
+
+	store_api_state(db_path=db_path, state=state)
+
+
+def take_api_budget(db_path: str, api_config: dict, count: float = 1,
+	reserve: float = 0) -> tuple:
+	# load, check and spend in one writer job: sweeps and focus polls overlap,
+	# and a bucket held in memory across requests would overwrite the others'
+	# spending when stored
+	def spend() -> tuple:
+		budget = load_api_budget(db_path=db_path, api_config=api_config)
+		if budget.available() < count + reserve:
+			return False, budget
+
+		budget.consume(count)
+		store_api_budget(db_path=db_path, budget=budget)
+		return True, budget
+
+	return DB_WRITER.write(db_path, spend)
+
+
+def budgeted_update_time(budget: TokenBucket, notif_time_map: dict,
+	auto_update: int, poll_cost: int, now: float = None) -> int:
+	# priority checks need one poll's worth of tokens; everything else has
+	# to leave enough for the priority checks due within the next hour
+	now = time.time() if now is None else now
+
+	priority_checks = sorted(
+		check_time for check_time, notif_types in notif_time_map.items()
+		if len(notif_types & PRIORITY_NOTIFICATIONS) > 0)
+	regular_checks = [
+		check_time for check_time, notif_types in notif_time_map.items()
+		if len(notif_types & PRIORITY_NOTIFICATIONS) == 0
+	]
+
+	due_within_hour = len(
+		[check_time for check_time in priority_checks if check_time - now <= 3600])
+	reserve = min(poll_cost * due_within_hour,
+		max(0, budget.capacity - poll_cost))
+
+	candidates = [
+		max(min(regular_checks + [auto_update]),
+		now + budget.time_until(poll_cost + reserve, now))
+	]
+
+	if len(priority_checks) > 0:
+		candidates.append(
+			max(priority_checks[0], now + budget.time_until(poll_cost, now)))
+
+	return int(min(candidates))
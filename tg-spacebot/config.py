@@ -3,6 +3,38 @@ import time
 import ujson as json
 
 
+API_CONFIG_DEFAULTS = {
+	'api_url': 'https://ll.thespacedevs.com',
+	'record_responses': False,
+	'record_dir': 'll2-archive',
+	'incremental': True,
+	'full_sync_interval': 6 * 3600,
+	'page_size': 30,
+	'max_launches': 90,
+	'horizon_days': 60,
+	'streaming_decode': True,
+	'parallel_parse_threshold': 100,
+	'parse_workers': 0,
+	'retry_base_delay': 5,
+	'retry_max_delay': 15 * 60,
+	'breaker_threshold': 5,
+	'breaker_cooldown': 10 * 60,
+	'error_budget': 10,
+	'hourly_budget': 15,
+	'previous_days': 2,
+	'previous_interval': 30 * 60,
+	'events_interval': 3 * 3600,
+	'fetch_workers': 3,
+	'focus_polling': True,
+	'focus_before': 15 * 60,
+	'focus_after': 10 * 60,
+	'focus_interval': 3 * 60,
+	'two_tier': True,
+	'list_page_size': 100,
+	'detail_fetch_max': 3
+}
+
+
 def first_run(data_dir: str):
 	if not os.path.isdir(data_dir):
 		os.makedirs(data_dir)
@@ -34,7 +66,8 @@ def create_config(data_dir: str):
 			'enabled': False,
 			'logged_out': False,
 			'address': None
-			}
+			},
+			'api': dict(API_CONFIG_DEFAULTS)
 		}
 
 		json.dump(config, config_file, indent=4)
@@ -60,7 +93,7 @@ def load_config(data_dir: str) -> dict:
 
 
 def repair_config(data_dir: str) -> dict:
-	config_keys = {'bot_token', 'owner', 'redis', 'local_api_server'}
+	config_keys = {'bot_token', 'owner', 'redis', 'local_api_server', 'api'}
 
 	full_config = {
 		'bot_token': 0,
@@ -74,7 +107,8 @@ def repair_config(data_dir: str) -> dict:
 		'enabled': False,
 		'logged_out': False,
 		'address': None
-		}
+		},
+		'api': dict(API_CONFIG_DEFAULTS)
 	}
 
 	config = load_config(data_dir=data_dir)
@@ -88,3 +122,19 @@ def repair_config(data_dir: str) -> dict:
 			config[key] = val
 
 	return config
+
+
+def load_api_config(data_dir: str) -> dict:
+	api_config = dict(API_CONFIG_DEFAULTS)
+
+	config_path = os.path.join(data_dir, 'bot-config.json')
+	if not os.path.isfile(config_path):
+		return api_config
+
+	with open(config_path, 'r') as config_file:
+		try:
+			api_config.update(json.load(config_file).get('api', {}))
+		except ValueError:
+			pass
+
+	return api_config
@@ -1,15 +1,30 @@
 import os
 import time
+import atexit
 import sqlite3
 import logging
+import threading
 import datetime
 import inspect
 
 import redis
 import ujson as json
 
+from dbconn import connect_db
+from dbwriter import DB_WRITER, queued_write
+from outbox import clear_outbox_batches
 from tools import time_delta_to_legible_eta, reconstruct_message_for_markdown
 
+STATS_GAUGES = {'last_api_update', 'api_budget_remaining',
+	'api_budget_exhaustion'}
+
+SQL_CHUNK_SIZE = 500
+
+NOTIFY_CLASSES = ('notify_24h', 'notify_12h', 'notify_60min', 'notify_5min')
+
+# counters are written to the stats table this often, and at exit
+STATS_FLUSH_INTERVAL = 30
+
 
 def create_chats_db(db_path: str, cursor: sqlite3.Cursor):
 
@@ -23,23 +38,90 @@ def create_chats_db(db_path: str, cursor: sqlite3.Cursor):
 			notify_time_pref TEXT, enabled_notifications TEXT, disabled_notifications TEXT,
 			PRIMARY KEY (chat))
 			''')
+	except sqlite3.OperationalError as error:
+		logging.exception(f'{error}')
+
+	cursor.execute(
+		'SELECT name FROM sqlite_master WHERE type = ? AND name = ?',
+		('table', 'chat_subscriptions'))
+	if len(cursor.fetchall()) == 0:
+		create_chat_subscriptions_db(cursor=cursor)
+
+
+def create_chat_subscriptions_db(cursor: sqlite3.Cursor):
+	try:
+		cursor.execute('''
+			CREATE TABLE chat_subscriptions (chat TEXT, provider TEXT, state INT,
+			PRIMARY KEY (chat, provider)) WITHOUT ROWID
+			''')
 
 		cursor.execute(
-			"CREATE INDEX chatenabled ON chats (chat, enabled_notifications)")
-		cursor.execute(
-			"CREATE INDEX chatdisabled ON chats (chat, disabled_notifications)"
+			"CREATE INDEX subscriptionprovider ON chat_subscriptions (provider, state, chat)"
 		)
 	except sqlite3.OperationalError as error:
 		logging.exception(f'{error}')
+		return
+
+	# seed from the comma-separated lists kept in chats
+	try:
+		cursor.execute(
+			'SELECT chat, enabled_notifications, disabled_notifications FROM chats'
+		)
+	except sqlite3.OperationalError:
+		return
+
+	subscriptions = {}
+	for chat, enabled, disabled in cursor.fetchall():
+		for state, providers in ((1, enabled), (0, disabled)):
+			for provider in (providers or '').split(','):
+				if provider != '':
+					subscriptions[(chat, provider)] = state
 
+	cursor.executemany(
+		'INSERT INTO chat_subscriptions (chat, provider, state) VALUES (?, ?, ?)',
+		[key + (state, ) for key, state in subscriptions.items()])
 
+	logging.info(
+		f'chat_subscriptions: перенесено {len(subscriptions)} подписок')
+
+
+def store_chat_subscriptions(cursor: sqlite3.Cursor, chat: str,
+	states: dict):
+	cursor.execute('DELETE FROM chat_subscriptions WHERE chat = ?', (chat, ))
+	cursor.executemany(
+		'INSERT INTO chat_subscriptions (chat, provider, state) VALUES (?, ?, ?)',
+		[(chat, provider, state) for provider, state in states.items()
+		if provider != ''])
+
+
+@queued_write()
+def migrate_chat_subscriptions(db_path: str):
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	cursor.execute(
+		'SELECT name FROM sqlite_master WHERE type = ? AND name = ?',
+		('table', 'chat_subscriptions'))
+	if len(cursor.fetchall()) == 0:
+		create_chat_subscriptions_db(cursor=cursor)
+
+	conn.commit()
+	conn.close()
+
+
+@queued_write()
 def migrate_chat(db_path: str, old_id: int, new_id: int):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	try:
 		cursor.execute('UPDATE chats SET chat = ? WHERE chat = ?',
 			(new_id, old_id))
+		cursor.execute('UPDATE chat_subscriptions SET chat = ? WHERE chat = ?',
+			(new_id, old_id))
+		cursor.execute(
+			'UPDATE OR IGNORE notification_outbox SET chat = ? WHERE chat = ?',
+			(new_id, old_id))
 	except:
 		pass
 	conn.commit()
@@ -77,7 +159,7 @@ def create_launch_db(db_path: str, cursor: sqlite3.Cursor):
 			pad_nth_launch INT, location_nth_launch INT, agency_nth_launch INT, agency_nth_launch_year INT,
 			orbital_nth_launch_year INT, 
 
-			last_updated INT,
+			last_updated INT, source_hash TEXT, list_hash TEXT,
 
 			notify_24h BOOLEAN, notify_12h BOOLEAN, notify_60min BOOLEAN, notify_5min BOOLEAN,
 
@@ -97,16 +179,68 @@ def create_launch_db(db_path: str, cursor: sqlite3.Cursor):
 	except sqlite3.OperationalError as e:
 		pass
 
-def update_launch_db(
-		launch_set: set, db_path: str, bot_username: str, api_update: int):
 
-	def verify_no_net_slip(launch_object: 'LaunchLibrary2Launch',
-		cursor: sqlite3.Cursor) -> (bool, tuple):
+def create_launch_stages_db(cursor: sqlite3.Cursor):
+	try:
+		cursor.execute('''CREATE TABLE launch_stages
+			(unique_id TEXT, stage_idx INT, stage_id INT, stage_type TEXT,
+			is_reused BOOLEAN, flight_number INT, turn_around INT,
+			is_flight_proven BOOLEAN, serial_number TEXT, maiden_flight INT,
+			last_flight INT, landing_attempt BOOLEAN, landing_location TEXT,
+			landing_type TEXT, landing_location_nth_landing INT,
+			PRIMARY KEY (unique_id, stage_idx))
+		''')
+	except sqlite3.OperationalError as error:
+		logging.exception(f'{error}')
+
+
+def create_launch_crew_db(cursor: sqlite3.Cursor):
+	try:
+		cursor.execute('''CREATE TABLE launch_crew
+			(unique_id TEXT, crew_idx INT, name TEXT, role TEXT,
+			PRIMARY KEY (unique_id, crew_idx))
+		''')
+	except sqlite3.OperationalError as error:
+		logging.exception(f'{error}')
 
-		cursor.execute('SELECT * FROM launches WHERE unique_id = ?',
-			(launch_object.unique_id, ))
-		query_return = [dict(row) for row in cursor.fetchall()]
-		launch_db = query_return[0]
+
+def load_launch_vehicle(db_path: str, unique_id: str) -> dict:
+	conn = connect_db(db_path)
+	conn.row_factory = sqlite3.Row
+	cursor = conn.cursor()
+
+	vehicle = {'stages': [], 'crew': []}
+	try:
+		cursor.execute(
+			'SELECT * FROM launch_stages WHERE unique_id = ? ORDER BY stage_idx',
+			(unique_id, ))
+		vehicle['stages'] = [dict(row) for row in cursor.fetchall()]
+
+		cursor.execute(
+			'SELECT * FROM launch_crew WHERE unique_id = ? ORDER BY crew_idx',
+			(unique_id, ))
+		vehicle['crew'] = [dict(row) for row in cursor.fetchall()]
+	except sqlite3.OperationalError:
+		pass
+
+	conn.close()
+	return vehicle
+
+
+def delete_launch_vehicles(cursor: sqlite3.Cursor, unique_ids: list):
+	for table in ('launch_stages', 'launch_crew'):
+		try:
+			cursor.executemany(f'DELETE FROM {table} WHERE unique_id = ?',
+				((unique_id, ) for unique_id in unique_ids))
+		except sqlite3.OperationalError:
+			pass
+
+
+def update_launch_db(launch_set: set, db_path: str, bot_username: str,
+	api_update: int, conn: sqlite3.Connection = None):
+
+	def verify_no_net_slip(launch_object: 'LaunchLibrary2Launch',
+		launch_db: dict) -> (bool, tuple):
 
 		if launch_db['net_unix'] == launch_object.net_unix:
 			return (False, ())
@@ -194,19 +328,10 @@ def update_launch_db(
 
 			postpone_msg = inspect.cleandoc(postpone_msg)
 
-			insert_statement = '=?,'.join(notification_states.keys()) + '=?'
-
-			values_tuple = tuple(
-				notification_states.values()) + (launch_object.unique_id, )
-
-			cursor.execute(
-				f'UPDATE launches SET {insert_statement} WHERE unique_id = ?',
-				values_tuple)
-
 			postpone_tup = (launch_object, postpone_msg,
 				old_notification_states)
 
-			return (True, postpone_tup)
+			return (True, (postpone_tup, tuple(notification_states.values())))
 
 		return (False, ())
 
@@ -214,8 +339,11 @@ def update_launch_db(
 		if not os.path.isdir(db_path):
 			os.makedirs(db_path)
 
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
-	conn.row_factory = sqlite3.Row
+	own_conn = conn is None
+	if own_conn:
+		conn = connect_db(db_path)
+		conn.row_factory = sqlite3.Row
+
 	cursor = conn.cursor()
 
 	cursor.execute(
@@ -224,61 +352,250 @@ def update_launch_db(
 	if len(cursor.fetchall()) == 0:
 		create_launch_db(db_path=db_path, cursor=cursor)
 
+	for table, create_table in (('launch_stages', create_launch_stages_db),
+		('launch_crew', create_launch_crew_db)):
+		cursor.execute(
+			'SELECT name FROM sqlite_master WHERE type = ? AND name = ?',
+			('table', table))
+		if len(cursor.fetchall()) == 0:
+			create_table(cursor=cursor)
+
+	launch_set = list(launch_set)
+	if len(launch_set) == 0:
+		if own_conn:
+			conn.commit()
+			conn.close()
+
+		return set()
+
+	# one prefetch per chunk instead of a SELECT per existing launch
+	unique_ids = [launch_object.unique_id for launch_object in launch_set]
+	existing_launches = {}
+	for chunk_start in range(0, len(unique_ids), SQL_CHUNK_SIZE):
+		id_chunk = unique_ids[chunk_start:chunk_start + SQL_CHUNK_SIZE]
+		cursor.execute(
+			'SELECT unique_id, net_unix, notify_24h, notify_12h, notify_60min, notify_5min '
+			f'FROM launches WHERE unique_id IN ({",".join("?" * len(id_chunk))})',
+			id_chunk)
+
+		for launch_row in cursor.fetchall():
+			existing_launches[launch_row[0]] = {
+				'net_unix': launch_row[1],
+				'notify_24h': launch_row[2],
+				'notify_12h': launch_row[3],
+				'notify_60min': launch_row[4],
+				'notify_5min': launch_row[5]
+			}
+
+	launch_columns = launch_set[0].COLUMNS
+	insert_fields = ', '.join(launch_columns)
+	insert_fields += ', last_updated, notify_24h, notify_12h, notify_60min, notify_5min'
+	values_string = ','.join('?' * (len(launch_columns) + 5))
+	set_str = ', '.join(f'{column} = excluded.{column}'
+		for column in launch_columns if column != 'unique_id')
+	set_str += ', last_updated = excluded.last_updated'
+
 	slipped_launches = set()
+	launch_rows, notification_resets, outbox_resets = [], [], []
+	stage_rows, crew_rows = [], []
 	for launch_object in launch_set:
-		try:
-			insert_fields = ', '.join(vars(launch_object).keys())
-			insert_fields += ', last_updated, notify_24h, notify_12h, notify_60min, notify_5min'
-			field_values = tuple(vars(launch_object).values()) + (api_update,
-				False, False, False, False)
+		launch_rows.append(launch_object.values() +
+			(api_update, False, False, False, False))
+		stage_rows.extend(launch_object.stage_rows())
+		crew_rows.extend(launch_object.crew_rows())
 
-			values_string = '?,' * (len(vars(launch_object).keys()) + 5)
-			values_string = values_string[0:-1]
+		launch_db = existing_launches.get(launch_object.unique_id)
+		if launch_db is None:
+			continue
 
-			cursor.execute(
-				f'INSERT INTO launches ({insert_fields}) VALUES ({values_string})',
-				field_values)
+		net_slipped, postpone = verify_no_net_slip(launch_object=launch_object,
+			launch_db=launch_db)
 
-		except sqlite3.IntegrityError: 
-			obj_dict = vars(launch_object)
+		if net_slipped:
+			postpone_tuple, notification_states = postpone
+			slipped_launches.add(postpone_tuple)
+			notification_resets.append(notification_states +
+				(launch_object.unique_id, ))
 
-			update_fields = obj_dict.keys()
-			update_values = obj_dict.values()
+			old_notification_states = postpone_tuple[2]
+			for notify_class, old_state, new_state in zip(NOTIFY_CLASSES,
+				old_notification_states, notification_states):
+				if old_state and not new_state:
+					outbox_resets.append((launch_object.unique_id, notify_class))
 
-			set_str = ' = ?, '.join(update_fields) + ' = ?'
+	cursor.executemany(
+		f'INSERT INTO launches ({insert_fields}) VALUES ({values_string}) '
+		f'ON CONFLICT(unique_id) DO UPDATE SET {set_str}', launch_rows)
 
-			net_slipped, postpone_tuple = verify_no_net_slip(
-				launch_object=launch_object, cursor=cursor)
+	if len(notification_resets) > 0:
+		cursor.executemany(
+			'UPDATE launches SET notify_24h = ?, notify_12h = ?, notify_60min = ?, notify_5min = ? WHERE unique_id = ?',
+			notification_resets)
 
-			if net_slipped:
-				slipped_launches.add(postpone_tuple)
+	if len(outbox_resets) > 0:
+		clear_outbox_batches(cursor=cursor, batches=outbox_resets)
 
-			try:
-				cursor.execute(
-					f"UPDATE launches SET {set_str} WHERE unique_id = ?",
-					tuple(update_values) + (launch_object.unique_id, ))
-				cursor.execute(
-					"UPDATE launches SET last_updated = ? WHERE unique_id = ?",
-					(api_update, ) + (launch_object.unique_id, ))
-			except Exception:
-				logging.exception(
-					f'⚠️ Error updating field for unique_id={launch_object.unique_id}!'
-				)
+	delete_launch_vehicles(cursor=cursor, unique_ids=unique_ids)
+
+	if len(stage_rows) > 0:
+		stage_values = ','.join('?' * len(stage_rows[0]))
+		cursor.executemany(f'INSERT INTO launch_stages VALUES ({stage_values})',
+			stage_rows)
+
+	if len(crew_rows) > 0:
+		crew_values = ','.join('?' * len(crew_rows[0]))
+		cursor.executemany(f'INSERT INTO launch_crew VALUES ({crew_values})',
+			crew_rows)
+
+	if own_conn:
+		conn.commit()
+		conn.close()
+
+	return slipped_launches
+
+
+def load_launch_hashes(db_path: str, column: str = 'source_hash') -> dict:
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	try:
+		cursor.execute(f'SELECT unique_id, {column} FROM launches')
+	except sqlite3.OperationalError:
+		conn.close()
+		return {}
+
+	launch_hashes = dict(cursor.fetchall())
+	conn.close()
+
+	return launch_hashes
+
+
+def touch_launches(db_path: str, unique_ids: list, api_update: int,
+	conn: sqlite3.Connection = None):
+	own_conn = conn is None
+	if own_conn:
+		conn = connect_db(db_path)
+
+	cursor = conn.cursor()
+	cursor.executemany('UPDATE launches SET last_updated = ? WHERE unique_id = ?',
+		((api_update, unique_id) for unique_id in unique_ids))
+
+	if own_conn:
+		conn.commit()
+		conn.close()
+
+
+def create_event_db(cursor: sqlite3.Cursor):
+	try:
+		cursor.execute('''CREATE TABLE events
+			(event_id INT, name TEXT, event_type TEXT, description TEXT,
+			location TEXT, news_url TEXT, video_url TEXT, feature_image TEXT,
+			date_unix INT, launch_ids TEXT, last_updated INT,
+			PRIMARY KEY (event_id))
+		''')
+	except sqlite3.OperationalError as error:
+		logging.exception(f'{error}')
+
+
+def update_event_db(db_path: str, events: list, api_update: int,
+	complete: bool, conn: sqlite3.Connection = None):
+	own_conn = conn is None
+	if own_conn:
+		conn = connect_db(db_path)
+
+	cursor = conn.cursor()
+	cursor.execute(
+		'SELECT name FROM sqlite_master WHERE type = ? AND name = ?',
+		('table', 'events'))
+	if len(cursor.fetchall()) == 0:
+		create_event_db(cursor=cursor)
+
+	if len(events) > 0:
+		event_columns = events[0].__slots__ + ('last_updated', )
+		cursor.executemany(
+			f'INSERT OR REPLACE INTO events ({", ".join(event_columns)}) VALUES ({",".join("?" * len(event_columns))})',
+			(event.values() + (api_update, ) for event in events))
+
+	if complete:
+		cursor.execute(
+			'DELETE FROM events WHERE last_updated < ? AND date_unix > ?',
+			(api_update, int(time.time())))
+
+	if own_conn:
+		conn.commit()
+		conn.close()
+
+
+@queued_write()
+def carry_forward_launches(db_path: str, since: int, api_update: int):
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	try:
+		cursor.execute(
+			'UPDATE launches SET last_updated = ? WHERE last_updated >= ?',
+			(api_update, since))
+	except sqlite3.OperationalError:
+		logging.exception('ошибка обновления last_updated')
 
 	conn.commit()
 	conn.close()
 
-	if len(slipped_launches) > 0:
-		return slipped_launches
 
-	return set()
+def create_api_state_db(cursor: sqlite3.Cursor):
+	try:
+		cursor.execute(
+			'CREATE TABLE api_state (key TEXT, value TEXT, PRIMARY KEY (key))')
+	except sqlite3.OperationalError as error:
+		logging.exception(f'{error}')
+
+
+def load_api_state(db_path: str, key: str, default=None):
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	try:
+		cursor.execute('SELECT value FROM api_state WHERE key = ?', (key, ))
+	except sqlite3.OperationalError:
+		conn.close()
+		return default
+
+	query_return = cursor.fetchall()
+	conn.close()
+
+	if len(query_return) == 0 or query_return[0][0] is None:
+		return default
+
+	return query_return[0][0]
+
+
+@queued_write()
+def store_api_state(db_path: str, state: dict):
+	if not os.path.isdir(db_path):
+		os.makedirs(db_path)
+
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	cursor.execute(
+		'SELECT name FROM sqlite_master WHERE type = ? AND name = ?',
+		('table', 'api_state'))
+	if len(cursor.fetchall()) == 0:
+		create_api_state_db(cursor=cursor)
+
+	cursor.executemany(
+		'INSERT OR REPLACE INTO api_state (key, value) VALUES (?, ?)',
+		tuple(state.items()))
+
+	conn.commit()
+	conn.close()
 
 
 def create_stats_db(db_path: str):
 	if not os.path.isdir(db_path):
 		os.mkdir(db_path)
 
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	try:
@@ -297,59 +614,254 @@ def create_stats_db(db_path: str):
 	conn.close()
 
 
-def update_stats_db(stats_update: dict, db_path: str):
-	if not os.path.isfile(os.path.join(db_path, 'launchbot-data.db')):
-		create_stats_db(db_path=db_path)
+def create_description_summary_db(cursor: sqlite3.Cursor):
+	try:
+		cursor.execute(
+			'CREATE TABLE description_summaries (hash TEXT, summary TEXT, PRIMARY KEY (hash))'
+		)
+	except sqlite3.OperationalError as error:
+		logging.exception(f'{error}')
+
 
-	stats_conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
-	stats_cursor = stats_conn.cursor()
-	rd = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+def load_description_summaries(db_path: str) -> dict:
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	try:
+		cursor.execute('SELECT hash, summary FROM description_summaries')
+	except sqlite3.OperationalError:
+		conn.close()
+		return {}
+
+	summaries = dict(cursor.fetchall())
+	conn.close()
+
+	return summaries
+
+
+@queued_write()
+def store_description_summaries(db_path: str, summaries: dict):
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
 
-	stats_cursor.execute(
+	cursor.execute(
+		'SELECT name FROM sqlite_master WHERE type = ? AND name = ?',
+		('table', 'description_summaries'))
+	if len(cursor.fetchall()) == 0:
+		create_description_summary_db(cursor=cursor)
+
+	cursor.executemany(
+		'INSERT OR REPLACE INTO description_summaries (hash, summary) VALUES (?, ?)',
+		tuple(summaries.items()))
+
+	conn.commit()
+	conn.close()
+
+
+@queued_write()
+def record_parse_errors(db_path: str, parse_errors: list, api_update: int):
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	try:
+		cursor.execute('''CREATE TABLE parse_errors
+			(launch_id TEXT, field_path TEXT, exception TEXT, count INT,
+			first_seen INT, last_seen INT,
+			PRIMARY KEY (launch_id, field_path, exception))''')
+	except sqlite3.OperationalError:
+		pass
+
+	cursor.executemany(
+		'''INSERT INTO parse_errors
+		(launch_id, field_path, exception, count, first_seen, last_seen)
+		VALUES (?, ?, ?, 1, ?, ?)
+		ON CONFLICT (launch_id, field_path, exception)
+		DO UPDATE SET count = count + 1, last_seen = excluded.last_seen''',
+		[error + (api_update, api_update) for error in parse_errors])
+
+	conn.commit()
+	conn.close()
+
+
+def load_last_api_update(db_path: str):
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	try:
+		cursor.execute('SELECT last_api_update FROM stats')
+		query_return = cursor.fetchall()
+	except sqlite3.OperationalError:
+		query_return = []
+
+	conn.close()
+
+	if len(query_return) == 0 or query_return[0][0] in ('', None):
+		return None
+
+	return int(query_return[0][0])
+
+
+def write_stats(stats_update: dict, db_path: str):
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	cursor.execute(
 		'SELECT name FROM sqlite_master WHERE type = ? AND name = ?',
 		('table', 'stats'))
-	if len(stats_cursor.fetchall()) == 0:
+	if len(cursor.fetchall()) == 0:
 		create_stats_db(db_path)
 
-	if not rd.exists('stats'):
-		stats_conn = sqlite3.connect(os.path.join(db_path,
-			'launchbot-data.db'))
-		stats_conn.row_factory = sqlite3.Row
-		stats_cursor = stats_conn.cursor()
+	for stat, val in stats_update.items():
+		if stat in STATS_GAUGES:
+			update = f'UPDATE stats SET {stat} = {val}'
+		else:
+			update = f'UPDATE stats SET {stat} = {stat} + {val}'
 
 		try:
-			stats_cursor.execute("SELECT * FROM stats")
-			stats = [dict(row) for row in stats_cursor.fetchall()][0]
+			cursor.execute(update)
 		except sqlite3.OperationalError:
-			stats = {
-				'notifications': 0,
-				'api_requests': 0,
-				'db_updates': 0,
-				'commands': 0,
-				'data': 0,
-				'last_api_update': 0
-			}
+			cursor.execute(f'ALTER TABLE stats ADD COLUMN {stat} INT DEFAULT 0')
+			cursor.execute(update)
 
-		if stats['last_api_update'] is None:
-			stats['last_api_update'] = int(time.time())
+	conn.commit()
+	conn.close()
 
-		rd.hmset('stats', stats)
 
-	for stat, val in stats_update.items():
-		if stat == 'last_api_update':
-			stats_cursor.execute(f"UPDATE stats SET {stat} = {val}")
-			rd.hset('stats', stat, val)
-		else:
-			stats_cursor.execute(f"UPDATE stats SET {stat} = {stat} + {val}")
-			try:
-				rd.hset('stats', stat, int(rd.hget('stats', stat)) + int(val))
-			except TypeError:
-				logging.exception(
-					f'ошибка обновления бд репозитория'
-				)
+def load_stats(db_path: str) -> dict:
+	conn = connect_db(db_path)
+	conn.row_factory = sqlite3.Row
+	cursor = conn.cursor()
+
+	try:
+		cursor.execute('SELECT * FROM stats')
+		stats = [dict(row) for row in cursor.fetchall()][0]
+	except (sqlite3.OperationalError, IndexError):
+		stats = {
+			'notifications': 0,
+			'api_requests': 0,
+			'db_updates': 0,
+			'commands': 0,
+			'data': 0,
+			'last_api_update': 0
+		}
 
-				stats_conn.close()
+	conn.close()
+
+	if stats['last_api_update'] is None:
+		stats['last_api_update'] = int(time.time())
+
+	return {stat: 0 if val is None else val for stat, val in stats.items()}
+
+
+class StatsAggregator:
+	def __init__(self, flush_interval: float, mirror: bool):
+		self.flush_interval = flush_interval
+		self.mirror = mirror
+		self.lock = threading.Lock()
+		self.mirror_lock = threading.RLock()
+		self.pending = {}
+		self.timer = None
+		self.exit_hook = False
+		self.redis = None
+
+	def redis_client(self) -> redis.Redis:
+		if self.redis is None:
+			self.redis = redis.Redis(host='localhost',
+				port=6379,
+				db=0,
+				decode_responses=True)
+
+		return self.redis
+
+	def add(self, db_path: str, increments: dict):
+		with self.lock:
+			pending = self.pending.setdefault(db_path, {})
+			for stat, val in increments.items():
+				pending[stat] = pending.get(stat, 0) + val
+
+			if self.timer is None:
+				self.timer = threading.Timer(self.flush_interval, self.flush)
+				self.timer.daemon = True
+				self.timer.start()
+
+			if not self.exit_hook:
+				self.exit_hook = True
+				atexit.register(self.flush)
+
+	def write(self, db_path: str, increments: dict, gauges: dict):
+		# the table write and its mirror update share one lock: a mirror
+		# rebuilt from the table between the two would count the write twice
+		with self.mirror_lock:
+			DB_WRITER.write(db_path, write_stats,
+				(dict(increments, **gauges), db_path))
+			self.mirror_stats(db_path=db_path, increments=increments, gauges=gauges)
+
+	def mirror_stats(self, db_path: str, increments: dict, gauges: dict):
+		# called once the values are in the table; the scheduler flushes
+		# redis, in which case the mirror is rebuilt from the table instead
+		if not self.mirror:
+			return
+
+		rd = self.redis_client()
+		try:
+			if not rd.exists('stats'):
+				rd.hset('stats', mapping=load_stats(db_path))
 				return
 
-	stats_conn.commit()
-	stats_conn.close()
+			pipe = rd.pipeline(transaction=False)
+			for stat, val in increments.items():
+				pipe.hincrby('stats', stat, val)
+
+			for stat, val in gauges.items():
+				pipe.hset('stats', stat, val)
+
+			pipe.execute()
+		except redis.exceptions.RedisError as error:
+			logging.warning(f'зеркало статистики в redis не обновлено: {error}')
+
+	def flush(self):
+		# a flush returns only once every count taken before it is written,
+		# including those an overlapping timer flush picked up
+		with self.mirror_lock:
+			with self.lock:
+				pending, self.pending = self.pending, {}
+				timer, self.timer = self.timer, None
+
+			if timer is not None:
+				timer.cancel()
+
+			for db_path, increments in pending.items():
+				try:
+					self.write(db_path=db_path, increments=increments, gauges={})
+				except Exception:
+					logging.exception(
+						'ошибка записи статистики, повтор при следующем сбросе')
+					self.add(db_path, increments)
+
+	def stats(self) -> dict:
+		with self.lock:
+			return {
+				'pending': sum(len(increments) for increments in self.pending.values())
+			}
+
+
+STATS = StatsAggregator(flush_interval=STATS_FLUSH_INTERVAL, mirror=True)
+
+
+def update_stats_db(stats_update: dict, db_path: str):
+	increments = {
+		stat: int(val)
+		for stat, val in stats_update.items() if stat not in STATS_GAUGES
+	}
+	gauges = {
+		stat: val
+		for stat, val in stats_update.items() if stat in STATS_GAUGES
+	}
+
+	if len(increments) > 0:
+		STATS.add(db_path, increments)
+
+	# gauges are read back straight away (the api scheduler, notification
+	# freshness checks), so they reach the table before this returns
+	if len(gauges) > 0:
+		STATS.write(db_path=db_path, increments={}, gauges=gauges)
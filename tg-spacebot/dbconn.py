@@ -0,0 +1,229 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+DB_FILE = 'launchbot-data.db'
+BUSY_TIMEOUT = 5.0
+
+PRAGMAS = (
+	'PRAGMA journal_mode = WAL',
+	'PRAGMA synchronous = NORMAL',
+	'PRAGMA cache_size = -16000',
+	'PRAGMA mmap_size = 67108864',
+	'PRAGMA temp_store = MEMORY',
+	# busy waits happen in BusyRetryCursor, where they can be timed
+	'PRAGMA busy_timeout = 0'
+)
+
+
+def db_file_path(db_path: str) -> str:
+	return os.path.join(db_path, DB_FILE)
+
+
+def is_busy_error(error: sqlite3.OperationalError) -> bool:
+	return 'locked' in str(error) or 'busy' in str(error)
+
+
+class BusyRetryCursor(sqlite3.Cursor):
+	def execute(self, sql: str, parameters=()):
+		return DB_CONNECTIONS.retry_busy(super().execute, sql, parameters)
+
+	def executemany(self, sql: str, seq_of_parameters):
+		if not isinstance(seq_of_parameters, (list, tuple)):
+			seq_of_parameters = list(seq_of_parameters)
+
+		return DB_CONNECTIONS.retry_busy(super().executemany, sql,
+			seq_of_parameters)
+
+
+class ConnectionHandle:
+	__slots__ = ('conn', 'db_file', 'row_factory', 'released')
+
+	def __init__(self, conn: sqlite3.Connection, db_file: str):
+		self.conn = conn
+		self.db_file = db_file
+		self.row_factory = None
+		self.released = False
+
+	def cursor(self) -> sqlite3.Cursor:
+		cursor = self.conn.cursor(BusyRetryCursor)
+		cursor.row_factory = self.row_factory
+		return cursor
+
+	def execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+		return self.cursor().execute(sql, parameters)
+
+	def executemany(self, sql: str, seq_of_parameters) -> sqlite3.Cursor:
+		return self.cursor().executemany(sql, seq_of_parameters)
+
+	def commit(self):
+		DB_CONNECTIONS.commit(self.conn)
+
+	def rollback(self):
+		self.conn.rollback()
+
+	def close(self):
+		if not self.released:
+			self.released = True
+			DB_CONNECTIONS.release(self)
+
+	def __getattr__(self, attr: str):
+		return getattr(self.conn, attr)
+
+	def __del__(self):
+		try:
+			self.close()
+		except Exception:
+			pass
+
+
+class ConnectionManager:
+	def __init__(self):
+		self.local = threading.local()
+		self.lock = threading.Lock()
+		self.generations = {}
+		self.counters = {
+			'opened': 0,
+			'handles': 0,
+			'commits': 0,
+			'commit_ms': 0.0,
+			'lock_waits': 0,
+			'lock_wait_ms': 0.0
+		}
+
+	def count(self, **increments):
+		with self.lock:
+			for key, val in increments.items():
+				self.counters[key] += val
+
+	def thread_connections(self) -> dict:
+		if not hasattr(self.local, 'connections'):
+			self.local.connections = {}
+
+		return self.local.connections
+
+	def open(self, db_file: str) -> sqlite3.Connection:
+		conn = sqlite3.connect(db_file)
+		for pragma in PRAGMAS:
+			self.retry_busy(conn.execute, pragma)
+
+		self.count(opened=1)
+		return conn
+
+	def connect(self, db_path: str) -> ConnectionHandle:
+		db_file = db_file_path(db_path)
+		connections = self.thread_connections()
+		generation = self.generations.get(db_file, 0)
+
+		entry = connections.get(db_file)
+		if entry is not None and entry['generation'] != generation and entry[
+			'depth'] == 0:
+			entry['conn'].close()
+			entry = None
+
+		if entry is None:
+			entry = {
+				'conn': self.open(db_file),
+				'generation': generation,
+				'depth': 0
+			}
+			connections[db_file] = entry
+
+		entry['depth'] += 1
+		self.count(handles=1)
+
+		return ConnectionHandle(conn=entry['conn'], db_file=db_file)
+
+	def release(self, handle: ConnectionHandle):
+		entry = self.thread_connections().get(handle.db_file)
+		if entry is None or entry['conn'] is not handle.conn:
+			return
+
+		entry['depth'] -= 1
+
+		# closing a connection used to drop whatever it left uncommitted
+		if entry['depth'] <= 0:
+			entry['depth'] = 0
+			if handle.conn.in_transaction:
+				handle.conn.rollback()
+
+	def defer_commits(self, deferred: bool):
+		# the writer thread commits once per batch; commits issued by the jobs
+		# it runs fold into that one
+		self.local.defer_commits = deferred
+
+	def commit(self, conn: sqlite3.Connection, force: bool = False):
+		if not force and getattr(self.local, 'defer_commits', False):
+			return
+
+		t0 = time.perf_counter()
+		self.retry_busy(conn.commit)
+		self.count(commits=1, commit_ms=(time.perf_counter() - t0) * 1000)
+
+	def retry_busy(self, func, *args):
+		wait_start, delay = None, 0.005
+		while True:
+			try:
+				result = func(*args)
+			except sqlite3.OperationalError as error:
+				if not is_busy_error(error):
+					raise
+
+				if wait_start is None:
+					wait_start = time.perf_counter()
+
+				waited = time.perf_counter() - wait_start
+				if waited >= BUSY_TIMEOUT:
+					self.count(lock_waits=1, lock_wait_ms=waited * 1000)
+					raise
+
+				time.sleep(delay)
+				delay = min(delay * 2, 0.1)
+				continue
+
+			if wait_start is not None:
+				self.count(lock_waits=1,
+					lock_wait_ms=(time.perf_counter() - wait_start) * 1000)
+
+			return result
+
+	def detach(self, db_path: str):
+		# fold the WAL back into the main file and make every thread reopen,
+		# so the file can be moved or replaced
+		db_file = db_file_path(db_path)
+		connections = self.thread_connections()
+
+		entry = connections.pop(db_file, None)
+		if entry is not None:
+			try:
+				entry['conn'].execute('PRAGMA wal_checkpoint(TRUNCATE)')
+			except sqlite3.Error:
+				logging.exception('wal checkpoint failed')
+
+			entry['conn'].close()
+
+		with self.lock:
+			self.generations[db_file] = self.generations.get(db_file, 0) + 1
+
+	def checkpoint(self, db_path: str):
+		conn = self.connect(db_path)
+		try:
+			conn.execute('PRAGMA wal_checkpoint(FULL)')
+		finally:
+			conn.close()
+
+	def stats(self) -> dict:
+		with self.lock:
+			stats = dict(self.counters)
+
+		stats['reused'] = stats['handles'] - stats['opened']
+		return stats
+
+
+DB_CONNECTIONS = ConnectionManager()
+
+
+def connect_db(db_path: str) -> ConnectionHandle:
+	return DB_CONNECTIONS.connect(db_path)
@@ -0,0 +1,224 @@
+import time
+import queue
+import atexit
+import inspect
+import logging
+import functools
+import threading
+
+from concurrent.futures import Future
+
+from dbconn import DB_CONNECTIONS, connect_db
+
+WRITE_QUEUE_SIZE = 1000
+WRITE_BATCH_MAX = 100
+
+# how long the writer lingers for more jobs before committing a batch
+WRITE_BATCH_WINDOW = 0.005
+
+
+class WriteJob:
+	__slots__ = ('db_path', 'func', 'args', 'kwargs', 'future', 'queued')
+
+	def __init__(self, db_path: str, func, args: tuple, kwargs: dict):
+		self.db_path = db_path
+		self.func = func
+		self.args = args
+		self.kwargs = kwargs
+		self.future = Future()
+		self.queued = time.perf_counter()
+
+	def run(self):
+		try:
+			self.future.set_result(self.func(*self.args, **self.kwargs))
+		except Exception as error:
+			self.future.set_exception(error)
+
+
+class DBWriter:
+	def __init__(self, queue_size: int, batch_max: int, batch_window: float):
+		self.queue = queue.Queue(maxsize=queue_size)
+		self.batch_max = batch_max
+		self.batch_window = batch_window
+		self.thread = None
+		self.lock = threading.Lock()
+		self.counters = {
+			'jobs': 0,
+			'failed': 0,
+			'batches': 0,
+			'largest_batch': 0,
+			'queue_full': 0,
+			'queue_wait_ms': 0.0
+		}
+
+	def count(self, **increments):
+		with self.lock:
+			for key, val in increments.items():
+				self.counters[key] += val
+
+	def on_writer_thread(self) -> bool:
+		return threading.current_thread() is self.thread
+
+	def start(self):
+		with self.lock:
+			if self.thread is not None and self.thread.is_alive():
+				return
+
+			if self.thread is None:
+				atexit.register(self.stop)
+
+			self.thread = threading.Thread(target=self.run,
+				name='db-writer',
+				daemon=True)
+			self.thread.start()
+
+	def submit(self, db_path: str, func, args: tuple = (),
+		kwargs: dict = None) -> Future:
+		job = WriteJob(db_path=db_path,
+			func=func,
+			args=args,
+			kwargs=kwargs or {})
+
+		# a write issued from inside a job is already part of that job's batch
+		if self.on_writer_thread():
+			job.run()
+			return job.future
+
+		self.start()
+
+		try:
+			self.queue.put_nowait(job)
+		except queue.Full:
+			self.count(queue_full=1)
+			self.queue.put(job)
+
+		return job.future
+
+	def write(self, db_path: str, func, args: tuple = (), kwargs: dict = None):
+		return self.submit(db_path, func, args, kwargs).result()
+
+	def flush(self, db_path: str):
+		self.write(db_path, lambda: None)
+
+	def collect(self, first: WriteJob) -> list:
+		batch = [first]
+		deadline = time.perf_counter() + self.batch_window
+
+		while first is not None and len(batch) < self.batch_max:
+			timeout = deadline - time.perf_counter()
+			try:
+				if timeout > 0:
+					job = self.queue.get(timeout=timeout)
+				else:
+					job = self.queue.get_nowait()
+			except queue.Empty:
+				break
+
+			batch.append(job)
+			if job is None:
+				break
+
+		return batch
+
+	def run(self):
+		DB_CONNECTIONS.defer_commits(True)
+
+		while True:
+			batch = self.collect(self.queue.get())
+
+			path_jobs = {}
+			for job in batch:
+				if job is not None:
+					path_jobs.setdefault(job.db_path, []).append(job)
+
+			for db_path, jobs in path_jobs.items():
+				self.write_batch(db_path=db_path, jobs=jobs)
+
+			if batch[-1] is None:
+				return
+
+	def write_batch(self, db_path: str, jobs: list):
+		results = []
+		conn = connect_db(db_path)
+
+		try:
+			conn.execute('BEGIN IMMEDIATE')
+
+			# every job gets a savepoint, so one failing write doesn't take the
+			# rest of the batch down with it
+			for job in jobs:
+				conn.execute('SAVEPOINT write_job')
+				try:
+					result = job.func(*job.args, **job.kwargs)
+				except Exception as error:
+					conn.execute('ROLLBACK TO write_job')
+					conn.execute('RELEASE write_job')
+					results.append((job, None, error))
+				else:
+					conn.execute('RELEASE write_job')
+					results.append((job, result, None))
+
+			DB_CONNECTIONS.commit(conn.conn, force=True)
+		except Exception as error:
+			logging.exception(f'ошибка записи пакета из {len(jobs)} операций')
+			if conn.in_transaction:
+				conn.rollback()
+
+			results = [(job, None, error) for job in jobs]
+		finally:
+			conn.close()
+
+		now, failed, queue_wait = time.perf_counter(), 0, 0.0
+		for job, result, error in results:
+			queue_wait += now - job.queued
+
+			if error is None:
+				job.future.set_result(result)
+			else:
+				failed += 1
+				logging.warning(f'запись {job.func.__name__} не удалась: {error}')
+				job.future.set_exception(error)
+
+		self.count(jobs=len(jobs),
+			failed=failed,
+			batches=1,
+			queue_wait_ms=queue_wait * 1000)
+
+		with self.lock:
+			self.counters['largest_batch'] = max(self.counters['largest_batch'],
+				len(jobs))
+
+	def stop(self, timeout: float = 10.0):
+		if self.thread is None or not self.thread.is_alive():
+			return
+
+		self.queue.put(None)
+		self.thread.join(timeout)
+
+	def stats(self) -> dict:
+		with self.lock:
+			stats = dict(self.counters)
+
+		stats['queued'] = self.queue.qsize()
+		return stats
+
+
+DB_WRITER = DBWriter(queue_size=WRITE_QUEUE_SIZE,
+	batch_max=WRITE_BATCH_MAX,
+	batch_window=WRITE_BATCH_WINDOW)
+
+
+def queued_write(db_arg: str = 'db_path'):
+	# runs the decorated function on the writer thread and waits for its batch
+	# to commit; the function's own connect_db/commit calls join that batch
+	def decorator(func):
+		signature = inspect.signature(func)
+
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			db_path = signature.bind(*args, **kwargs).arguments[db_arg]
+			return DB_WRITER.write(db_path, func, args, kwargs)
+
+		return wrapper
+
+	return decorator
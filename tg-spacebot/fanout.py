@@ -0,0 +1,203 @@
+import time
+import heapq
+import logging
+import itertools
+import threading
+
+from budget import TokenBucket
+
+# Telegram's bot limits: ~30 messages/s overall, 1/s to a private chat and
+# 20/min to a group
+GLOBAL_SEND_RATE = 30
+PRIVATE_CHAT_RATE = 1
+GROUP_CHAT_RATE = 20 / 60
+
+SEND_WORKERS = 8
+SEND_ATTEMPTS = 5
+CHAT_BUCKET_LIMIT = 10000
+
+
+class RetryLater(Exception):
+	def __init__(self, delay: float, global_pause: bool = False):
+		super().__init__(f'retry in {delay} s')
+		self.delay = delay
+		self.global_pause = global_pause
+
+
+class SendLimiter:
+	def __init__(self, global_rate: float, private_rate: float,
+		group_rate: float):
+		self.private_rate = private_rate
+		self.group_rate = group_rate
+		self.lock = threading.Lock()
+
+		# single-token buckets: no bursts, so no window ever exceeds a limit
+		self.global_bucket = TokenBucket(capacity=1, refill_rate=global_rate)
+		self.chat_buckets = {}
+		self.paused_until = 0
+
+	def chat_bucket(self, chat: str, now: float) -> TokenBucket:
+		bucket = self.chat_buckets.get(chat)
+		if bucket is not None:
+			return bucket
+
+		if len(self.chat_buckets) >= CHAT_BUCKET_LIMIT:
+			# a full bucket is no different from a fresh one
+			self.chat_buckets = {
+				key: val
+				for key, val in self.chat_buckets.items()
+				if val.available(now) < val.capacity
+			}
+
+		# group and channel ids are negative
+		rate = self.group_rate if str(chat).startswith('-') else self.private_rate
+		bucket = TokenBucket(capacity=1, refill_rate=rate, updated=now)
+
+		self.chat_buckets[chat] = bucket
+		return bucket
+
+	def reserve(self, chat: str) -> tuple:
+		# takes a token for the chat and returns (0, False), or how long to
+		# wait before asking again and whether the chat itself is the limit
+		with self.lock:
+			now = time.time()
+			bucket = self.chat_bucket(chat, now)
+
+			chat_wait = bucket.time_until(1, now)
+			global_wait = max(self.paused_until - now,
+				self.global_bucket.time_until(1, now))
+
+			if chat_wait > 0 or global_wait > 0:
+				return max(chat_wait, global_wait), chat_wait > global_wait
+
+			self.global_bucket.consume(1, now)
+			bucket.consume(1, now)
+			return 0, False
+
+	def pause(self, seconds: float):
+		with self.lock:
+			self.paused_until = max(self.paused_until, time.time() + seconds)
+
+
+SEND_LIMITS = SendLimiter(global_rate=GLOBAL_SEND_RATE,
+	private_rate=PRIVATE_CHAT_RATE,
+	group_rate=GROUP_CHAT_RATE)
+
+
+def fan_out(chats, send, limiter: SendLimiter = SEND_LIMITS,
+	workers: int = SEND_WORKERS, attempts: int = SEND_ATTEMPTS) -> dict:
+	# send(chat) returns a message identifier, None for a chat that can't take
+	# the message, or raises RetryLater to be queued again; one failing chat
+	# never holds up the rest
+	start = time.time()
+	sequence = itertools.count()
+	queue = [(start, next(sequence), chat, 1) for chat in chats]
+	heapq.heapify(queue)
+
+	cond = threading.Condition()
+	report = {
+		'chats': len(queue),
+		'sent': 0,
+		'skipped': 0,
+		'failed': 0,
+		'retries': 0,
+		'message_ids': set(),
+		'undelivered': []
+	}
+	outstanding = [len(queue)]
+
+	def finish(chat: str, msg_id=None, failed: bool = False):
+		with cond:
+			if failed:
+				report['failed'] += 1
+				report['undelivered'].append(chat)
+			elif msg_id is None:
+				report['skipped'] += 1
+			else:
+				report['sent'] += 1
+				report['message_ids'].add(msg_id)
+
+			outstanding[0] -= 1
+			cond.notify_all()
+
+	def requeue(chat: str, attempt: int, due: float):
+		with cond:
+			heapq.heappush(queue, (due, next(sequence), chat, attempt))
+			cond.notify()
+
+	def next_task():
+		with cond:
+			while outstanding[0] > 0:
+				if len(queue) == 0:
+					cond.wait()
+					continue
+
+				wait = queue[0][0] - time.time()
+				if wait > 0:
+					cond.wait(wait)
+					continue
+
+				return heapq.heappop(queue)
+
+			return None
+
+	def worker():
+		while True:
+			task = next_task()
+			if task is None:
+				return
+
+			_, _, chat, attempt = task
+			wait, chat_limited = limiter.reserve(chat)
+			while wait > 0 and not chat_limited:
+				time.sleep(wait)
+				wait, chat_limited = limiter.reserve(chat)
+
+			# other chats can go out while this one cools down
+			if wait > 0:
+				requeue(chat, attempt, time.time() + wait)
+				continue
+
+			try:
+				msg_id = send(chat)
+			except RetryLater as retry:
+				delay, pause = retry.delay, retry.global_pause
+			except Exception:
+				logging.exception(f'ошибка отправки в {chat}')
+				delay, pause = attempt, False
+			else:
+				finish(chat, msg_id=msg_id)
+				continue
+
+			if attempt >= attempts:
+				logging.warning(f'{chat}: не доставлено после {attempt} попыток')
+				finish(chat, failed=True)
+				continue
+
+			if pause:
+				limiter.pause(delay)
+
+			with cond:
+				report['retries'] += 1
+
+			requeue(chat, attempt + 1, time.time() + delay)
+
+	threads = [
+		threading.Thread(target=worker, name=f'fanout-{idx}', daemon=True)
+		for idx in range(min(workers, len(queue)))
+	]
+	for thread in threads:
+		thread.start()
+
+	for thread in threads:
+		thread.join()
+
+	report['seconds'] = time.time() - start
+	report['rate'] = report['sent'] / max(report['seconds'], 0.001)
+	return report
+
+
+def log_fan_out(label: str, report: dict):
+	logging.info(
+		f'📨 {label}: {report["sent"]}/{report["chats"]} за {report["seconds"]:.1f} с ({report["rate"]:.1f} сообщ/с), пропущено: {report["skipped"]}, повторов: {report["retries"]}, не доставлено: {report["failed"]}'
+	)
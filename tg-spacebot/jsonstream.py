@@ -0,0 +1,104 @@
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+DECODER = json.JSONDecoder()
+
+
+class JSONStreamReader:
+	def __init__(self, chunks):
+		self.chunks = iter(chunks)
+		self.decoder = codecs.getincrementaldecoder('utf-8')()
+		self.buffer = ''
+		self.pos = 0
+		self.exhausted = False
+
+	def read_more(self) -> bool:
+		if self.exhausted:
+			return False
+
+		try:
+			chunk = next(self.chunks)
+		except StopIteration:
+			self.exhausted = True
+			self.buffer = self.buffer[self.pos:] + self.decoder.decode(
+				b'', final=True)
+			self.pos = 0
+			return False
+
+		if isinstance(chunk, bytes):
+			chunk = self.decoder.decode(chunk)
+
+		self.buffer = self.buffer[self.pos:] + chunk
+		self.pos = 0
+		return True
+
+	def peek(self) -> str:
+		while True:
+			while self.pos < len(self.buffer) and self.buffer[
+				self.pos] in WHITESPACE:
+				self.pos += 1
+
+			if self.pos < len(self.buffer):
+				return self.buffer[self.pos]
+
+			if not self.read_more():
+				raise ValueError('unexpected end of JSON stream')
+
+	def expect(self, char: str):
+		if self.peek() != char:
+			raise ValueError(
+				f'expected {char!r} in JSON stream, got {self.buffer[self.pos]!r}'
+			)
+
+		self.pos += 1
+
+	def value(self):
+		self.peek()
+		while True:
+			try:
+				obj, end = DECODER.raw_decode(self.buffer, self.pos)
+			except json.JSONDecodeError:
+				if not self.read_more():
+					raise
+				continue
+
+			if end == len(self.buffer) and self.read_more():
+				continue
+
+			self.pos = end
+			return obj
+
+
+def iter_json_array(chunks, key: str, header: dict):
+	reader = JSONStreamReader(chunks)
+
+	reader.expect('{')
+	if reader.peek() == '}':
+		return
+
+	while True:
+		field = reader.value()
+		reader.expect(':')
+
+		if field == key and reader.peek() == '[':
+			reader.expect('[')
+			if reader.peek() == ']':
+				reader.expect(']')
+			else:
+				while True:
+					yield reader.value()
+
+					if reader.peek() == ',':
+						reader.expect(',')
+					else:
+						reader.expect(']')
+						break
+		else:
+			header[field] = reader.value()
+
+		if reader.peek() == ',':
+			reader.expect(',')
+		else:
+			reader.expect('}')
+			return
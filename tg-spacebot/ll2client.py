@@ -0,0 +1,208 @@
+import os
+import time
+import threading
+
+import requests
+import ujson as json
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+CONNECT_TIMING = threading.local()
+
+
+def record_connect(seconds: float):
+	CONNECT_TIMING.seconds = getattr(CONNECT_TIMING, 'seconds', 0.0) + seconds
+	CONNECT_TIMING.count = getattr(CONNECT_TIMING, 'count', 0) + 1
+
+
+class TimedHTTPConnection(HTTPConnection):
+	def connect(self):
+		t0 = time.time()
+		super().connect()
+		record_connect(time.time() - t0)
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+	def connect(self):
+		t0 = time.time()
+		super().connect()
+		record_connect(time.time() - t0)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+	ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+	ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+	def init_poolmanager(self, *args, **kwargs):
+		super().init_poolmanager(*args, **kwargs)
+		self.poolmanager.pool_classes_by_scheme = {
+			'http': TimedHTTPConnectionPool,
+			'https': TimedHTTPSConnectionPool
+		}
+
+
+class ResponseRecorder:
+	index_lock = threading.Lock()
+
+	def __init__(self, record_dir: str, url: str, status: int):
+		if not os.path.isdir(record_dir):
+			os.makedirs(record_dir)
+
+		self.record_dir = record_dir
+		self.url = url
+		self.status = status
+		self.received = time.time()
+		self.file_name = f'{int(self.received * 1000)}-{threading.get_ident()}.json'
+		self.file = open(os.path.join(record_dir, self.file_name), 'wb')
+		self.size = 0
+
+	def write(self, chunk: bytes):
+		self.file.write(chunk)
+		self.size += len(chunk)
+
+	def close(self):
+		if self.file.closed:
+			return
+
+		self.file.close()
+
+		index_entry = {
+			'time': self.received,
+			'url': self.url,
+			'status': self.status,
+			'file': self.file_name,
+			'bytes': self.size
+		}
+
+		with ResponseRecorder.index_lock:
+			with open(os.path.join(self.record_dir, 'index.jsonl'),
+				'a') as index_file:
+				index_file.write(json.dumps(index_entry) + '\n')
+
+
+class LL2Client:
+	def __init__(self, bot_username: str, pool_maxsize: int = 4):
+		self.bot_username = bot_username
+
+		self.session = requests.Session()
+		self.session.headers.update({
+			'user-agent': f'telegram-{bot_username}',
+			'accept': 'application/json',
+			'accept-encoding': 'gzip, deflate'
+		})
+
+		adapter = TimedHTTPAdapter(pool_connections=2,
+			pool_maxsize=pool_maxsize)
+		self.session.mount('https://', adapter)
+		self.session.mount('http://', adapter)
+
+		self.lock = threading.Lock()
+		self.totals = {
+			'requests': 0,
+			'connections': 0,
+			'connect': 0.0,
+			'ttfb': 0.0,
+			'download': 0.0,
+			'bytes': 0,
+			'wire_bytes': 0
+		}
+
+	def get(self, url: str, stream: bool = False, timeout: int = 5,
+		record_dir: str = None) -> tuple:
+		CONNECT_TIMING.seconds, CONNECT_TIMING.count = 0.0, 0
+
+		t0 = time.time()
+		response = self.session.get(url, timeout=timeout, stream=True)
+		headers_received = time.time()
+
+		if record_dir is not None:
+			response.recorder = ResponseRecorder(record_dir=record_dir,
+				url=url,
+				status=response.status_code)
+		else:
+			response.recorder = None
+
+		timing = {
+			'connections': CONNECT_TIMING.count,
+			'connect': CONNECT_TIMING.seconds,
+			'ttfb': headers_received - t0 - CONNECT_TIMING.seconds,
+			'download': 0.0,
+			'bytes': 0,
+			'wire_bytes': 0,
+			'encoding': response.headers.get('content-encoding', 'identity')
+		}
+
+		if not response.ok:
+			if response.recorder is not None:
+				response.recorder.write(response.content)
+
+			response.close()
+			self.finish(response, timing)
+			response.raise_for_status()
+
+		if not stream:
+			timing['bytes'] = len(response.content)
+			timing['download'] = time.time() - headers_received
+
+			if response.recorder is not None:
+				response.recorder.write(response.content)
+
+			self.finish(response, timing)
+
+		return response, timing
+
+	def iter_content(self, response: requests.Response, timing: dict,
+		chunk_size: int = 16 * 1024):
+		chunk_iter = response.iter_content(chunk_size=chunk_size)
+		try:
+			while True:
+				t0 = time.time()
+				chunk = next(chunk_iter, None)
+				timing['download'] += time.time() - t0
+
+				if chunk is None:
+					return
+
+				timing['bytes'] += len(chunk)
+				if response.recorder is not None:
+					response.recorder.write(chunk)
+
+				yield chunk
+		finally:
+			response.close()
+			self.finish(response, timing)
+
+	def finish(self, response: requests.Response, timing: dict):
+		if response.recorder is not None:
+			response.recorder.close()
+
+		try:
+			timing['wire_bytes'] = response.raw.tell()
+		except Exception:
+			timing['wire_bytes'] = timing['bytes']
+
+		with self.lock:
+			self.totals['requests'] += 1
+			for key in ('connections', 'connect', 'ttfb', 'download', 'bytes',
+				'wire_bytes'):
+				self.totals[key] += timing[key]
+
+
+LL2_CLIENT = {'client': None, 'lock': threading.Lock()}
+
+
+def get_ll2_client(bot_username: str) -> LL2Client:
+	with LL2_CLIENT['lock']:
+		client = LL2_CLIENT['client']
+		if client is None or client.bot_username != bot_username:
+			client = LL2Client(bot_username=bot_username)
+			LL2_CLIENT['client'] = client
+
+		return client
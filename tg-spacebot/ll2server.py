@@ -0,0 +1,418 @@
+import os
+import re
+import sys
+import gzip
+import time
+import random
+import logging
+import argparse
+import threading
+
+import coloredlogs
+import ujson as json
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from synthetic import synthetic_launch, synthetic_list_launch, synthetic_event
+from tools import timestamp_to_unix
+
+LL2_URL = 'https://ll.thespacedevs.com'
+DETAIL_PATH = re.compile(r'^/[\d.]+/launch/([0-9a-f-]{36})/?$')
+
+
+def parse_timestamp(timestamp: str) -> int:
+	return timestamp_to_unix(re.sub(r'\.\d+', '', timestamp))
+
+
+def replay_key(url: str) -> tuple:
+	split_url = urlsplit(url)
+	offset = parse_qs(split_url.query).get('offset', ['0'])[0]
+
+	return split_url.path.rstrip('/'), offset
+
+
+class ArchiveReplay:
+	def __init__(self, archive_dir: str, speedup: float):
+		self.archive_dir = archive_dir
+		self.speedup = speedup
+		self.entries = {}
+
+		with open(os.path.join(archive_dir, 'index.jsonl'), 'r') as index_file:
+			for line in index_file:
+				if line.strip() == '':
+					continue
+
+				entry = json.loads(line)
+				self.entries.setdefault(replay_key(entry['url']), []).append(entry)
+
+		if len(self.entries) == 0:
+			sys.exit(f'{archive_dir}: пустой архив')
+
+		for entries in self.entries.values():
+			entries.sort(key=lambda entry: entry['time'])
+
+		self.archive_start = min(entries[0]['time']
+			for entries in self.entries.values())
+		self.replay_start = time.time()
+
+		logging.info(
+			f'📼 архив {archive_dir}: {sum(len(e) for e in self.entries.values())} ответов, {len(self.entries)} адресов'
+		)
+
+	def archive_time(self) -> float:
+		return self.archive_start + (time.time() -
+			self.replay_start) * self.speedup
+
+	def lookup(self, url: str) -> tuple:
+		entries = self.entries.get(replay_key(url))
+		if entries is None:
+			return None
+
+		now = self.archive_time()
+		chosen = entries[0]
+		for entry in entries:
+			if entry['time'] > now:
+				break
+
+			chosen = entry
+
+		with open(os.path.join(self.archive_dir, chosen['file']), 'rb') as body:
+			return chosen['status'], body.read()
+
+
+class SyntheticLL2:
+	def __init__(self, launch_count: int, speedup: float, churn: int,
+		seed: int = 0):
+		self.speedup = speedup
+		self.churn = churn
+		self.rng = random.Random(seed)
+		self.lock = threading.Lock()
+
+		self.start = int(time.time())
+		self.ticks = 0
+		self.revisions = [0] * launch_count
+		self.updated = [self.start] * launch_count
+		self.spacing = max(60, int(60 * 24 * 3600 / max(1, launch_count)))
+		self.nets = [
+			self.start + (idx + 1) * self.spacing for idx in range(launch_count)
+		]
+		self.launches = [
+			synthetic_launch(idx=idx, net_unix=net_unix, last_updated=self.start)
+			for idx, net_unix in enumerate(self.nets)
+		]
+		self.events = [
+			synthetic_event(idx=idx,
+			date_unix=self.start + (idx + 1) * 5 * 24 * 3600,
+			launch_ids=[self.launches[idx * 10]['id']]
+			if idx * 10 < launch_count else [])
+			for idx in range(launch_count // 10 + 1)
+		]
+
+		logging.info(
+			f'🧪 синтетика: {launch_count} запусков, {churn} изменений в (симулированный) час'
+		)
+
+	def virtual_time(self) -> int:
+		return int(self.start + (time.time() - self.start) * self.speedup)
+
+	def apply_churn(self):
+		if self.churn == 0 or len(self.launches) == 0:
+			return
+
+		now = self.virtual_time()
+		ticks = (now - self.start) // 3600
+
+		while self.ticks < ticks:
+			self.ticks += 1
+			tick_time = self.start + self.ticks * 3600
+
+			for idx in self.rng.sample(range(len(self.launches)),
+				min(self.churn, len(self.launches))):
+				self.revisions[idx] += 1
+				self.updated[idx] = tick_time
+				self.nets[idx] = self.start + (idx + 1) * self.spacing + self.revisions[
+					idx] * 600
+				self.launches[idx] = synthetic_launch(idx=idx,
+					net_unix=self.nets[idx],
+					last_updated=tick_time,
+					revision=self.revisions[idx])
+
+	def paginate(self, base_url: str, path: str, query: dict,
+		items: list) -> dict:
+		limit = int(query.get('limit', ['10'])[0])
+		offset = int(query.get('offset', ['0'])[0])
+
+		results = items[offset:offset + limit]
+
+		if offset + limit < len(items):
+			next_query = '&'.join(f'{key}={val[0]}'
+				for key, val in query.items() if key != 'offset')
+			next_url = f'{base_url}{path}?{next_query}&offset={offset + limit}'
+		else:
+			next_url = None
+
+		return {
+			'count': len(items),
+			'next': next_url,
+			'previous': None,
+			'results': results
+		}
+
+	def upcoming(self, base_url: str, path: str, query: dict) -> dict:
+		with self.lock:
+			self.apply_churn()
+			launched_before = self.virtual_time() - 3600
+			indices = [
+				idx for idx, net_unix in enumerate(self.nets)
+				if net_unix >= launched_before
+			]
+
+			if 'last_updated__gte' in query:
+				updated_since = parse_timestamp(query['last_updated__gte'][0])
+				indices = [
+					idx for idx in indices if self.updated[idx] >= updated_since
+				]
+
+			if 'net__lte' in query:
+				net_before = parse_timestamp(query['net__lte'][0])
+				indices = [idx for idx in indices if self.nets[idx] <= net_before]
+
+			launches = [self.launches[idx] for idx in indices]
+
+		if query.get('mode', ['normal'])[0] == 'list':
+			launches = [synthetic_list_launch(launch) for launch in launches]
+
+		return self.paginate(base_url, path, query, launches)
+
+	def previous(self, base_url: str, path: str, query: dict) -> dict:
+		with self.lock:
+			self.apply_churn()
+			now = self.virtual_time()
+			indices = [
+				idx for idx, net_unix in enumerate(self.nets) if net_unix <= now
+			]
+
+			if 'net__gte' in query:
+				net_after = parse_timestamp(query['net__gte'][0])
+				indices = [idx for idx in indices if self.nets[idx] >= net_after]
+
+			launches = [
+				synthetic_launch(idx=idx,
+				net_unix=self.nets[idx],
+				last_updated=max(self.updated[idx], self.nets[idx]),
+				revision=self.revisions[idx],
+				launched=True) for idx in sorted(indices, reverse=True)
+			]
+
+		return self.paginate(base_url, path, query, launches)
+
+	def upcoming_events(self, base_url: str, path: str, query: dict) -> dict:
+		now = self.virtual_time()
+		events = [
+			event for event in self.events
+			if parse_timestamp(event['date']) >= now
+		]
+
+		return self.paginate(base_url, path, query, events)
+
+	def detail(self, unique_id: str) -> dict:
+		with self.lock:
+			self.apply_churn()
+			for launch in self.launches:
+				if launch['id'] == unique_id:
+					return launch
+
+		return None
+
+
+class LL2RequestHandler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def log_message(self, format, *args):
+		logging.debug(f'{self.address_string()} {format % args}')
+
+	def send_body(self, status: int, body: bytes, headers: dict = None):
+		if 'gzip' in self.headers.get('accept-encoding', ''):
+			body = gzip.compress(body)
+			encoding = 'gzip'
+		else:
+			encoding = None
+
+		self.send_response(status)
+		self.send_header('content-type', 'application/json')
+		self.send_header('content-length', str(len(body)))
+
+		if encoding is not None:
+			self.send_header('content-encoding', encoding)
+
+		for key, val in (headers or {}).items():
+			self.send_header(key, val)
+
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+		options = self.server.options
+		stats = self.server.stats
+
+		with self.server.lock:
+			stats['requests'] += 1
+
+		if options.latency > 0 or options.jitter > 0:
+			time.sleep(
+				max(0, options.latency + random.uniform(-options.jitter,
+				options.jitter)) / 1000)
+
+		if random.random() < options.error_rate:
+			with self.server.lock:
+				stats['throttled'] += 1
+
+			self.send_body(429,
+				json.dumps({
+				'detail': 'Request was throttled. Expected available in 60 seconds.'
+				}).encode(),
+				headers={'retry-after': '60'})
+			return
+
+		base_url = f'http://{self.headers.get("host")}'
+		split_url = urlsplit(self.path)
+
+		if self.server.replay is not None:
+			replayed = self.server.replay.lookup(self.path)
+			if replayed is None:
+				status, body = 404, json.dumps({'detail': 'Not found.'}).encode()
+			else:
+				status, body = replayed
+				body = body.replace(LL2_URL.encode(), base_url.encode())
+		else:
+			synthetic = self.server.synthetic
+			detail_match = DETAIL_PATH.match(split_url.path)
+			listings = {
+				'launch/upcoming': synthetic.upcoming,
+				'launch/previous': synthetic.previous,
+				'event/upcoming': synthetic.upcoming_events
+			}
+			listing = split_url.path.strip('/').split('/', 1)[-1]
+
+			if detail_match is not None:
+				payload = synthetic.detail(detail_match.group(1))
+			elif listing in listings:
+				payload = listings[listing](base_url=base_url,
+					path=split_url.path,
+					query=parse_qs(split_url.query))
+			else:
+				payload = None
+
+			if payload is None:
+				status, body = 404, json.dumps({'detail': 'Not found.'}).encode()
+			else:
+				status, body = 200, json.dumps(payload).encode()
+
+		if status == 200 and random.random() < options.malformed_rate:
+			with self.server.lock:
+				stats['malformed'] += 1
+
+			body = body[:len(body) // 2]
+
+		self.send_body(status, body)
+
+
+def serve(options: argparse.Namespace):
+	server = ThreadingHTTPServer((options.host, options.port),
+		LL2RequestHandler)
+	server.daemon_threads = True
+	server.options = options
+	server.lock = threading.Lock()
+	server.stats = {'requests': 0, 'throttled': 0, 'malformed': 0}
+
+	if options.archive is not None:
+		server.replay = ArchiveReplay(archive_dir=options.archive,
+			speedup=options.speedup)
+		server.synthetic = None
+	else:
+		server.replay = None
+		server.synthetic = SyntheticLL2(launch_count=options.synthetic,
+			speedup=options.speedup,
+			churn=options.churn,
+			seed=options.seed)
+
+	random.seed(options.seed)
+
+	logging.info(
+		f'🛰 LL2 stand-in на http://{options.host}:{options.port} (ускорение x{options.speedup}). В api.api_url: "http://{options.host}:{options.port}"'
+	)
+
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		logging.info(
+			f'🛰 запросов: {server.stats["requests"]}, 429: {server.stats["throttled"]}, битых: {server.stats["malformed"]}'
+		)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser('ll2server.py')
+
+	parser.add_argument('--archive',
+		dest='archive',
+		help='Replay responses recorded with api.record_responses from this directory'
+	)
+	parser.add_argument('--synthetic',
+		dest='synthetic',
+		type=int,
+		help='Serve this many synthetic launches')
+	parser.add_argument('--host', dest='host', default='127.0.0.1')
+	parser.add_argument('--port', dest='port', type=int, default=8042)
+	parser.add_argument('--speedup',
+		dest='speedup',
+		type=float,
+		default=1.0,
+		help='Archive/synthetic time passes this many times faster than real time'
+	)
+	parser.add_argument('--churn',
+		dest='churn',
+		type=int,
+		default=0,
+		help='Synthetic launches updated per simulated hour')
+	parser.add_argument('--latency',
+		dest='latency',
+		type=float,
+		default=0,
+		help='Added response latency, ms')
+	parser.add_argument('--jitter',
+		dest='jitter',
+		type=float,
+		default=0,
+		help='Random latency jitter, ms')
+	parser.add_argument('--error-rate',
+		dest='error_rate',
+		type=float,
+		default=0,
+		help='Share of requests answered with 429')
+	parser.add_argument('--malformed-rate',
+		dest='malformed_rate',
+		type=float,
+		default=0,
+		help='Share of responses truncated to malformed JSON')
+	parser.add_argument('--seed', dest='seed', type=int, default=0)
+	parser.add_argument('-debug',
+		dest='debug',
+		help='Log every request',
+		action='store_true')
+
+	options = parser.parse_args()
+
+	if (options.archive is None) == (options.synthetic is None):
+		sys.exit('Нужен ровно один из --archive или --synthetic')
+
+	log_level = logging.DEBUG if options.debug else logging.INFO
+	logging.basicConfig(level=log_level,
+		format='%(asctime)s %(message)s',
+		datefmt='%d/%m/%Y %H:%M:%S')
+	coloredlogs.install(level=log_level)
+
+	serve(options)
@@ -0,0 +1,162 @@
+import os
+import time
+import sqlite3
+import logging
+
+from db import (create_chats_db, create_launch_db, create_launch_stages_db,
+	create_launch_crew_db, create_event_db, create_api_state_db,
+	create_stats_db, create_description_summary_db,
+	create_chat_subscriptions_db)
+from dbconn import connect_db
+from dbwriter import DB_WRITER
+from outbox import create_notification_outbox_db
+
+
+def table_exists(cursor: sqlite3.Cursor, table: str) -> bool:
+	cursor.execute(
+		'SELECT name FROM sqlite_master WHERE type = ? AND name = ?',
+		('table', table))
+	return len(cursor.fetchall()) != 0
+
+
+def create_base_tables(db_path: str, cursor: sqlite3.Cursor):
+	if not table_exists(cursor, 'chats'):
+		create_chats_db(db_path=db_path, cursor=cursor)
+	elif not table_exists(cursor, 'chat_subscriptions'):
+		create_chat_subscriptions_db(cursor=cursor)
+
+	if not table_exists(cursor, 'launches'):
+		create_launch_db(db_path=db_path, cursor=cursor)
+
+	for table, create_table in (('launch_stages', create_launch_stages_db),
+		('launch_crew', create_launch_crew_db), ('events', create_event_db),
+		('api_state', create_api_state_db),
+		('description_summaries', create_description_summary_db)):
+		if not table_exists(cursor, table):
+			create_table(cursor=cursor)
+
+	if not table_exists(cursor, 'stats'):
+		create_stats_db(db_path=db_path)
+
+
+def add_launch_hash_columns(db_path: str, cursor: sqlite3.Cursor):
+	cursor.execute('PRAGMA table_info(launches)')
+	launch_columns = {row[1] for row in cursor.fetchall()}
+
+	for hash_column in ('source_hash', 'list_hash'):
+		if hash_column not in launch_columns:
+			cursor.execute(f'ALTER TABLE launches ADD COLUMN {hash_column} TEXT')
+
+
+def create_launch_query_indexes(db_path: str, cursor: sqlite3.Cursor):
+	# focus polls, the upcoming-launch listings' launched = 0 branch
+	cursor.execute(
+		'CREATE INDEX IF NOT EXISTS launched_net_unix ON launches (launched, net_unix)'
+	)
+
+	# clean_launch_db and the incremental carry-forward
+	cursor.execute(
+		'CREATE INDEX IF NOT EXISTS last_updated ON launches (last_updated)')
+
+	# name_from_provider_id, answered from the index alone
+	cursor.execute(
+		'CREATE INDEX IF NOT EXISTS lsp_id_to_lsp_name ON launches (lsp_id, lsp_name)'
+	)
+
+	cursor.execute(
+		'CREATE INDEX IF NOT EXISTS net_unix_to_lsp_short ON launches (net_unix, lsp_short)'
+	)
+
+
+def drop_chat_string_indexes(db_path: str, cursor: sqlite3.Cursor):
+	# prefixed by the primary key, so never picked; chat_subscriptions serves
+	# provider lookups now
+	cursor.execute('DROP INDEX IF EXISTS chatenabled')
+	cursor.execute('DROP INDEX IF EXISTS chatdisabled')
+
+
+def create_notification_outbox(db_path: str, cursor: sqlite3.Cursor):
+	create_notification_outbox_db(cursor=cursor)
+
+
+MIGRATIONS = (
+	(1, 'base tables', create_base_tables),
+	(2, 'launch hash columns', add_launch_hash_columns),
+	(3, 'launch query indexes', create_launch_query_indexes),
+	(4, 'drop chat string indexes', drop_chat_string_indexes),
+	(5, 'notification outbox', create_notification_outbox),
+)
+
+
+def create_schema_version_db(cursor: sqlite3.Cursor):
+	cursor.execute('''CREATE TABLE IF NOT EXISTS schema_version
+		(version INT, name TEXT, applied INT, duration_ms REAL,
+		PRIMARY KEY (version))''')
+
+
+def load_schema_version(db_path: str) -> int:
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	try:
+		cursor.execute('SELECT MAX(version) FROM schema_version')
+		version = cursor.fetchall()[0][0]
+	except sqlite3.OperationalError:
+		version = None
+
+	conn.close()
+	return 0 if version is None else version
+
+
+def apply_migration(db_path: str, version: int, name: str, migration) -> float:
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	create_schema_version_db(cursor=cursor)
+
+	# another caller may have got here first
+	cursor.execute('SELECT version FROM schema_version WHERE version = ?',
+		(version, ))
+	if len(cursor.fetchall()) != 0:
+		conn.close()
+		return None
+
+	t0 = time.perf_counter()
+	migration(db_path=db_path, cursor=cursor)
+	duration = time.perf_counter() - t0
+
+	cursor.execute(
+		'INSERT INTO schema_version (version, name, applied, duration_ms) VALUES (?, ?, ?, ?)',
+		(version, name, int(time.time()), duration * 1000))
+
+	conn.commit()
+	conn.close()
+
+	return duration
+
+
+def apply_migrations(db_path: str) -> list:
+	if not os.path.isdir(db_path):
+		os.makedirs(db_path)
+
+	current_version = load_schema_version(db_path)
+
+	applied = []
+	for version, name, migration in MIGRATIONS:
+		if version <= current_version:
+			continue
+
+		duration = DB_WRITER.write(db_path, apply_migration,
+			(db_path, version, name, migration))
+
+		if duration is not None:
+			logging.info(
+				f'🗄 миграция {version} ({name}): {duration * 1000:.1f} мс')
+			applied.append((version, name, duration))
+
+	if len(applied) > 0:
+		logging.info(
+			f'🗄 схема бд: версия {current_version} → {applied[-1][0]}, {sum(a[2] for a in applied) * 1000:.1f} мс'
+		)
+
+	return applied
@@ -10,69 +10,76 @@ import telegram
 from apscheduler.schedulers.background import BackgroundScheduler
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
-from db import create_chats_db, update_stats_db
+from db import (create_chats_db, update_stats_db, load_launch_vehicle,
+	delete_launch_vehicles, migrate_chat, create_chat_subscriptions_db,
+	store_chat_subscriptions, migrate_chat_subscriptions, NOTIFY_CLASSES)
+from dbconn import connect_db
+from dbwriter import DB_WRITER, queued_write
+from fanout import RetryLater, fan_out, log_fan_out
+from outbox import (enqueue_notification, claim_pending, record_delivery,
+	expire_pending, load_delivered_ids, load_unfinished_batches, outbox_status)
 from timezone import load_bulk_tz_offset
 from tools import (short_monospaced_text, map_country_code_to_flag,
 	reconstruct_link_for_markdown, reconstruct_message_for_markdown,
 	anonymize_id, suffixed_readable_int, timestamp_to_legible_date_string,
-	retry_after, time_delta_to_legible_eta)
+	retry_after)
+
+# how long before liftoff each notification is sent, and how late it may still
+# go out before it counts as missed
+NOTIFY_LEAD_TIMES = {
+	'notify_24h': 24 * 3600 + 5 * 60,
+	'notify_12h': 12 * 3600 + 5 * 60,
+	'notify_60min': 3600 + 5 * 60,
+	'notify_5min': 5 * 60 + 7 * 60
+}
+NOTIFY_GRACE = 5 * 60
 
 
 def postpone_notification(
 		db_path: str, postpone_tuple: tuple, bot: 'telegram.bot.Bot'):
 
-	def send_postpone_notification(chat_id: str, launch_id: str):
+	def render_postpone_message(tz_tuple: tuple) -> str:
+		message = render_launch_time(message=postpone_msg,
+			net_unix=launch_obj.net_unix,
+			tz_tuple=tz_tuple)
 
-		try:
-			keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-				InlineKeyboardButton(text='🔇 Mute this launch',
-				callback_data=f'mute/{launch_id}/1')
-			]])
+		date_string = timestamp_to_legible_date_string(
+			timestamp=launch_obj.net_unix + 3600 * float(tz_tuple[0]),
+			use_utc=True)
+
+		return message.replace('DATEHERE', date_string)
+
+	def send_postpone_notification(chat_id: str) -> str:
+		message = rendered_messages[notification_list_tzs[chat_id]]
 
+		try:
 			sent_msg = bot.sendMessage(chat_id,
 				message,
 				parse_mode='MarkdownV2',
 				reply_markup=keyboard)
 
-			msg_identifier = f'{sent_msg["chat"]["id"]}:{sent_msg["message_id"]}'
-			return True, msg_identifier
+			return f'{sent_msg["chat"]["id"]}:{sent_msg["message_id"]}'
 
 		except telegram.error.RetryAfter as error:
-			retry_time = error.retry_after
-			retry_after(retry_time)
-
-			return False, None
+			raise RetryLater(delay=error.retry_after, global_pause=True)
 
 		except telegram.error.TimedOut as error:
-			logging.exception(
-				'telegram.error.TimedOut: ждем секунду')
-			retry_after(1)
-
-			return False, None
+			logging.warning(f'telegram.error.TimedOut: {chat_id}')
+			raise RetryLater(delay=1)
 
 		except telegram.error.Unauthorized as error:
 			logging.info(f'{error}')
 
 			clean_chats_db(db_path, chat_id)
 
-			return True, None
+			return None
 
 		except telegram.error.ChatMigrated as error:
-			conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
-			cursor = conn.cursor()
-
-			try:
-				cursor.execute('UPDATE chats SET chat = ? WHERE chat = ?',
-					(error.new_chat_id, chat_id))
-			except:
-				pass
-			conn.commit()
-			conn.close()
+			migrate_chat(db_path=db_path,
+				old_id=chat_id,
+				new_id=error.new_chat_id)
 			clean_chats_db(db_path, chat_id)
-			return True, None
-
-		else:
-			return True, None
+			return None
 
 	launch_obj = postpone_tuple[0]
 	postpone_msg = postpone_tuple[1]
@@ -93,65 +100,22 @@ def postpone_notification(
 	notification_list_tzs = load_bulk_tz_offset(data_dir=db_path,
 		chat_id_set=notification_list)
 
-	API_SEND_LIMIT_PER_SECOND = 4
-	messages_sent = 0
-	send_start_time = int(time.time())
+	keyboard = mute_keyboard(launch_id=launch_obj.unique_id)
+	rendered_messages = render_per_time_zone(
+		label=f'{launch_obj.name} (postpone)',
+		chat_tzs=notification_list_tzs,
+		render=render_postpone_message)
 
-	sent_notification_ids = set()
-	for chat, tz_tuple in notification_list_tzs.items():
-		utc_offset = 3600 * tz_tuple[0]
-		launch_unix = datetime.datetime.utcfromtimestamp(launch_obj.net_unix +
-			utc_offset)
+	report = fan_out(chats=notification_list_tzs.keys(),
+		send=send_postpone_notification)
+	log_fan_out(label=f'{launch_obj.name} (postpone)', report=report)
 
-		if launch_unix.minute < 10:
-			launch_time = f'{launch_unix.hour}:0{launch_unix.minute}'
-		else:
-			launch_time = f'{launch_unix.hour}:{launch_unix.minute}'
-
-		time_string = f'`{launch_time}` `UTC{tz_tuple[1]}`'
-		message = postpone_msg.replace('LAUNCHTIMEHERE', time_string)
-
-		date_string = timestamp_to_legible_date_string(
-			timestamp=launch_obj.net_unix + utc_offset, use_utc=True)
-
-		message = message.replace('DATEHERE', date_string)
-
-		success, msg_id = send_postpone_notification(chat_id=chat,
-			launch_id=launch_obj.unique_id)
-
-		if success and msg_id is not None:
-			sent_notification_ids.add(msg_id)
-		elif not success:
-
-			fail_count = 0
-			while fail_count < 5:
-				fail_count += 1
-				success, msg_id = send_postpone_notification(chat_id=chat,
-					launch_id=launch_obj.unique_id)
-
-				if success:
-					break
-
-				time.sleep(1)
-
-			if success and msg_id is not None:
-				sent_notification_ids.add(msg_id)
-		time.sleep(1 / API_SEND_LIMIT_PER_SECOND)
-
-		messages_sent += 1
-		if messages_sent % 50 == 0:
-			time.sleep(3)
-
-	send_end_time = int(time.time())
-	eta_string = time_delta_to_legible_eta(send_end_time - send_start_time,
-		True)
-
-	return notification_list, sent_notification_ids
+	return notification_list, report['message_ids']
 
 
 def get_user_notifications_status(db_dir: str, chat: str, provider_set: set,
 	provider_name_map: dict):
-	conn = sqlite3.connect(os.path.join(db_dir, 'launchbot-data.db'))
+	conn = connect_db(db_dir)
 	conn.row_factory = sqlite3.Row
 	cursor = conn.cursor()
 
@@ -215,9 +179,10 @@ def get_user_notifications_status(db_dir: str, chat: str, provider_set: set,
 	return notification_statuses
 
 
+@queued_write()
 def store_notification_identifiers(
 		db_path: str, launch_id: str, identifiers: str):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	update_tuple = (identifiers, launch_id)
@@ -232,10 +197,11 @@ def store_notification_identifiers(
 	conn.close()
 
 
+@queued_write('data_dir')
 def toggle_notification(data_dir: str, chat: str, toggle_type: str,
 	keyword: str, toggle_to_state: int, provider_by_cc: dict,
 	provider_name_map: dict):
-	conn = sqlite3.connect(os.path.join(data_dir, 'launchbot-data.db'))
+	conn = connect_db(data_dir)
 	conn.row_factory = sqlite3.Row
 	cursor = conn.cursor()
 
@@ -354,6 +320,14 @@ def toggle_notification(data_dir: str, chat: str, toggle_type: str,
 			'''UPDATE chats SET enabled_notifications = ?, disabled_notifications = ?
 				WHERE chat = ?''', (new_enabled_str, new_disabled_str, chat))
 
+	cursor.execute(
+		'SELECT name FROM sqlite_master WHERE type = ? AND name = ?',
+		('table', 'chat_subscriptions'))
+	if len(cursor.fetchall()) == 0:
+		create_chat_subscriptions_db(cursor=cursor)
+
+	store_chat_subscriptions(cursor=cursor, chat=chat, states=new_states)
+
 	conn.commit()
 	conn.close()
 
@@ -363,6 +337,7 @@ def toggle_notification(data_dir: str, chat: str, toggle_type: str,
 	return toggle_to_state
 
 
+@queued_write()
 def update_notif_preference(db_path: str, chat: str,
 	notification_type: str):
 	old_preferences = list(get_notif_preference(db_path, chat))
@@ -373,7 +348,7 @@ def update_notif_preference(db_path: str, chat: str,
 	old_preferences[update_index] = new_state
 	new_preferences = ','.join(str(val) for val in old_preferences)
 
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 	try:
 		cursor.execute(
@@ -395,7 +370,7 @@ def update_notif_preference(db_path: str, chat: str,
 
 
 def get_notif_preference(db_path: str, chat: str):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	cursor.execute("SELECT notify_time_pref FROM chats WHERE chat = ?",
@@ -412,8 +387,9 @@ def get_notif_preference(db_path: str, chat: str):
 		int(notif_preferences[2]), int(notif_preferences[3]))
 
 
+@queued_write()
 def toggle_launch_mute(db_path: str, chat: str, launch_id: str, toggle: int):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	conn.row_factory = sqlite3.Row
 	cursor = conn.cursor()
 
@@ -453,7 +429,7 @@ def toggle_launch_mute(db_path: str, chat: str, launch_id: str, toggle: int):
 
 
 def load_mute_status(db_path: str, launch_id: str):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	cursor.execute("SELECT muted_by FROM launches WHERE unique_id = ?",
@@ -472,11 +448,22 @@ def load_mute_status(db_path: str, launch_id: str):
 	return tuple(muted_by)
 
 
+@queued_write()
 def clean_chats_db(db_path, chat):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	cursor.execute("DELETE FROM chats WHERE chat = ?", (chat, ))
+
+	try:
+		cursor.execute("DELETE FROM chat_subscriptions WHERE chat = ?",
+			(chat, ))
+		cursor.execute(
+			"UPDATE notification_outbox SET state = 'skipped' WHERE chat = ? AND state = 'pending'",
+			(chat, ))
+	except sqlite3.OperationalError:
+		pass
+
 	conn.commit()
 	conn.close()
 
@@ -484,7 +471,7 @@ def clean_chats_db(db_path, chat):
 def remove_previous_notification(
 		db_path: str, launch_id: str, notify_set: set,
 		bot: 'telegram.bot.Bot'):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	cursor.execute(
@@ -539,14 +526,27 @@ def remove_previous_notification(
 
 def get_notify_list(db_path: str, lsp: str, launch_id: str, notify_class: str,
 	notif_states: tuple):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	conn.row_factory = sqlite3.Row
 	cursor = conn.cursor()
+
+	cursor.execute(
+		'SELECT name FROM sqlite_master WHERE type = ? AND name = ?',
+		('table', 'chat_subscriptions'))
+	if len(cursor.fetchall()) == 0:
+		migrate_chat_subscriptions(db_path=db_path)
+
+	# chats that enabled the provider or everything, minus those that
+	# explicitly disabled the provider; both sides are index range scans
 	try:
 		cursor.execute(
 			"""
-			SELECT * FROM chats WHERE enabled_notifications LIKE '%'||?||'%' 
-			OR enabled_notifications LIKE '%'||?||'%'""", (lsp, 'All'))
+			SELECT DISTINCT chats.chat, chats.notify_time_pref
+			FROM chat_subscriptions AS enabled
+			JOIN chats ON chats.chat = enabled.chat
+			WHERE enabled.provider IN (?, 'All') AND enabled.state = 1
+			AND enabled.chat NOT IN (SELECT chat FROM chat_subscriptions
+				WHERE provider = ? AND state = 0)""", (lsp, lsp))
 	except sqlite3.OperationalError:
 		conn.close()
 		return set()
@@ -580,9 +580,6 @@ def get_notify_list(db_path: str, lsp: str, launch_id: str, notify_class: str,
 			if chat_row['chat'] in muted_by:
 				continue
 
-			if lsp in chat_row['disabled_notifications']:
-				continue
-
 			chat_notif_prefs = chat_row['notify_time_pref'].split(',')
 
 			for notif_state in range(min_recvd_notif_idx, -1, -1):
@@ -603,9 +600,6 @@ def get_notify_list(db_path: str, lsp: str, launch_id: str, notify_class: str,
 		if chat_row['chat'] in muted_by:
 			continue
 
-		if lsp in chat_row['disabled_notifications']:
-			continue
-
 		chat_notif_prefs = chat_row['notify_time_pref'].split(',')
 
 		if chat_notif_prefs[notify_index] == '1':
@@ -615,11 +609,7 @@ def get_notify_list(db_path: str, lsp: str, launch_id: str, notify_class: str,
 	return notification_list
 
 
-def send_notification(chat: str, message: str, launch_id: str,
-	notif_class: str, bot: 'telegram.bot.Bot', tz_tuple: tuple, net_unix: int,
-	db_path: str):
-	silent = bool(notif_class not in ('notify_60min', 'notify_5min'))
-
+def render_launch_time(message: str, net_unix: int, tz_tuple: tuple) -> str:
 	utc_offset = 3600 * float(tz_tuple[0])
 	launch_unix = datetime.datetime.utcfromtimestamp(net_unix + utc_offset)
 
@@ -629,57 +619,65 @@ def send_notification(chat: str, message: str, launch_id: str,
 		launch_time = f'{launch_unix.hour}:{launch_unix.minute}'
 
 	time_string = f'`{launch_time}` `UTC{tz_tuple[1]}`'
-	message = message.replace('LAUNCHTIMEHERE', time_string)
+	return message.replace('LAUNCHTIMEHERE', time_string)
 
-	try:
-		keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-			InlineKeyboardButton(text='🔇 Mute this launch',
-			callback_data=f'mute/{launch_id}/1')
-		]])
 
+def mute_keyboard(launch_id: str) -> InlineKeyboardMarkup:
+	return InlineKeyboardMarkup(inline_keyboard=[[
+		InlineKeyboardButton(text='🔇 Mute this launch',
+		callback_data=f'mute/{launch_id}/1')
+	]])
+
+
+def render_per_time_zone(label: str, chat_tzs: dict, render) -> dict:
+	# an audience only spans a handful of utc offsets, so each one is rendered
+	# once and the text reused for every chat in it
+	t0 = time.perf_counter()
+	rendered = {tz_tuple: render(tz_tuple) for tz_tuple in set(chat_tzs.values())}
+
+	logging.info(
+		f'🖋 {label}: {len(rendered)} вариантов на {len(chat_tzs)} чатов за {(time.perf_counter() - t0) * 1000:.1f} мс'
+	)
+	return rendered
+
+
+def send_notification(chat: str, message: str, keyboard: InlineKeyboardMarkup,
+	notif_class: str, bot: 'telegram.bot.Bot', db_path: str) -> tuple:
+	# returns the chat the message went to, which a migrated group changes,
+	# and the message identifier (None if there's nothing to retry)
+	silent = bool(notif_class not in ('notify_60min', 'notify_5min'))
+
+	try:
 		sent_msg = bot.sendMessage(chat,
 			message,
 			parse_mode='MarkdownV2',
 			reply_markup=keyboard,
 			disable_notification=silent)
 
-		msg_identifier = f'{sent_msg["chat"]["id"]}:{sent_msg["message_id"]}'
-		return True, msg_identifier
+		return chat, f'{sent_msg["chat"]["id"]}:{sent_msg["message_id"]}'
 
 	except telegram.error.RetryAfter as error:
-		retry_time = error.retry_after
-		retry_after(retry_time)
-
-		return False, None
+		raise RetryLater(delay=error.retry_after, global_pause=True)
 
 	except telegram.error.TimedOut as error:
-		retry_after(1)
-
-		return False, None
+		raise RetryLater(delay=1)
 
 	except telegram.error.Unauthorized as error:
 		clean_chats_db(db_path, chat)
-		return True, None
+		return chat, None
 
 	except telegram.error.ChatMigrated as error:
-		conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
-		cursor = conn.cursor()
-
-		try:
-			cursor.execute('UPDATE chats SET chat = ? WHERE chat = ?',
-				(error.new_chat_id, chat))
-		except:
-			pass
-		conn.commit()
-		conn.close()
+		# the group's outbox row moves with it, so it's sent to right away
+		migrate_chat(db_path=db_path, old_id=chat, new_id=error.new_chat_id)
+		return send_notification(chat=str(error.new_chat_id),
+			message=message,
+			keyboard=keyboard,
+			notif_class=notif_class,
+			bot=bot,
+			db_path=db_path)
 
 	except telegram.error.BadRequest as error:
-		return True, None
-		clean_chats_db(db_path, chat)
-		return True, None
-
-	else:
-		return True, None
+		return chat, None
 
 
 def create_notification_message(launch: dict, notif_class: str,
@@ -759,7 +757,7 @@ def create_notification_message(launch: dict, notif_class: str,
 	else:
 		probability = None
 
-	if launch['spacecraft_crew_count'] not in (None, 0):
+	if len(launch['crew']) > 0:
 		if 'Dragon' in launch['spacecraft_name']:
 			spacecraft_info = True
 		else:
@@ -767,10 +765,8 @@ def create_notification_message(launch: dict, notif_class: str,
 	else:
 		spacecraft_info = None
 
-	if isinstance(launch['launcher_landing_attempt'], str):
-		multiple_boosters = bool(';;' in launch['launcher_landing_attempt'])
-	else:
-		multiple_boosters = False
+	stages = launch['stages']
+	multiple_boosters = bool(len(stages) > 1)
 
 	landing_loc_map = {
 		'OCISLY': 'Atlantic Ocean',
@@ -783,12 +779,13 @@ def create_notification_message(launch: dict, notif_class: str,
 		'PAC': 'Expend 💥'
 	}
 
-	if launch['launcher_landing_attempt'] and not multiple_boosters:
-		core_str = launch['launcher_serial_number']
+	if len(stages) == 1 and stages[0]['landing_attempt']:
+		stage = stages[0]
+		core_str = stage['serial_number']
 		core_str = 'Unknown' if core_str is None else core_str
 
-		if launch['launcher_is_flight_proven']:
-			reuse_count = launch['launcher_stage_flight_number']
+		if stage['is_flight_proven']:
+			reuse_count = stage['flight_number']
 
 			if lsp_name == 'SpaceX' and core_str[0:2] == 'B1':
 				core_str += f'.{int(reuse_count)}'
@@ -799,18 +796,17 @@ def create_notification_message(launch: dict, notif_class: str,
 				core_str += '.1'
 
 			reuse_str = f'первый полет {core_str}'
-		if launch['launcher_landing_location'] in landing_loc_map.keys():
-			landing_type = landing_loc_map[launch['launcher_landing_location']]
-			if launch['launcher_landing_location'] in ('ATL', 'PAC'):
-				launch['launcher_landing_location'] = 'Ocean'
 
-			landing_str = f"{launch['launcher_landing_location']} ({landing_type})"
+		landing_loc = stage['landing_location']
+		if landing_loc in landing_loc_map.keys():
+			landing_type = landing_loc_map[landing_loc]
 		else:
-			landing_type = launch['landing_type']
-			if launch['launcher_landing_location'] in ('ATL', 'PAC'):
-				launch['launcher_landing_location'] = 'Ocean'
+			landing_type = stage['landing_type']
 
-			landing_str = f"{launch['launcher_landing_location']} ({landing_type})"
+		if landing_loc in ('ATL', 'PAC'):
+			landing_loc = 'Ocean'
+
+		landing_str = f"{landing_loc} ({landing_type})"
 
 		if lsp_name == 'SpaceX' and 'Starship' in launch["rocket_name"]:
 			location = f'SpaceX South Texas Launch Site, Boca Chica {location_flag}'
@@ -825,26 +821,25 @@ def create_notification_message(launch: dict, notif_class: str,
 			recovery_str += f'\n\t*Landing* {short_monospaced_text(landing_str)}'
 
 	elif multiple_boosters:
-		booster_indices = {'core': None, 'boosters': []}
-		for enum, stage_type in enumerate(
-			launch['launcher_stage_type'].split(';;')):
-			if stage_type.lower() == 'core':
-				booster_indices['core'] = enum
-			elif stage_type.lower() == 'strap-on booster':
-				booster_indices['boosters'].append(enum)
+		core_stages = [
+			stage for stage in stages
+			if str(stage['stage_type']).lower() == 'core'
+		]
+		booster_stages = [
+			stage for stage in stages
+			if str(stage['stage_type']).lower() == 'strap-on booster'
+		]
 
 		recovery_str = '''Конфигурация ракеты'''
 
-		indices = [booster_indices['core']] + booster_indices['boosters']
-		for enum, idx in enumerate(indices):
-			is_core = bool(enum == 0)
+		for enum, stage in enumerate(core_stages[0:1] + booster_stages):
+			is_core = bool(enum == 0 and len(core_stages) > 0)
 
-			core_str = launch['launcher_serial_number'].split(';;')[idx]
+			core_str = stage['serial_number']
 			core_str = 'Unknown' if core_str is None else core_str
 
-			if launch['launcher_is_flight_proven'].split(';;')[idx]:
-				reuse_count = launch['launcher_stage_flight_number'].split(
-					';;')[idx]
+			if stage['is_flight_proven']:
+				reuse_count = stage['flight_number']
 
 				if lsp_name == 'SpaceX' and core_str[0:2] == 'B1':
 					core_str += f'.{int(reuse_count)}'
@@ -856,7 +851,7 @@ def create_notification_message(launch: dict, notif_class: str,
 
 				reuse_str = f'первый полет {core_str}'
 
-			landing_loc = launch['launcher_landing_location'].split(';;')[idx]
+			landing_loc = stage['landing_location']
 			if landing_loc in landing_loc_map.keys():
 				landing_type = landing_loc_map[landing_loc]
 				if landing_loc in ('ATL', 'PAC'):
@@ -864,7 +859,7 @@ def create_notification_message(launch: dict, notif_class: str,
 
 				landing_str = f"{landing_loc} ({landing_type})"
 			else:
-				landing_type = launch['landing_type'].split(';;')[idx]
+				landing_type = stage['landing_type']
 				landing_str = f"{landing_loc} ({landing_type})"
 
 			if is_core:
@@ -932,7 +927,7 @@ def create_notification_message(launch: dict, notif_class: str,
 	if spacecraft_info is not None:
 		base_message += '\n\t'
 		base_message += '*Dragon information* 🐉\n\t'
-		base_message += f'*Crew* {short_monospaced_text("👨‍🚀" * launch["spacecraft_crew_count"])}\n\t'
+		base_message += f'*Crew* {short_monospaced_text("👨‍🚀" * len(launch["crew"]))}\n\t'
 		base_message += f'*Capsule* {short_monospaced_text(launch["spacecraft_sn"])}'
 		base_message += '\n\t'
 
@@ -965,6 +960,18 @@ def create_notification_message(launch: dict, notif_class: str,
 	return inspect.cleandoc(base_message)
 
 
+@queued_write()
+def delete_stale_launch(db_path: str, launch_uid: str):
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	cursor.execute('DELETE FROM launches WHERE unique_id = ?', (launch_uid, ))
+	delete_launch_vehicles(cursor=cursor, unique_ids=[launch_uid])
+
+	conn.commit()
+	conn.close()
+
+
 def notification_handler(db_path: str, notification_dict: dict,
 	bot_username: str, bot: 'telegram.bot.Bot'):
 
@@ -990,11 +997,11 @@ def notification_handler(db_path: str, notification_dict: dict,
 
 		if launch_last_update == last_api_update:
 			return True
-		cursor.execute('DELETE FROM launches WHERE unique_id = ?',
-			(launch_uid, ))
+
+		delete_stale_launch(db_path=db_path, launch_uid=launch_uid)
 		return False
 
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	conn.row_factory = sqlite3.Row
 	cursor = conn.cursor()
 
@@ -1004,25 +1011,16 @@ def notification_handler(db_path: str, notification_dict: dict,
 		launch_dict = [dict(row) for row in cursor.fetchall()][0]
 
 		launch_id = launch_dict['unique_id']
+		launch_dict.update(load_launch_vehicle(db_path=db_path,
+			unique_id=launch_id))
 
-		cursor.execute(
-			f"UPDATE launches SET {notify_class} = 1 WHERE unique_id = ?",
-			(launch_id, ))
-		conn.commit()
 		up_to_date = verify_launch_is_up_to_date(launch_uid=launch_id,
 			cursor=cursor)
 
 		if not up_to_date:
-			conn.commit()
 			conn.close()
 			return
 
-		notification_message = create_notification_message(launch=launch_dict,
-			notif_class=notify_class,
-			bot_username=bot_username)
-
-		logging.info(notification_message)
-
 		if len(launch_dict['lsp_name']) > len('Virgin Orbit'):
 			lsp_db_name = launch_dict['lsp_short']
 		else:
@@ -1035,84 +1033,158 @@ def notification_handler(db_path: str, notification_dict: dict,
 			notify_class=notify_class,
 			notif_states=None)
 
+		enqueue_notification(db_path=db_path,
+			launch_id=launch_id,
+			notify_class=notify_class,
+			chats=notification_list)
 
-		notification_list_tzs = load_bulk_tz_offset(data_dir=db_path,
-			chat_id_set=notification_list)
+		send_notification_batch(db_path=db_path,
+			launch_dict=launch_dict,
+			notify_class=notify_class,
+			bot_username=bot_username,
+			bot=bot)
 
-		without_sound = bool(notify_class not in ('notify_60min',
-			'notify_5min'))
+	conn.close()
 
-		API_SEND_LIMIT_PER_SECOND = 4
 
-		messages_sent = 0
-		send_start_time = int(time.time())
+def send_notification_batch(db_path: str, launch_dict: dict, notify_class: str,
+	bot_username: str, bot: 'telegram.bot.Bot'):
+	# sends to whoever in the batch's outbox is still pending; each delivery is
+	# recorded as it happens, so an interrupted batch picks up where it stopped
+	launch_id = launch_dict['unique_id']
+	pending_chats = claim_pending(db_path=db_path,
+		launch_id=launch_id,
+		notify_class=notify_class)
+
+	if len(pending_chats) == 0:
+		return
 
-		approx_send_time = 1 / API_SEND_LIMIT_PER_SECOND * len(
-			notification_list_tzs)
-		send_delta = time_delta_to_legible_eta(int(approx_send_time), True)
+	notification_message = create_notification_message(launch=launch_dict,
+		notif_class=notify_class,
+		bot_username=bot_username)
 
-		sent_notification_ids = set()
-		for chat_id, tz_tuple in notification_list_tzs.items():
-			try:
-				success, msg_id = send_notification(chat=chat_id,
-					message=notification_message,
-					launch_id=launch_id,
-					notif_class=notify_class,
-					bot=bot,
-					tz_tuple=tz_tuple,
-					net_unix=launch_dict['net_unix'],
-					db_path=db_path)
-			except Exception as error:
-				continue
+	logging.info(notification_message)
 
-			if success and msg_id is not None:
-				sent_notification_ids.add(msg_id)
-			elif not success:
-				fail_count = 0
-				while fail_count < 5:
-					fail_count += 1
-					success, msg_id = send_notification(chat=chat_id,
-						message=notification_message,
-						launch_id=launch_id,
-						notif_class=notify_class,
-						bot=bot,
-						tz_tuple=tz_tuple,
-						net_unix=launch_dict['net_unix'],
-						db_path=db_path)
-
-					if success:
-						break
-
-					time.sleep(1)
-				if success and msg_id is not None:
-					sent_notification_ids.add(msg_id)
-			time.sleep(1 / API_SEND_LIMIT_PER_SECOND)
-
-			messages_sent += 1
-			if messages_sent % 50 == 0:
-				time.sleep(3)
-
-		send_end_time = int(time.time())
-		eta_string = time_delta_to_legible_eta(send_end_time - send_start_time,
-			True)
-
-		remove_previous_notification(db_path=db_path,
-			launch_id=launch_id,
-			notify_set=notification_list,
-			bot=bot)
+	notification_list_tzs = load_bulk_tz_offset(data_dir=db_path,
+		chat_id_set=pending_chats)
 
-		msg_id_str = ','.join(sent_notification_ids)
-		store_notification_identifiers(db_path=db_path,
+	# chats deleted since the batch was queued
+	for chat_id in set(pending_chats).difference(notification_list_tzs):
+		record_delivery(db_path=db_path,
 			launch_id=launch_id,
-			identifiers=msg_id_str)
-		update_stats_db(stats_update={'notifications': len(notification_list)},
+			notify_class=notify_class,
+			chat=chat_id,
+			state='skipped')
+
+	def render_message(tz_tuple: tuple) -> str:
+		return render_launch_time(message=notification_message,
+			net_unix=launch_dict['net_unix'],
+			tz_tuple=tz_tuple)
+
+	keyboard = mute_keyboard(launch_id=launch_id)
+	rendered_messages = render_per_time_zone(
+		label=f'{launch_dict["name"]} ({notify_class})',
+		chat_tzs=notification_list_tzs,
+		render=render_message)
+
+	def send(chat_id: str) -> str:
+		sent_chat, msg_id = send_notification(chat=chat_id,
+			message=rendered_messages[notification_list_tzs[chat_id]],
+			keyboard=keyboard,
+			notif_class=notify_class,
+			bot=bot,
 			db_path=db_path)
 
+		# None: the chat is gone or refused the message, nothing to retry
+		record_delivery(db_path=db_path,
+			launch_id=launch_id,
+			notify_class=notify_class,
+			chat=sent_chat,
+			state='sent' if msg_id is not None else 'skipped',
+			msg_id=msg_id)
+
+		return msg_id
+
+	report = fan_out(chats=notification_list_tzs.keys(), send=send)
+	log_fan_out(label=f'{launch_dict["name"]} ({notify_class})',
+		report=report)
+
+	for chat_id in report['undelivered']:
+		record_delivery(db_path=db_path,
+			launch_id=launch_id,
+			notify_class=notify_class,
+			chat=chat_id,
+			state='failed')
+
+	DB_WRITER.flush(db_path)
+
+	# includes chats reached before an interruption, not just this run's
+	msg_ids = load_delivered_ids(db_path=db_path,
+		launch_id=launch_id,
+		notify_class=notify_class)
+
+	remove_previous_notification(db_path=db_path,
+		launch_id=launch_id,
+		notify_set={msg_id.split(':')[0] for msg_id in msg_ids},
+		bot=bot)
+
+	store_notification_identifiers(db_path=db_path,
+		launch_id=launch_id,
+		identifiers=','.join(msg_ids))
+	update_stats_db(stats_update={
+		'notifications': len(pending_chats),
+		'notification_retries': report['retries'],
+		'notifications_failed': report['failed']
+	},
+		db_path=db_path)
+
+
+def resume_notifications(db_path: str, bot_username: str,
+	bot: 'telegram.bot.Bot'):
+	batches = load_unfinished_batches(db_path)
+	if len(batches) == 0:
+		return
+
+	status = outbox_status(db_path)
+	logging.info(
+		f'📨 незавершённых рассылок: {status["batches"]}, сообщений: {status["pending"]}, старейшей {status["oldest_age"]} с'
+	)
+
+	conn = connect_db(db_path)
+	conn.row_factory = sqlite3.Row
+	cursor = conn.cursor()
+
+	for launch_id, notify_class in batches:
+		cursor.execute('SELECT * FROM launches WHERE unique_id = ?',
+			(launch_id, ))
+		query_return = [dict(row) for row in cursor.fetchall()]
+
+		# past its send window the wording is stale: the next class is due, or
+		# the launch has already gone
+		if len(query_return) == 0 or time.time() > query_return[0][
+			'net_unix'] - NOTIFY_LEAD_TIMES[notify_class] + NOTIFY_GRACE:
+			logging.info(f'📨 рассылка {launch_id} ({notify_class}) устарела')
+			expire_pending(db_path=db_path,
+				launch_id=launch_id,
+				notify_class=notify_class)
+			continue
+
+		launch_dict = query_return[0]
+		launch_dict.update(load_launch_vehicle(db_path=db_path,
+			unique_id=launch_id))
+
+		send_notification_batch(db_path=db_path,
+			launch_dict=launch_dict,
+			notify_class=notify_class,
+			bot_username=bot_username,
+			bot=bot)
+
 	conn.close()
 
 
+@queued_write()
 def clear_missed_notifications(db_path: str, launch_id_dict_list: list):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 	miss_count = 0
 	for launch_id_dict in launch_id_dict_list:
@@ -1128,7 +1200,7 @@ def clear_missed_notifications(db_path: str, launch_id_dict_list: list):
 def notification_send_scheduler(db_path: str, next_api_update_time: int,
 	scheduler: BackgroundScheduler, bot_username: str,
 	bot: 'telegram.bot.Bot'):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	select_fields = 'net_unix, unique_id, status_state'
@@ -1150,10 +1222,8 @@ def notification_send_scheduler(db_path: str, next_api_update_time: int,
 	query_return.sort(key=lambda tup: tup[0])
 
 	notif_send_times, time_map = {}, {
-		0: 24 * 3600 + 5 * 60,
-		1: 12 * 3600 + 5 * 60,
-		2: 3600 + 5 * 60,
-		3: 5 * 60 + 7 * 60
+		enum: NOTIFY_LEAD_TIMES[notify_class]
+		for enum, notify_class in enumerate(NOTIFY_CLASSES)
 	}
 	for launch_row in query_return:
 		launch_status = launch_row[2]
@@ -1192,7 +1262,7 @@ def notification_send_scheduler(db_path: str, next_api_update_time: int,
 	for send_time, notification_dict in notif_send_times.items():
 		if send_time > next_api_update_time:
 			pass
-		elif send_time < time.time() - 60 * 5:
+		elif send_time < time.time() - NOTIFY_GRACE:
 			missed_notifications.append(notification_dict)
 		else:
 			if send_time < time.time():
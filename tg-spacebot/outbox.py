@@ -0,0 +1,180 @@
+import time
+import sqlite3
+
+from dbconn import connect_db
+from dbwriter import DB_WRITER, queued_write
+
+# a batch that keeps getting interrupted gives up on its remaining chats
+# after this many runs, so one bad chat can't wedge every restart
+OUTBOX_MAX_RUNS = 3
+
+# finished rows are kept around for a week for /debug and then pruned
+OUTBOX_RETENTION = 7 * 24 * 3600
+
+
+def create_notification_outbox_db(cursor: sqlite3.Cursor):
+	cursor.execute('''CREATE TABLE IF NOT EXISTS notification_outbox
+		(launch_id TEXT, notify_class TEXT, chat TEXT, state TEXT,
+		runs INT, created INT, updated INT, msg_id TEXT,
+		PRIMARY KEY (launch_id, notify_class, chat)) WITHOUT ROWID''')
+
+	cursor.execute(
+		'CREATE INDEX IF NOT EXISTS outboxstate ON notification_outbox (state, created)'
+	)
+
+
+@queued_write()
+def enqueue_notification(db_path: str, launch_id: str, notify_class: str,
+	chats: list):
+	# the launch's notify flag and its audience commit together: from here on
+	# a crash resumes the batch instead of dropping whoever wasn't sent to yet
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+	now = int(time.time())
+
+	cursor.execute(f'UPDATE launches SET {notify_class} = 1 WHERE unique_id = ?',
+		(launch_id, ))
+
+	# a batch that already exists keeps its rows, so a re-run sends nothing twice
+	cursor.executemany(
+		'''INSERT OR IGNORE INTO notification_outbox
+		(launch_id, notify_class, chat, state, runs, created, updated)
+		VALUES (?, ?, ?, 'pending', 0, ?, ?)''',
+		((launch_id, notify_class, chat, now, now) for chat in chats))
+
+	cursor.execute(
+		'DELETE FROM notification_outbox WHERE state != ? AND updated < ?',
+		('pending', now - OUTBOX_RETENTION))
+
+	conn.commit()
+	conn.close()
+
+
+def clear_outbox_batches(cursor: sqlite3.Cursor, batches: list):
+	# a launch that slipped is notified again from scratch: the rows of the
+	# earlier batch would otherwise make the new one look already delivered
+	try:
+		cursor.executemany(
+			'DELETE FROM notification_outbox WHERE launch_id = ? AND notify_class = ?',
+			batches)
+	except sqlite3.OperationalError:
+		pass
+
+
+@queued_write()
+def claim_pending(db_path: str, launch_id: str, notify_class: str) -> list:
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+	now = int(time.time())
+
+	cursor.execute(
+		'''UPDATE notification_outbox SET state = 'failed', updated = ?
+		WHERE launch_id = ? AND notify_class = ? AND state = 'pending' AND runs >= ?''',
+		(now, launch_id, notify_class, OUTBOX_MAX_RUNS))
+
+	cursor.execute(
+		'''UPDATE notification_outbox SET runs = runs + 1, updated = ?
+		WHERE launch_id = ? AND notify_class = ? AND state = 'pending' ''',
+		(now, launch_id, notify_class))
+
+	cursor.execute(
+		'''SELECT chat FROM notification_outbox
+		WHERE launch_id = ? AND notify_class = ? AND state = 'pending' ''',
+		(launch_id, notify_class))
+	chats = [row[0] for row in cursor.fetchall()]
+
+	conn.commit()
+	conn.close()
+
+	return chats
+
+
+def write_deliveries(db_path: str, launch_id: str, notify_class: str,
+	deliveries: list):
+	conn = connect_db(db_path)
+	now = int(time.time())
+
+	conn.executemany(
+		'''UPDATE notification_outbox SET state = ?, msg_id = ?, updated = ?
+		WHERE launch_id = ? AND notify_class = ? AND chat = ?''',
+		[(state, msg_id, now, launch_id, notify_class, chat)
+		for chat, state, msg_id in deliveries])
+
+	conn.commit()
+	conn.close()
+
+
+def record_delivery(db_path: str, launch_id: str, notify_class: str,
+	chat: str, state: str, msg_id: str = None):
+	# called from the fan-out workers: queued without waiting, so the writer
+	# folds a whole burst of sends into a few commits
+	return DB_WRITER.submit(db_path, write_deliveries,
+		(db_path, launch_id, notify_class, [(chat, state, msg_id)]))
+
+
+@queued_write()
+def expire_pending(db_path: str, launch_id: str, notify_class: str):
+	conn = connect_db(db_path)
+	conn.execute(
+		'''UPDATE notification_outbox SET state = 'expired', updated = ?
+		WHERE launch_id = ? AND notify_class = ? AND state = 'pending' ''',
+		(int(time.time()), launch_id, notify_class))
+	conn.commit()
+	conn.close()
+
+
+def load_delivered_ids(db_path: str, launch_id: str, notify_class: str) -> list:
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	cursor.execute(
+		'''SELECT msg_id FROM notification_outbox
+		WHERE launch_id = ? AND notify_class = ? AND state = 'sent' AND msg_id IS NOT NULL''',
+		(launch_id, notify_class))
+	msg_ids = [row[0] for row in cursor.fetchall()]
+
+	conn.close()
+	return msg_ids
+
+
+def load_unfinished_batches(db_path: str) -> list:
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	try:
+		cursor.execute('''SELECT launch_id, notify_class, MIN(created)
+			FROM notification_outbox WHERE state = 'pending'
+			GROUP BY launch_id, notify_class ORDER BY MIN(created)''')
+		batches = [(row[0], row[1]) for row in cursor.fetchall()]
+	except sqlite3.OperationalError:
+		batches = []
+
+	conn.close()
+	return batches
+
+
+def outbox_status(db_path: str) -> dict:
+	conn = connect_db(db_path)
+	cursor = conn.cursor()
+
+	status = {'pending': 0, 'batches': 0, 'oldest_age': 0, 'failed': 0}
+
+	try:
+		cursor.execute('''SELECT COUNT(*), COUNT(DISTINCT launch_id || notify_class),
+			MIN(created) FROM notification_outbox WHERE state = 'pending' ''')
+		pending, batches, oldest = cursor.fetchall()[0]
+
+		cursor.execute(
+			"SELECT COUNT(*) FROM notification_outbox WHERE state = 'failed'")
+		failed = cursor.fetchall()[0][0]
+	except sqlite3.OperationalError:
+		conn.close()
+		return status
+
+	conn.close()
+
+	status['pending'], status['batches'], status['failed'] = pending, batches, failed
+	if oldest is not None:
+		status['oldest_age'] = int(time.time()) - oldest
+
+	return status
@@ -0,0 +1,114 @@
+import time
+import random
+import threading
+
+from collections import deque
+
+
+class RetryEngine:
+	def __init__(self, base_delay: float = 5, max_delay: float = 15 * 60,
+		breaker_threshold: int = 5, breaker_cooldown: float = 10 * 60,
+		error_budget: int = 10, budget_window: float = 3600):
+		self.base_delay = base_delay
+		self.max_delay = max_delay
+		self.breaker_threshold = breaker_threshold
+		self.breaker_cooldown = breaker_cooldown
+		self.error_budget = error_budget
+		self.budget_window = budget_window
+
+		self.lock = threading.Lock()
+		self.state = 'closed'
+		self.opened_until = None
+		self.consecutive_failures = 0
+		self.failure_times = deque()
+		self.total_failures = 0
+		self.total_retries = 0
+		self.last_error = None
+		self.last_failure = None
+		self.last_success = None
+		self.next_retry = None
+
+	def configure(self, api_config: dict):
+		with self.lock:
+			self.base_delay = api_config['retry_base_delay']
+			self.max_delay = api_config['retry_max_delay']
+			self.breaker_threshold = api_config['breaker_threshold']
+			self.breaker_cooldown = api_config['breaker_cooldown']
+			self.error_budget = api_config['error_budget']
+
+	def prune_failures(self, now: float):
+		while len(self.failure_times) > 0 and now - self.failure_times[
+			0] > self.budget_window:
+			self.failure_times.popleft()
+
+	def allow_request(self) -> tuple:
+		with self.lock:
+			now = time.time()
+			if self.state == 'open':
+				if now < self.opened_until:
+					return False, self.opened_until - now
+
+				self.state = 'half-open'
+
+			return True, 0
+
+	def record_success(self):
+		with self.lock:
+			self.state = 'closed'
+			self.opened_until = None
+			self.consecutive_failures = 0
+			self.last_success = time.time()
+			self.next_retry = None
+
+	def record_failure(self, error: Exception) -> float:
+		with self.lock:
+			now = time.time()
+			self.prune_failures(now)
+
+			self.consecutive_failures += 1
+			self.total_failures += 1
+			self.failure_times.append(now)
+			self.last_error = f'{type(error).__name__}: {error}'
+			self.last_failure = now
+
+			budget_spent = len(self.failure_times) >= self.error_budget
+			if self.state == 'half-open' or budget_spent or (
+				self.consecutive_failures >= self.breaker_threshold):
+				cooldown = self.breaker_cooldown
+				if budget_spent:
+					cooldown = max(
+						cooldown,
+						self.failure_times[0] + self.budget_window - now)
+
+				self.state = 'open'
+				self.opened_until = now + cooldown
+				delay = cooldown
+			else:
+				backoff = min(self.max_delay,
+					self.base_delay * 2**(self.consecutive_failures - 1))
+				delay = backoff / 2 + random.uniform(0, backoff / 2)
+
+			self.total_retries += 1
+			self.next_retry = now + delay
+			return delay
+
+	def status(self) -> dict:
+		with self.lock:
+			self.prune_failures(time.time())
+
+			return {
+				'state': self.state,
+				'opened_until': self.opened_until,
+				'consecutive_failures': self.consecutive_failures,
+				'failures_in_window': len(self.failure_times),
+				'error_budget': self.error_budget,
+				'total_failures': self.total_failures,
+				'total_retries': self.total_retries,
+				'last_error': self.last_error,
+				'last_failure': self.last_failure,
+				'last_success': self.last_success,
+				'next_retry': self.next_retry
+			}
+
+
+LL2_RETRY = RetryEngine()
@@ -13,25 +13,29 @@ import argparse
 from timeit import default_timer as timer
 from http.client import HTTPConnection
 
-import git
-import psutil
+# first, so -profile-startup can time everything imported below
+from startup import STARTUP_PROFILE, lazy_import, warm_imports
+
 import cursor
-import pytz
-import coloredlogs
 import telegram
 import redis
-from uptime import uptime
-from timezonefinder import TimezoneFinder
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.events import EVENT_JOB_ERROR
 from telegram import ReplyKeyboardRemove, ForceReply
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
-from telegram.ext import CallbackQueryHandler
+from telegram.ext import CallbackQueryHandler, TypeHandler
 
 from api import api_call_scheduler
-from config import load_config, store_config, repair_config
-from db import (update_stats_db, create_chats_db)
+from retry import LL2_RETRY
+from budget import load_api_budget
+from config import (load_config, store_config, repair_config,
+	load_api_config)
+from db import (update_stats_db, create_chats_db, load_launch_vehicle,
+	migrate_chat, STATS)
+from dbconn import DB_CONNECTIONS, connect_db
+from dbwriter import DB_WRITER
+from migrations import apply_migrations
 from tools import (anonymize_id, time_delta_to_legible_eta,
 	map_country_code_to_flag, timestamp_to_legible_date_string,
 	short_monospaced_text, reconstruct_message_for_markdown,
@@ -40,7 +44,14 @@ from timezone import (load_locale_string, remove_time_zone_information,
 	update_time_zone_string, update_time_zone_value, load_time_zone_status)
 from notifications import (get_user_notifications_status, toggle_notification,
 	update_notif_preference, get_notif_preference, toggle_launch_mute,
-	clean_chats_db)
+	clean_chats_db, resume_notifications)
+from outbox import outbox_status
+
+git = lazy_import('git')
+pytz = lazy_import('pytz')
+psutil = lazy_import('psutil')
+timezonefinder = lazy_import('timezonefinder')
+
 global VERSION, OWNER
 global BOT_ID, BOT_USERNAME
 global DATA_DIR, STARTUP_TIME
@@ -55,7 +66,7 @@ except redis.exceptions.ConnectionError:
 
 
 def api_update_on_restart():
-	conn = sqlite3.connect(os.path.join(DATA_DIR, 'launchbot-data.db'))
+	conn = connect_db(DATA_DIR)
 	cursor_ = conn.cursor()
 
 	try:
@@ -70,7 +81,8 @@ def admin_handler(update, context):
 
 	def invalid_command():
 		args_list = ("`export-logs`", "`export-db`", "`force-api-update`",
-			"`git-pull`", "`restart`", "`feedbackreply`")
+			"`api-status`", "`db-status`", "`git-pull`", "`restart`",
+			"`feedbackreply`")
 
 		context.bot.send_message(chat_id=chat.id,
 			parse_mode="Markdown",
@@ -107,6 +119,8 @@ def admin_handler(update, context):
 		context.bot.send_message(chat_id=chat.id,
 			text='Экспорт дб')
 
+		DB_WRITER.flush(DATA_DIR)
+		DB_CONNECTIONS.checkpoint(DATA_DIR)
 		with open(os.path.join(DATA_DIR, 'launchbot-data.db'),
 			'rb') as db_file:
 			context.bot.send_document(chat_id=chat.id,
@@ -143,6 +157,48 @@ def admin_handler(update, context):
 		context.bot.send_message(chat_id=chat.id,
 			text='DB обновлено')
 
+	elif update.message.text == '/debug api-status':
+		retry_status = LL2_RETRY.status()
+
+		status_msg = f'LL2 API: *{retry_status["state"]}*\n'
+		status_msg += f'Ошибок подряд: {retry_status["consecutive_failures"]}\n'
+		status_msg += f'Ошибок за час: {retry_status["failures_in_window"]}/{retry_status["error_budget"]}\n'
+		status_msg += f'Всего ошибок: {retry_status["total_failures"]}, повторов: {retry_status["total_retries"]}\n'
+
+		for key, title in (('last_success', 'Последний успех'),
+			('last_failure', 'Последняя ошибка'),
+			('opened_until', 'Открыт до'), ('next_retry', 'Следующий повтор')):
+			if retry_status[key] is not None:
+				status_msg += f'{title}: {datetime.datetime.fromtimestamp(retry_status[key]).ctime()}\n'
+
+		budget = load_api_budget(db_path=DATA_DIR,
+			api_config=load_api_config(DATA_DIR))
+		status_msg += f'Бюджет запросов: {budget.available():.1f}/{budget.capacity}\n'
+
+		if retry_status['last_error'] is not None:
+			status_msg += f'\n`{retry_status["last_error"]}`'
+
+		context.bot.send_message(chat_id=chat.id,
+			text=status_msg,
+			parse_mode='Markdown')
+
+	elif update.message.text == '/debug db-status':
+		db_stats = DB_CONNECTIONS.stats()
+
+		status_msg = f'Соединений открыто: {db_stats["opened"]}, переиспользовано: {db_stats["reused"]}\n'
+		status_msg += f'Коммитов: {db_stats["commits"]}, {db_stats["commit_ms"]:.0f} мс\n'
+		status_msg += f'Ожиданий блокировки: {db_stats["lock_waits"]}, {db_stats["lock_wait_ms"]:.0f} мс\n'
+
+		writer_stats = DB_WRITER.stats()
+		status_msg += f'Запись: {writer_stats["jobs"]} операций в {writer_stats["batches"]} пакетах (макс. {writer_stats["largest_batch"]}), ошибок: {writer_stats["failed"]}\n'
+		status_msg += f'Очередь: {writer_stats["queued"]}, переполнений: {writer_stats["queue_full"]}, ожидание {writer_stats["queue_wait_ms"] / max(1, writer_stats["jobs"]):.1f} мс/операция\n'
+		status_msg += f'Счётчиков статистики ждут записи: {STATS.stats()["pending"]}\n'
+
+		outbox = outbox_status(DATA_DIR)
+		status_msg += f'Рассылка: {outbox["pending"]} сообщений в {outbox["batches"]} рассылках, старейшему {outbox["oldest_age"]} с, не доставлено: {outbox["failed"]}'
+
+		context.bot.send_message(chat_id=chat.id, text=status_msg)
+
 	elif "/debug feedbackreply" in update.message.text:
 		command = update.message.text.split(" ")
 		if len(command) < 4:
@@ -192,34 +248,19 @@ def generic_update_handler(update, context):
 	chat = update.message.chat
 	if update.message.left_chat_member not in (None, False):
 		if update.message.left_chat_member.id == BOT_ID:
-			conn = sqlite3.connect(os.path.join(DATA_DIR, 'launchbot-data.db'))
-			cursor_ = conn.cursor()
-
 			try:
-				cursor_.execute("DELETE FROM chats WHERE chat = ?",
-					(chat.id, ))
+				clean_chats_db(DATA_DIR, chat.id)
 			except Exception as error:
 				logging.exception(
 					f'Ошибка удаления чата из бд {error}')
 
-			conn.commit()
-			conn.close()
-
 	elif update.message.group_chat_created not in (None, False):
 		start(update, context)
 
 	elif update.message.migrate_from_chat_id not in (None, False):
-		conn = sqlite3.connect(os.path.join(DATA_DIR, 'launchbot-data.db'))
-		cursor_ = conn.cursor()
-
-		try:
-			cursor_.execute('UPDATE chats SET chat = ? WHERE chat = ?',
-				(chat.id, update.message.migrate_from_chat_id))
-		except Exception:
-			pass
-
-		conn.commit()
-		conn.close()
+		migrate_chat(db_path=DATA_DIR,
+			old_id=update.message.migrate_from_chat_id,
+			new_id=chat.id)
 
 	elif update.message.new_chat_members not in (None, False):
 		if BOT_ID in [user.id for user in update.message.new_chat_members]:
@@ -253,13 +294,7 @@ def command_pre_handler(update, context, skip_timer_handle):
 		return False
 
 	except telegram.error.ChatMigrated as error:
-		conn = sqlite3.connect(os.path.join(DATA_DIR, 'launchbot-data.db'))
-		cursor_ = conn.cursor()
-
-		cursor_.execute("UPDATE chats SET chat = ? WHERE chat = ?",
-			(error.new_chat_id, chat.id))
-		conn.commit()
-		conn.close()
+		migrate_chat(db_path=DATA_DIR, old_id=chat.id, new_id=error.new_chat_id)
 
 		return True
 
@@ -267,7 +302,7 @@ def command_pre_handler(update, context, skip_timer_handle):
 		clean_chats_db(DATA_DIR, chat.id)
 		return False
 
-		conn = sqlite3.connect(os.path.join(DATA_DIR, 'launchbot-data.db'))
+		conn = connect_db(DATA_DIR)
 		cursor_ = conn.cursor()
 
 		cursor_.execute(
@@ -1206,7 +1241,7 @@ def location_handler(update, context):
 			latitude = update.message.location.latitude
 			longitude = update.message.location.longitude
 
-			timezone_str = TimezoneFinder().timezone_at(lng=longitude,
+			timezone_str = timezonefinder.TimezoneFinder().timezone_at(lng=longitude,
 				lat=latitude)
 			timezone = pytz.timezone(timezone_str)
 
@@ -1352,7 +1387,7 @@ def start(update, context):
 
 
 def name_from_provider_id(lsp_id):
-	conn = sqlite3.connect(os.path.join(DATA_DIR, 'launchbot-data.db'))
+	conn = connect_db(DATA_DIR)
 	cursor_ = conn.cursor()
 
 	cursor_.execute("SELECT lsp_name FROM launches WHERE lsp_id = ?",
@@ -1445,7 +1480,7 @@ def generate_changelog():
 
 def generate_schedule_message(call_type: str, chat: str):
 
-	conn = sqlite3.connect(os.path.join(DATA_DIR, 'launchbot-data.db'))
+	conn = connect_db(DATA_DIR)
 	conn.row_factory = sqlite3.Row
 	cursor_ = conn.cursor()
 
@@ -1764,7 +1799,7 @@ def generate_next_flight_message(chat, current_index: int):
 	if rd.exists(f'next-{chat}-{current_index}'):
 		return cached_response()
 
-	conn = sqlite3.connect(os.path.join(DATA_DIR, 'launchbot-data.db'))
+	conn = connect_db(DATA_DIR)
 	conn.row_factory = sqlite3.Row
 	cursor_ = conn.cursor()
 
@@ -1873,6 +1908,9 @@ def generate_next_flight_message(chat, current_index: int):
 			launch = dict(query_return[current_index])
 		except Exception as error:
 			launch = dict(query_return[0])
+
+		launch.update(load_launch_vehicle(db_path=DATA_DIR,
+			unique_id=launch['unique_id']))
 	else:
 		msg_text = 'Полетов не найдено. Попробуйте изменить настройки поиска'
 		inline_keyboard = []
@@ -1992,11 +2030,11 @@ def generate_next_flight_message(chat, current_index: int):
 	except:
 		orbit_str = 'Неизвестная орбита'
 
-	if launch['spacecraft_crew_count'] not in (None, 0):
+	if len(launch['crew']) > 0:
 		if 'Dragon' in launch['spacecraft_name']:
 			spacecraft_info = f'''
 			Информация о Dragon
-			Команда {short_monospaced_text("👨‍🚀" * launch["spacecraft_crew_count"])}
+			Команда {short_monospaced_text("👨‍🚀" * len(launch["crew"]))}
 			Капсула {short_monospaced_text(launch["spacecraft_sn"])}
 			'''
 		else:
@@ -2004,10 +2042,8 @@ def generate_next_flight_message(chat, current_index: int):
 	else:
 		spacecraft_info = None
 
-	if isinstance(launch['launcher_landing_attempt'], str):
-		multiple_boosters = bool(';;' in launch['launcher_landing_attempt'])
-	else:
-		multiple_boosters = False
+	stages = launch['stages']
+	multiple_boosters = bool(len(stages) > 1)
 
 	landing_loc_map = {
 		'OCISLY': 'Атлантический океан',
@@ -2020,12 +2056,13 @@ def generate_next_flight_message(chat, current_index: int):
 		'PAC': 'Столкновение'
 	}
 
-	if launch['launcher_landing_attempt'] and not multiple_boosters:
-		core_str = launch['launcher_serial_number']
+	if len(stages) == 1 and stages[0]['landing_attempt']:
+		stage = stages[0]
+		core_str = stage['serial_number']
 		core_str = 'Unknown' if core_str is None else core_str
 
-		if launch['launcher_is_flight_proven']:
-			reuse_count = launch['launcher_stage_flight_number']
+		if stage['is_flight_proven']:
+			reuse_count = stage['flight_number']
 
 			if lsp_name == 'SpaceX' and core_str[0:2] == 'B1':
 				core_str += f'.{int(reuse_count)}'
@@ -2037,12 +2074,12 @@ def generate_next_flight_message(chat, current_index: int):
 
 			reuse_str = f'первый полёт {core_str}'
 
-		if launch['launcher_landing_location'] in landing_loc_map.keys():
-			landing_type = landing_loc_map[launch['launcher_landing_location']]
-			landing_str = f"{launch['launcher_landing_location']} ({landing_type})"
+		if stage['landing_location'] in landing_loc_map.keys():
+			landing_type = landing_loc_map[stage['landing_location']]
+			landing_str = f"{stage['landing_location']} ({landing_type})"
 		else:
-			landing_type = launch['landing_type']
-			landing_str = f"{launch['launcher_landing_location']} ({landing_type})"
+			landing_type = stage['landing_type']
+			landing_str = f"{stage['landing_location']} ({landing_type})"
 
 		if lsp_name == 'SpaceX' and 'Starship' in launch["rocket_name"]:
 			location = f'SpaceX Южный Техас, Boca Chica {location_flag}'
@@ -2059,26 +2096,25 @@ def generate_next_flight_message(chat, current_index: int):
 			'''
 
 	elif multiple_boosters:
-		booster_indices = {'core': None, 'boosters': []}
-		for enum, stage_type in enumerate(
-			launch['launcher_stage_type'].split(';;')):
-			if stage_type.lower() == 'core':
-				booster_indices['core'] = enum
-			elif stage_type.lower() == 'strap-on booster':
-				booster_indices['boosters'].append(enum)
+		core_stages = [
+			stage for stage in stages
+			if str(stage['stage_type']).lower() == 'core'
+		]
+		booster_stages = [
+			stage for stage in stages
+			if str(stage['stage_type']).lower() == 'strap-on booster'
+		]
 
 		recovery_str = '''\nИнформация о ракете'''
 
-		indices = [booster_indices['core']] + booster_indices['boosters']
-		for enum, idx in enumerate(indices):
-			is_core = bool(enum == 0)
+		for enum, stage in enumerate(core_stages[0:1] + booster_stages):
+			is_core = bool(enum == 0 and len(core_stages) > 0)
 
-			core_str = launch['launcher_serial_number'].split(';;')[idx]
+			core_str = stage['serial_number']
 			core_str = 'Unknown' if core_str is None else core_str
 
-			if launch['launcher_is_flight_proven'].split(';;')[idx]:
-				reuse_count = launch['launcher_stage_flight_number'].split(
-					';;')[idx]
+			if stage['is_flight_proven']:
+				reuse_count = stage['flight_number']
 
 				if lsp_name == 'SpaceX' and core_str[0:2] == 'B1':
 					core_str += f'.{int(reuse_count)}'
@@ -2090,7 +2126,7 @@ def generate_next_flight_message(chat, current_index: int):
 
 				reuse_str = f'первый полет {core_str}'
 
-			landing_loc = launch['launcher_landing_location'].split(';;')[idx]
+			landing_loc = stage['landing_location']
 			if landing_loc in landing_loc_map.keys():
 				landing_type = landing_loc_map[landing_loc]
 				if landing_loc in ('ATL', 'PAC'):
@@ -2098,7 +2134,7 @@ def generate_next_flight_message(chat, current_index: int):
 
 				landing_str = f"{landing_loc} ({landing_type})"
 			else:
-				landing_type = launch['landing_type'].split(';;')[idx]
+				landing_type = stage['landing_type']
 				landing_str = f"{landing_loc} ({landing_type})"
 
 			if is_core:
@@ -2316,6 +2352,7 @@ if __name__ == '__main__':
 		os.rename(OLD_DATA_DIR, DATA_DIR)
 
 	STARTUP_TIME = time.time()
+	STARTUP_PROFILE.phase('imports')
 
 	parser = argparse.ArgumentParser('spaceresearchbot.py')
 
@@ -2339,6 +2376,10 @@ if __name__ == '__main__':
 		dest='api_updates_disabled',
 		help='Disables API update scheduler',
 		action='store_true')
+	parser.add_argument('-profile-startup',
+		dest='profile_startup',
+		help='Print import and startup phase timings after the first handled update',
+		action='store_true')
 
 	parser.set_defaults(start=False, newBotToken=False, debug=False)
 	args = parser.parse_args()
@@ -2352,6 +2393,10 @@ if __name__ == '__main__':
 		)
 
 	config = load_config(data_dir=DATA_DIR)
+	STARTUP_PROFILE.phase('config')
+
+	apply_migrations(db_path=DATA_DIR)
+	STARTUP_PROFILE.phase('migrations')
 
 	try:
 		local_api_conf = config['local_api_server']
@@ -2393,6 +2438,8 @@ if __name__ == '__main__':
 		)
 
 
+	STARTUP_PROFILE.phase('telegram login')
+
 	BOT_USERNAME = bot_specs.username
 	BOT_ID = bot_specs.id
 	OWNER = config['owner']
@@ -2501,7 +2548,18 @@ if __name__ == '__main__':
 			callback=admin_handler,
 			filters=Filters.chat(OWNER)))
 
+	if args.profile_startup:
+		dispatcher.add_handler(TypeHandler(telegram.Update,
+			STARTUP_PROFILE.first_update),
+			group=1000)
+
+	STARTUP_PROFILE.phase('handlers')
+
 	updater.start_polling()
+	STARTUP_PROFILE.phase('start polling')
+
+	# location replies and ingestion need these; load them off the hot path
+	warm_imports(('pytz', 'timezonefinder', 'nltk.tokenize'))
 
 	if args.force_api_update:
 		api_update_on_restart()
@@ -2513,6 +2571,15 @@ if __name__ == '__main__':
 			bot_username=BOT_USERNAME,
 			bot=updater.bot)
 
+	STARTUP_PROFILE.phase('api scheduler')
+
+	# finish notification batches a crash or restart cut short
+	scheduler.add_job(resume_notifications,
+		'date',
+		id='outbox-resume',
+		run_date=datetime.datetime.now(),
+		args=[DATA_DIR, BOT_USERNAME, updater.bot])
+
 	if OWNER != 0:
 		try:
 			updater.bot.send_message(OWNER,
@@ -2548,6 +2615,8 @@ if __name__ == '__main__':
 			pass
 
 		scheduler.shutdown()
+		STATS.flush()
+		DB_WRITER.stop()
 
 	except Exception as error:
 		updater.bot.send_message(OWNER,
@@ -0,0 +1,147 @@
+import sys
+import time
+import builtins
+import logging
+import importlib
+import threading
+
+PROCESS_START = time.perf_counter()
+PROFILE_STARTUP = '-profile-startup' in sys.argv
+
+IMPORT_TIMES = {}
+IMPORT_LOCK = threading.Lock()
+IMPORT_DEPTH = threading.local()
+
+
+def load_module(name: str, source: str = 'lazy'):
+	module = sys.modules.get(name)
+	if module is not None:
+		return module
+
+	depth = getattr(IMPORT_DEPTH, 'depth', 0)
+	IMPORT_DEPTH.depth = depth + 1
+
+	t0 = time.perf_counter()
+	try:
+		module = importlib.import_module(name)
+	finally:
+		IMPORT_DEPTH.depth = depth
+
+	with IMPORT_LOCK:
+		IMPORT_TIMES.setdefault(name, (time.perf_counter() - t0, source))
+
+	return module
+
+
+class LazyModule:
+	def __init__(self, name: str):
+		self._name = name
+		self._module = None
+
+	def _load(self):
+		if self._module is None:
+			self._module = load_module(self._name)
+
+		return self._module
+
+	def __getattr__(self, attr: str):
+		return getattr(self._load(), attr)
+
+	def __repr__(self) -> str:
+		state = 'loaded' if self._module is not None else 'not loaded'
+		return f'<lazy module {self._name!r} ({state})>'
+
+
+def lazy_import(name: str) -> LazyModule:
+	return LazyModule(name)
+
+
+def warm_imports(names: tuple) -> threading.Thread:
+	def warm():
+		for name in names:
+			try:
+				load_module(name, source='warm-up')
+			except Exception:
+				logging.exception(f'warm-up import {name} failed')
+
+	warm_thread = threading.Thread(target=warm, name='import-warmup', daemon=True)
+	warm_thread.start()
+
+	return warm_thread
+
+
+class StartupProfile:
+	def __init__(self, enabled: bool):
+		self.enabled = enabled
+		self.phases = []
+		self.last_mark = PROCESS_START
+		self.reported = False
+
+		if enabled:
+			self.install_import_timer()
+
+	def install_import_timer(self):
+		builtin_import = builtins.__import__
+
+		# only imports issued by our own modules are timed; nested ones are
+		# included in their parent's time
+		def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+			depth = getattr(IMPORT_DEPTH, 'depth', 0)
+			if level != 0 or depth > 0 or name in sys.modules:
+				IMPORT_DEPTH.depth = depth + 1
+				try:
+					return builtin_import(name, globals, locals, fromlist, level)
+				finally:
+					IMPORT_DEPTH.depth = depth
+
+			IMPORT_DEPTH.depth = 1
+			t0 = time.perf_counter()
+			try:
+				return builtin_import(name, globals, locals, fromlist, level)
+			finally:
+				IMPORT_DEPTH.depth = 0
+				with IMPORT_LOCK:
+					IMPORT_TIMES.setdefault(name, (time.perf_counter() - t0, 'import'))
+
+		builtins.__import__ = timed_import
+
+	def phase(self, name: str):
+		if not self.enabled:
+			return
+
+		now = time.perf_counter()
+		self.phases.append((name, now - self.last_mark))
+		self.last_mark = now
+
+	def report(self, top: int = 20) -> str:
+		with IMPORT_LOCK:
+			import_times = sorted(IMPORT_TIMES.items(),
+				key=lambda item: item[1][0],
+				reverse=True)
+
+		report = [f'⏱ startup profile ({len(import_times)} imports timed)']
+		for name, (seconds, source) in import_times[:top]:
+			report.append(f'  {seconds * 1000:9.1f} ms  {name} ({source})')
+
+		report.append('  phases:')
+		for name, seconds in self.phases:
+			report.append(f'  {seconds * 1000:9.1f} ms  {name}')
+
+		report.append(
+			f'  {(self.last_mark - PROCESS_START) * 1000:9.1f} ms  total to {self.phases[-1][0] if self.phases else "now"}'
+		)
+
+		return '\n'.join(report)
+
+	def first_update(self, update, context):
+		if not self.enabled or self.reported:
+			return
+
+		self.reported = True
+		self.phase('first update handled')
+
+		print(self.report(), flush=True)
+		logging.info(self.report())
+
+
+STARTUP_PROFILE = StartupProfile(enabled=PROFILE_STARTUP)
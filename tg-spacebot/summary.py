@@ -0,0 +1,113 @@
+import logging
+import hashlib
+import threading
+
+from db import load_description_summaries, store_description_summaries
+from startup import lazy_import
+
+tokenize = lazy_import('nltk.tokenize')
+
+
+def summarize_description(description: str, max_length: int = 350) -> str:
+	try:
+		sentences = tokenize.sent_tokenize(description)
+	except LookupError:
+		logging.warning('нет nltk. загружем')
+
+		import nltk
+		nltk.download("punkt")
+
+		sentences = tokenize.sent_tokenize(description)
+
+	parsed_description = ''
+	max_idx = len(sentences) - 1
+
+	for enum, sentence in enumerate(sentences):
+		if len(parsed_description) + len(sentence) > max_length:
+			if enum == 0:
+				parsed_description = sentence
+
+			break
+
+		parsed_description += sentence
+
+		if enum != max_idx:
+			if not len(parsed_description) + len(
+				sentences[enum + 1]) > max_length:
+				parsed_description += ' '
+
+	return parsed_description
+
+
+class DescriptionSummaryCache:
+	# endpoint threads and focus polls share the cache, and a flush can land
+	# in the middle of another poll's parse
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.summaries = {}
+		self.pending = {}
+		self.hits = 0
+		self.misses = 0
+		self.db_path = None
+
+	def load(self, db_path: str):
+		with self.lock:
+			if self.db_path == db_path:
+				return
+
+			self.summaries = load_description_summaries(db_path=db_path)
+			self.db_path = db_path
+
+	def summarize(self, description: str) -> str:
+		if description in (None, ''):
+			return ''
+
+		description_hash = hashlib.sha1(description.encode()).hexdigest()
+		with self.lock:
+			if description_hash in self.summaries:
+				self.hits += 1
+				return self.summaries[description_hash]
+
+			self.misses += 1
+
+		# tokenizing is the slow part, so it runs outside the lock
+		try:
+			summary = summarize_description(description)
+		except Exception:
+			logging.exception("nltk умер")
+			return description
+
+		with self.lock:
+			self.summaries[description_hash] = summary
+			self.pending[description_hash] = summary
+
+		return summary
+
+	def drain(self) -> tuple:
+		with self.lock:
+			drained = (self.pending, self.hits, self.misses)
+			self.pending = {}
+			self.hits, self.misses = 0, 0
+
+		return drained
+
+	def merge(self, summaries: dict, hits: int, misses: int):
+		with self.lock:
+			self.summaries.update(summaries)
+			self.pending.update(summaries)
+			self.hits += hits
+			self.misses += misses
+
+	def flush(self, db_path: str) -> tuple:
+		with self.lock:
+			pending, self.pending = self.pending, {}
+			counts = (self.hits, self.misses)
+			self.hits, self.misses = 0, 0
+
+		if len(pending) > 0:
+			store_description_summaries(db_path=db_path, summaries=pending)
+
+		return counts
+
+
+SUMMARY_CACHE = DescriptionSummaryCache()
@@ -0,0 +1,214 @@
+import uuid
+import random
+
+from tools import unix_to_timestamp
+
+PROVIDERS = (
+	(121, 'SpaceX', 'SpX', 'USA'),
+	(147, 'Rocket Lab Ltd', 'RL', 'USA'),
+	(124, 'United Launch Alliance', 'ULA', 'USA'),
+	(115, 'Arianespace', 'ASA', 'FRA'),
+	(88, 'China Aerospace Science and Technology Corporation', 'CASC', 'CHN'),
+	(63, 'Russian Federal Space Agency (ROSCOSMOS)', 'RFSA', 'RUS'),
+	(31, 'Indian Space Research Organization', 'ISRO', 'IND')
+)
+
+STATUSES = (
+	(1, 'Go for Launch', 'Go'),
+	(2, 'To Be Determined', 'TBD'),
+	(8, 'To Be Confirmed', 'TBC'),
+	(5, 'On Hold', 'Hold')
+)
+
+ORBITS = (('Low Earth Orbit', 'LEO'), ('Sun-Synchronous Orbit', 'SSO'),
+	('Geostationary Transfer Orbit', 'GTO'), ('Lunar Orbit', 'LO'),
+	('Sub Orbital', 'Sub Orbital'))
+
+LANDING_LOCATIONS = ('OCISLY', 'JRTI', 'ASLOG', 'LZ-1', 'LZ-2', 'LZ-4', 'ATL')
+
+
+def synthetic_uuid(idx: int) -> str:
+	return str(uuid.UUID(int=idx + 1))
+
+
+def synthetic_stage(idx: int, stage_idx: int, net_unix: int) -> dict:
+	rng = random.Random(idx * 31 + stage_idx)
+
+	return {
+		'id': idx * 10 + stage_idx,
+		'type': 'Core' if stage_idx == 0 else 'Strap-on Booster',
+		'reused': rng.random() < 0.7,
+		'launcher_flight_number': rng.randint(1, 15),
+		'turn_around_time_days': rng.randint(25, 300),
+		'launcher': {
+			'flight_proven': rng.random() < 0.7,
+			'serial_number': f'B1{idx % 100:02d}{stage_idx}',
+			'first_launch_date': unix_to_timestamp(net_unix - 400 * 86400),
+			'last_launch_date': unix_to_timestamp(net_unix - 40 * 86400)
+		},
+		'landing': {
+			'attempt': True,
+			'location': {
+				'abbrev': rng.choice(LANDING_LOCATIONS),
+				'successful_landings': rng.randint(0, 120)
+			},
+			'type': {
+				'abbrev': 'ASDS'
+			}
+		} if rng.random() < 0.8 else None
+	}
+
+
+def synthetic_launch(idx: int, net_unix: int, last_updated: int,
+	stages: int = None, crew: int = None, sentences: int = None,
+	revision: int = 0, launched: bool = False) -> dict:
+	rng = random.Random(idx)
+
+	if stages is None:
+		stages = 3 if idx % 4 == 0 else 1
+
+	if crew is None:
+		crew = 4 if idx % 6 == 0 else 0
+
+	if sentences is None:
+		sentences = rng.randint(2, 40)
+
+	lsp = PROVIDERS[idx % len(PROVIDERS)]
+	if launched:
+		status = (3, 'Launch Successful', 'Success')
+	else:
+		status = STATUSES[(idx + revision) % len(STATUSES)]
+	orbit = ORBITS[idx % len(ORBITS)]
+
+	description = ' '.join(
+		f'Sentence {enum} describes payload {idx} and its mission profile in some detail.'
+		for enum in range(sentences))
+
+	if crew > 0:
+		spacecraft_stage = {
+			'id': idx,
+			'spacecraft': {
+				'serial_number': f'C2{idx % 100:02d}',
+				'spacecraft_config': {
+					'name': 'Crew Dragon',
+					'maiden_flight': '2019-03-02'
+				}
+			},
+			'launch_crew': [{
+				'astronaut': {
+					'name': f'Astronaut {idx}-{member}'
+				},
+				'role': 'Commander' if member == 0 else 'Mission Specialist'
+			} for member in range(crew)]
+		}
+	else:
+		spacecraft_stage = None
+
+	return {
+		'id': synthetic_uuid(idx),
+		'launch_library_id': None,
+		'name': f'Synthetic {idx % 7} Block {idx % 5} | Payload {idx}',
+		'net': unix_to_timestamp(net_unix),
+		'last_updated': unix_to_timestamp(last_updated),
+		'status': {
+			'id': status[0],
+			'name': status[1],
+			'abbrev': status[2]
+		},
+		'inhold': status[2] == 'Hold',
+		'probability': (idx * 7 + revision) % 101,
+		'tbdtime': False,
+		'tbddate': False,
+		'launch_service_provider': {
+			'id': lsp[0],
+			'name': lsp[1],
+			'abbrev': lsp[2],
+			'country_code': lsp[3]
+		},
+		'webcast_live': False,
+		'vidURLs': [{
+			'priority': priority,
+			'url': f'https://www.youtube.com/watch?v=synthetic{idx}-{priority}'
+		} for priority in range(idx % 3)],
+		'rocket': {
+			'configuration': {
+				'name': f'Synthetic {idx % 7}',
+				'full_name': f'Synthetic {idx % 7} Block {idx % 5}',
+				'variant': f'Block {idx % 5}',
+				'family': 'Synthetic'
+			},
+			'launcher_stage': [
+				synthetic_stage(idx, stage_idx, net_unix)
+				for stage_idx in range(stages)
+			],
+			'spacecraft_stage': spacecraft_stage
+		},
+		'mission': {
+			'name': f'Payload {idx}',
+			'type': 'Communications',
+			'description': description,
+			'orbit': {
+				'name': orbit[0],
+				'abbrev': orbit[1]
+			}
+		},
+		'pad': {
+			'name': f'Space Launch Complex {idx % 50}',
+			'total_launch_count': rng.randint(1, 300),
+			'location': {
+				'name': 'Cape Canaveral, FL, USA',
+				'country_code': 'USA',
+				'total_launch_count': rng.randint(300, 900)
+			}
+		},
+		'agency_launch_attempt_count': rng.randint(1, 300),
+		'agency_launch_attempt_count_year': rng.randint(1, 60),
+		'orbital_launch_attempt_count_year': rng.randint(1, 200)
+	}
+
+
+def synthetic_list_launch(launch_json: dict) -> dict:
+	return {
+		'id': launch_json['id'],
+		'name': launch_json['name'],
+		'status': launch_json['status'],
+		'last_updated': launch_json['last_updated'],
+		'net': launch_json['net'],
+		'probability': launch_json['probability'],
+		'lsp_name': launch_json['launch_service_provider']['name'],
+		'mission': launch_json['mission']['name'],
+		'mission_type': launch_json['mission']['type'],
+		'pad': launch_json['pad']['name'],
+		'location': launch_json['pad']['location']['name'],
+		'orbit': launch_json['mission']['orbit']['abbrev']
+	}
+
+
+def synthetic_results(count: int, start_unix: int, spacing: int = 6 * 3600,
+	**kwargs) -> list:
+	return [
+		synthetic_launch(idx=idx,
+		net_unix=start_unix + (idx + 1) * spacing,
+		last_updated=start_unix,
+		**kwargs) for idx in range(count)
+	]
+
+
+def synthetic_event(idx: int, date_unix: int, launch_ids: list = ()) -> dict:
+	return {
+		'id': idx + 1,
+		'name': f'Synthetic Event {idx}',
+		'type': {
+			'id': 2,
+			'name': 'Spacewalk' if idx % 2 == 0 else 'Docking'
+		},
+		'description': f'Synthetic event {idx} happens in orbit.',
+		'location': 'International Space Station',
+		'news_url': None,
+		'video_url': f'https://www.youtube.com/watch?v=event{idx}',
+		'feature_image': None,
+		'date': unix_to_timestamp(date_unix),
+		'launches': [{
+			'id': launch_id
+		} for launch_id in launch_ids]
+	}
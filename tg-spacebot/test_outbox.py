@@ -0,0 +1,121 @@
+import time
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from api import write_focus_launch
+from db import update_launch_db
+from dbwriter import DB_WRITER
+from migrations import apply_migrations
+from notifications import notification_handler
+from outbox import enqueue_notification, claim_pending, write_deliveries
+
+
+class Launch:
+	COLUMNS = ('unique_id', 'name', 'lsp_name', 'lsp_short', 'net_unix',
+		'launched')
+
+	def __init__(self, net_unix: int):
+		self.unique_id = 'launch-1'
+		self.name = 'Falcon 9 Block 5 | Starlink'
+		self.lsp_name = 'SpaceX'
+		self.lsp_short = 'SpX'
+		self.net_unix = net_unix
+		self.launched = False
+
+	def values(self) -> tuple:
+		return tuple(getattr(self, column) for column in self.COLUMNS)
+
+	def stage_rows(self) -> list:
+		return []
+
+	def crew_rows(self) -> list:
+		return []
+
+
+class NotificationOutboxTest(unittest.TestCase):
+	def setUp(self):
+		self.db_path = tempfile.mkdtemp()
+		apply_migrations(self.db_path)
+
+	def tearDown(self):
+		DB_WRITER.flush(self.db_path)
+		shutil.rmtree(self.db_path)
+
+	def update_launch(self, net_unix: int, api_update: int = None) -> set:
+		return DB_WRITER.write(self.db_path, update_launch_db,
+			kwargs={
+			'launch_set': {Launch(net_unix=net_unix)},
+			'db_path': self.db_path,
+			'bot_username': 'bot',
+			'api_update': api_update if api_update is not None else int(time.time())
+			})
+
+	def send_batch(self, chats: list) -> list:
+		enqueue_notification(db_path=self.db_path,
+			launch_id='launch-1',
+			notify_class='notify_24h',
+			chats=chats)
+
+		claimed = claim_pending(db_path=self.db_path,
+			launch_id='launch-1',
+			notify_class='notify_24h')
+
+		DB_WRITER.write(self.db_path, write_deliveries,
+			(self.db_path, 'launch-1', 'notify_24h',
+			[(chat, 'sent', f'{chat}:1') for chat in claimed]))
+
+		return sorted(claimed)
+
+	def test_rerun_sends_nothing_twice(self):
+		self.update_launch(net_unix=int(time.time()) + 20 * 3600)
+
+		self.assertEqual(self.send_batch(['1', '2']), ['1', '2'])
+		self.assertEqual(self.send_batch(['1', '2', '3']), ['3'])
+
+	def test_slipped_launch_is_notified_again(self):
+		now = int(time.time())
+		self.update_launch(net_unix=now + 20 * 3600)
+		self.assertEqual(self.send_batch(['1', '2']), ['1', '2'])
+
+		slipped = self.update_launch(net_unix=now + 30 * 3600)
+
+		self.assertEqual(len(slipped), 1)
+		self.assertEqual(self.send_batch(['1', '2']), ['1', '2'])
+
+	def test_focus_poll_keeps_launch_fresh(self):
+		now = int(time.time())
+		net_unix = now + 20 * 3600
+		self.update_launch(net_unix=net_unix, api_update=now - 60)
+
+		conn = sqlite3.connect(f'{self.db_path}/launchbot-data.db')
+		conn.execute('UPDATE stats SET last_api_update = ?', (now - 60, ))
+		conn.commit()
+		conn.close()
+
+		DB_WRITER.write(self.db_path, write_focus_launch,
+			kwargs={
+			'db_path': self.db_path,
+			'launch_object': Launch(net_unix=net_unix),
+			'bot_username': 'bot',
+			'api_update': now
+			})
+
+		notification_handler(db_path=self.db_path,
+			notification_dict={'launch-1': 'notify_24h'},
+			bot_username='bot',
+			bot=None)
+
+		conn = sqlite3.connect(f'{self.db_path}/launchbot-data.db')
+		row = conn.execute(
+			'SELECT notify_24h FROM launches WHERE unique_id = ?',
+			('launch-1', )).fetchone()
+		conn.close()
+
+		self.assertIsNotNone(row)
+		self.assertEqual(row[0], 1)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -5,13 +5,16 @@ import math
 import logging
 import datetime
 
-import pytz
-
 from db import create_chats_db
+from dbconn import connect_db
+from dbwriter import queued_write
+from startup import lazy_import
+
+pytz = lazy_import('pytz')
 
 
 def load_locale_string(db_path: str, chat: str):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	try:
@@ -27,8 +30,9 @@ def load_locale_string(db_path: str, chat: str):
 	return query_return[0][0]
 
 
+@queued_write()
 def remove_time_zone_information(db_path: str, chat: str):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	try:
@@ -45,8 +49,9 @@ def remove_time_zone_information(db_path: str, chat: str):
 	conn.close()
 
 
+@queued_write()
 def update_time_zone_string(db_path: str, chat: str, time_zone: str):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	try:
@@ -66,8 +71,9 @@ def update_time_zone_string(db_path: str, chat: str, time_zone: str):
 
 
 
+@queued_write()
 def update_time_zone_value(db_path: str, chat: str, offset: str):
-	conn = sqlite3.connect(os.path.join(db_path, 'launchbot-data.db'))
+	conn = connect_db(db_path)
 	cursor = conn.cursor()
 
 	if 'h' in offset:
@@ -101,7 +107,7 @@ def update_time_zone_value(db_path: str, chat: str, offset: str):
 
 
 def load_time_zone_status(data_dir: str, chat: str, readable: bool):
-	conn = sqlite3.connect(os.path.join(data_dir, 'launchbot-data.db'))
+	conn = connect_db(data_dir)
 	cursor = conn.cursor()
 
 	try:
@@ -168,7 +174,7 @@ def load_time_zone_status(data_dir: str, chat: str, readable: bool):
 
 
 def load_bulk_tz_offset(data_dir: str, chat_id_set: set):
-	conn = sqlite3.connect(os.path.join(data_dir, 'launchbot-data.db'))
+	conn = connect_db(data_dir)
 	conn.row_factory = sqlite3.Row
 	cursor = conn.cursor()
 
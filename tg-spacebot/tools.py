@@ -57,6 +57,13 @@ def timestamp_to_unix(timestamp: str):
 	return int((utc_dt - datetime.datetime(1970, 1, 1)).total_seconds())
 
 
+def unix_to_timestamp(unix_time: int) -> str:
+	utc_dt = datetime.datetime(1970, 1, 1) + datetime.timedelta(
+		seconds=int(unix_time))
+
+	return utc_dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
 def timestamp_to_legible_date_string(timestamp: int, use_utc: bool):
 	if use_utc:
 		date_object = datetime.datetime.utcfromtimestamp(timestamp)